@@ -0,0 +1,46 @@
+from element import Element
+
+# Keys of an Element's dict that hold child nodes of the syntax tree. Passes may
+# store extra annotations on nodes (e.g. resolved call targets), so only these
+# keys are followed when walking the tree.
+CHILD_KEYS = (
+    "structs",
+    "functions",
+    "fields",
+    "args",
+    "statements",
+    "else_statements",
+    "catchers",
+    "condition",
+    "init",
+    "update",
+    "expression",
+    "exception_type",
+    "op1",
+    "op2",
+)
+
+
+def children(node):
+    for key in CHILD_KEYS:
+        child = node.dict.get(key)
+        if isinstance(child, Element):
+            yield child
+        elif isinstance(child, list):
+            for item in child:
+                if isinstance(item, Element):
+                    yield item
+
+
+# preorder walk over a node and everything below it
+def walk(node):
+    stack = [node]
+    while stack:
+        cur = stack.pop()
+        yield cur
+        stack.extend(reversed(list(children(cur))))
+
+
+def walk_all(nodes):
+    for node in nodes:
+        yield from walk(node)
@@ -0,0 +1,668 @@
+import contextlib
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from intbase import InterpreterBase
+import interpreterv3
+import interpreterv4
+import sinks
+import sources
+import type_value4
+
+# Benchmarks for the interpreter options. Run with: python bench.py [--memory] [name ...]
+# --memory reports the peak memory allocated while running instead of the time, and
+# for v3 the number of structs allocated. python bench.py --warmup instead times each
+# batch of WARMUP's calls with and without tiered compilation, which shows the
+# warm-up curve and the steady-state speedup. python bench.py --unboxed compares
+# boxed and unboxed values on the v4 benchmarks: binary operators per second and
+# the number of type_value4.Value objects created. python bench.py --output times
+# PRINT_LINES on the register VM with each output sink, with stdout sent to
+# os.devnull, and reports the peak memory of each. python bench.py --input feeds
+# READ_INTS INPUT_LINES lines from an inp list and from each input source, and
+# reports the run time, how fast InterpreterBase.get_input_int alone reads the
+# lines and the peak memory, building the input included. python bench.py --sampling
+# [name ...] compares each benchmark, or the named ones, with and without the
+# sampling profiler at 1 kHz and reports the overhead and the samples it took per
+# second.
+#
+# BENCHMARKS maps a name to (interpreter module, program); CONFIGS maps an
+# interpreter module to the options compared on its benchmarks.
+
+ARITH_LOOP = """
+func main(): void {
+  var i: int;
+  var s: int;
+  for (i = 0; i < 20000; i = i + 1) {
+    s = s + i * 3 - i / 7;
+    if (s > 1000000) {
+      s = s - 1000000;
+    }
+  }
+  print(s);
+}
+"""
+
+FIB = """
+func fib(n: int): int {
+  if (n < 2) {
+    return n;
+  }
+  return fib(n - 1) + fib(n - 2);
+}
+func main(): void {
+  print(fib(17));
+}
+"""
+
+COMPARE_LOGIC = """
+func main(): void {
+  var i: int;
+  var j: int;
+  var count: int;
+  var flag: bool;
+  for (i = 0; i < 150; i = i + 1) {
+    for (j = 0; j < 100; j = j + 1) {
+      flag = (i < j && j != 50) || (i == j * 2);
+      if (flag == true && i >= 10) {
+        count = count + 1;
+      }
+    }
+  }
+  print(count);
+}
+"""
+
+LINKED_LIST = """
+struct node {
+  val: int;
+  next: node;
+}
+func main(): void {
+  var head: node;
+  var cur: node;
+  var i: int;
+  var sum: int;
+  for (i = 0; i < 3000; i = i + 1) {
+    cur = new node;
+    cur.val = i;
+    cur.next = head;
+    head = cur;
+  }
+  for (cur = head; cur != nil; cur = cur.next) {
+    sum = sum + cur.val;
+    cur.val = sum;
+  }
+  print(sum);
+}
+"""
+
+TREE = """
+struct tree {
+  val: int;
+  name: string;
+  done: bool;
+  left: tree;
+  right: tree;
+}
+func build(d: int): tree {
+  var t: tree;
+  t = new tree;
+  t.val = d;
+  if (d > 0) {
+    t.left = build(d - 1);
+    t.right = build(d - 1);
+  }
+  return t;
+}
+func total(t: tree): int {
+  if (t == nil) {
+    return 0;
+  }
+  t.done = true;
+  return t.val + total(t.left) + total(t.right);
+}
+func main(): void {
+  var root: tree;
+  root = build(10);
+  print(total(root));
+}
+"""
+
+POINT_MATH = """
+struct point {
+  x: int;
+  y: int;
+}
+func dist2(a: int, b: int): int {
+  var p: point;
+  p = new point;
+  p.x = a;
+  p.y = b;
+  return p.x * p.x + p.y * p.y;
+}
+func main(): void {
+  var i: int;
+  var s: int;
+  for (i = 0; i < 3000; i = i + 1) {
+    s = s + dist2(i, i - 7);
+  }
+  print(s);
+}
+"""
+
+NESTED_LOOPS = """
+struct grid {
+  w: int;
+  h: int;
+}
+func main(): void {
+  var g: grid;
+  var i: int;
+  var j: int;
+  var n: int;
+  var m: int;
+  var s: int;
+  g = new grid;
+  g.w = 60;
+  g.h = 50;
+  n = 3;
+  m = 7;
+  for (i = 0; i < g.w; i = i + 1) {
+    for (j = 0; j < g.h * 2; j = j + 1) {
+      s = s + i * (n * m + g.w) - j / (n + m);
+    }
+  }
+  print(s);
+}
+"""
+
+SUM_LOOPS = """
+func main(): void {
+  var i: int;
+  var n: int;
+  var s: int;
+  var t: int;
+  n = 20000;
+  for (i = 0; i < n; i = i + 1) {
+    s = s + i * i * 3 - i;
+  }
+  for (i = 1; i <= n; i = i + 1) {
+    t = t + n / i;
+  }
+  print(s);
+  print(t);
+}
+"""
+
+CONST_CALLS = """
+func fact(n: int): int {
+  if (n <= 1) {
+    return 1;
+  }
+  return n * fact(n - 1);
+}
+func square(x: int): int {
+  return x * x;
+}
+func main(): void {
+  var i: int;
+  var s: int;
+  for (i = 0; i < 500; i = i + 1) {
+    s = s + fact(12) / square(12) - i;
+  }
+  print(s);
+}
+"""
+
+SMALL_CALLS = """
+func add(a: int, b: int): int {
+  return a + b;
+}
+func is_even(n: int): bool {
+  return n / 2 * 2 == n;
+}
+func main(): void {
+  var i: int;
+  var s: int;
+  for (i = 0; i < 5000; i = i + 1) {
+    if (is_even(i)) {
+      s = add(s, i);
+    }
+  }
+  print(s);
+}
+"""
+
+V4_ARITH_LOOP = """
+func main() {
+  var i;
+  var s;
+  s = 0;
+  for (i = 0; i < 5000; i = i + 1) {
+    s = s + i * 3 - i / 7;
+    if (s > 1000000) {
+      s = s - 1000000;
+    }
+  }
+  print(s);
+}
+"""
+
+V4_SMALL_CALLS = """
+func add(a, b) {
+  return a + b;
+}
+func is_even(n) {
+  return n / 2 * 2 == n;
+}
+func main() {
+  var i;
+  var s;
+  s = 0;
+  for (i = 0; i < 2000; i = i + 1) {
+    if (is_even(i)) {
+      s = add(s, i);
+    }
+    if (s < 0) {
+      print("unreachable");
+    }
+  }
+  print(s);
+}
+"""
+
+V4_MIXED_TYPES = """
+func same(a, b) {
+  return a == b;
+}
+func main() {
+  var i;
+  var n;
+  n = 0;
+  for (i = 0; i < 2000; i = i + 1) {
+    if (same(i, i) && same("x", "x") && !same(true, false) && same(nil, nil)) {
+      n = n + 1;
+    }
+    if (n < 0) {
+      print("unreachable");
+    }
+  }
+  print(n);
+}
+"""
+
+# prints once per batch of calls, so the time between outputs is the time a batch took
+WARMUP = """
+func work(n: int): int {
+  var i: int;
+  var s: int;
+  for (i = 0; i < n; i = i + 1) {
+    s = s + i * i / 3;
+    if (s > 100000) {
+      s = s - 100000;
+    }
+  }
+  return s;
+}
+func main(): void {
+  var batch: int;
+  var k: int;
+  var s: int;
+  for (batch = 0; batch < 12; batch = batch + 1) {
+    for (k = 0; k < 10; k = k + 1) {
+      s = s + work(40);
+    }
+    print(s);
+  }
+}
+"""
+
+PRINT_LINES = """
+func main(): void {
+  var i: int;
+  for (i = 0; i < 100000; i = i + 1) {
+    print("line ", i);
+  }
+}
+"""
+
+# builds a 1M-character string by appending to it
+STRING_BUILD = """
+func main(): void {
+  var s: string;
+  var i: int;
+  s = "";
+  for (i = 0; i < 100000; i = i + 1) {
+    s = s + "0123456789";
+  }
+  print(s == "");
+}
+"""
+
+INPUT_LINES = 100000
+
+READ_INTS = """
+func main(): void {
+  var n: int;
+  var i: int;
+  var s: int;
+  n = inputi();
+  for (i = 0; i < n; i = i + 1) {
+    s = s + inputi();
+  }
+  print(s);
+}
+"""
+
+BENCHMARKS = {
+    "arith_loop": (interpreterv3, ARITH_LOOP),
+    "fib": (interpreterv3, FIB),
+    "compare_logic": (interpreterv3, COMPARE_LOGIC),
+    "linked_list": (interpreterv3, LINKED_LIST),
+    "tree": (interpreterv3, TREE),
+    "point_math": (interpreterv3, POINT_MATH),
+    "small_calls": (interpreterv3, SMALL_CALLS),
+    "nested_loops": (interpreterv3, NESTED_LOOPS),
+    "sum_loops": (interpreterv3, SUM_LOOPS),
+    "const_calls": (interpreterv3, CONST_CALLS),
+    "string_build": (interpreterv3, STRING_BUILD),
+    "v4_arith_loop": (interpreterv4, V4_ARITH_LOOP),
+    "v4_mixed_types": (interpreterv4, V4_MIXED_TYPES),
+    "v4_small_calls": (interpreterv4, V4_SMALL_CALLS),
+}
+
+CONFIGS = {
+    interpreterv3: {
+        "baseline": {},
+        "typecheck": {"typecheck": True},
+        "specialize": {"specialize": True},
+        "escape": {"escape_analysis": True},
+        "inline": {"inline_functions": True},
+        "hoist": {"hoist_invariants": True},
+        "loop_idioms": {"loop_idioms": True},
+        "partial_eval": {"partial_eval": True},
+        "tiered": {"tiered": True},
+        "register_vm": {"register_vm": True},
+    },
+    interpreterv4: {
+        "baseline": {},
+        "inline_cache": {"inline_cache": True},
+        "inline": {"inline_functions": True},
+        "unboxed": {"unboxed": True},
+    },
+}
+
+
+# best wall time of repeat runs, and the program's output
+def time_run(module, program, kwargs, repeat=3):
+    best = None
+    for _ in range(repeat):
+        interpreter = module.Interpreter(console_output=False, **kwargs)
+        start = time.perf_counter()
+        interpreter.run(program)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, interpreter.get_output()
+
+
+# peak memory allocated during one run in bytes, and the interpreter that ran
+def peak_memory(module, program, kwargs):
+    interpreter = module.Interpreter(console_output=False, **kwargs)
+    tracemalloc.start()
+    try:
+        interpreter.run(program)
+        return tracemalloc.get_traced_memory()[1], interpreter
+    finally:
+        tracemalloc.stop()
+
+
+def run_benchmark(name, repeat=3):
+    module, program = BENCHMARKS[name]
+    baseline = None
+    for label, kwargs in CONFIGS[module].items():
+        elapsed, output = time_run(module, program, kwargs, repeat)
+        if baseline is None:
+            baseline, expected = elapsed, output
+        note = "" if output == expected else "  OUTPUT DIFFERS"
+        print(f"{name:16} {label:12} {elapsed * 1000:9.1f} ms  x{baseline / elapsed:.2f}{note}")
+
+
+def run_memory_benchmark(name):
+    module, program = BENCHMARKS[name]
+    for label, kwargs in CONFIGS[module].items():
+        peak, interpreter = peak_memory(module, program, kwargs)
+        allocations = getattr(interpreter, "struct_allocations", None)
+        note = "" if allocations is None else f"  {allocations} structs allocated"
+        print(f"{name:16} {label:12} {peak / 1024:9.1f} KiB peak{note}")
+
+
+# output log that records when each line was output
+class TimedLog(list):
+    def __init__(self):
+        super().__init__()
+        self.times = []
+
+    def append(self, line):
+        self.times.append(time.perf_counter())
+        super().append(line)
+
+
+# seconds each batch of WARMUP took
+def batch_times(kwargs):
+    interpreter = interpreterv3.Interpreter(console_output=False, **kwargs)
+    interpreter.output_log = TimedLog()
+    start = time.perf_counter()
+    interpreter.run(WARMUP)
+    times = [start] + interpreter.output_log.times
+    return [end - begin for begin, end in zip(times, times[1:])], interpreter
+
+
+def run_warmup_benchmark():
+    baseline, _ = batch_times({})
+    tiered, interpreter = batch_times({"tiered": True})
+    for batch, (base, tier) in enumerate(zip(baseline, tiered)):
+        print(f"batch {batch:2}  baseline {base * 1000:7.2f} ms  tiered {tier * 1000:7.2f} ms  x{base / tier:.2f}")
+    print(interpreter.tier_report)
+
+
+# binary operators a run evaluates, counted by its inline caches
+def count_ops(program):
+    interpreter = interpreterv4.Interpreter(console_output=False, inline_cache=True)
+    interpreter.run(program)
+    stats = interpreter.get_ic_stats()
+    return stats["mono_hits"] + stats["poly_hits"] + stats["misses"]
+
+
+# Value objects created during one run
+def count_values(program, kwargs):
+    created = [0]
+    init = type_value4.Value.__init__
+
+    def counting_init(self, *args):
+        created[0] += 1
+        init(self, *args)
+
+    type_value4.Value.__init__ = counting_init
+    try:
+        interpreterv4.Interpreter(console_output=False, **kwargs).run(program)
+    finally:
+        type_value4.Value.__init__ = init
+    return created[0]
+
+
+def run_unboxed_benchmark(name, repeat=3):
+    module, program = BENCHMARKS[name]
+    ops = count_ops(program)
+    baseline = None
+    for label, kwargs in [("boxed", {}), ("unboxed", {"unboxed": True})]:
+        elapsed, output = time_run(module, program, kwargs, repeat)
+        if baseline is None:
+            baseline, expected = elapsed, output
+        note = "" if output == expected else "  OUTPUT DIFFERS"
+        values = count_values(program, kwargs)
+        print(f"{name:16} {label:8} {elapsed * 1000:9.1f} ms  x{baseline / elapsed:.2f}  "
+              f"{ops / elapsed / 1e6:6.2f} Mops/s  {values:8} Values{note}")
+
+
+def run_sampling_benchmark(name, repeat=5):
+    module, program = BENCHMARKS[name]
+    baseline, expected = time_run(module, program, {}, repeat)
+    elapsed, output = time_run(module, program, {"sampling": True}, repeat)
+    interpreter = module.Interpreter(console_output=False, sampling=True)
+    start = time.perf_counter()
+    interpreter.run(program)
+    rate = interpreter.sampler.total() / (time.perf_counter() - start)
+    note = "" if output == expected else "  OUTPUT DIFFERS"
+    print(f"{name:16} {baseline * 1000:9.1f} ms  sampling {elapsed * 1000:9.1f} ms  "
+          f"{(elapsed / baseline - 1) * 100:+6.1f}%  {rate:6.0f} samples/s{note}")
+
+
+# (label, interpreter kwargs, function making a fresh sink or None)
+OUTPUT_CONFIGS = [
+    ("console", {}, None),
+    ("log_only", {"console_output": False}, None),
+    ("buffered", {}, sinks.BufferedSink),
+    ("discard", {}, sinks.DiscardSink),
+    ("ring", {}, sinks.RingSink),
+    ("spill", {}, sinks.SpillSink),
+    ("hash", {}, sinks.HashSink),
+]
+
+
+def run_output_benchmark(repeat=3):
+    for label, kwargs, make_sink in OUTPUT_CONFIGS:
+        best = None
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            for _ in range(repeat):
+                sink = make_sink() if make_sink is not None else None
+                interpreter = interpreterv3.Interpreter(output_sink=sink, register_vm=True, **kwargs)
+                start = time.perf_counter()
+                interpreter.run(PRINT_LINES)
+                elapsed = time.perf_counter() - start
+                if best is None or elapsed < best:
+                    best = elapsed
+            sink = make_sink() if make_sink is not None else None
+            interpreter = interpreterv3.Interpreter(output_sink=sink, register_vm=True, **kwargs)
+            tracemalloc.start()
+            try:
+                interpreter.run(PRINT_LINES)
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+        print(f"print_lines {label:9} {best * 1000:9.1f} ms  {peak / 1024:9.1f} KiB peak  "
+              f"{len(interpreter.get_output())} lines kept")
+
+
+def input_lines():
+    yield str(INPUT_LINES)
+    for i in range(INPUT_LINES):
+        yield str(i * 7919 % 100003)
+
+
+# (label, function making the interpreter's input kwargs from the input file's path)
+INPUT_CONFIGS = [
+    ("inp_list", lambda path: {"inp": list(input_lines())}),
+    ("iterator", lambda path: {"input_source": sources.IteratorSource(input_lines())}),
+    ("file", lambda path: {"input_source": sources.FileSource(path)}),
+    ("bytes", lambda path: {"input_source": sources.BytesSource("\n".join(input_lines()).encode())}),
+    ("mmap", lambda path: {"input_source": sources.MmapSource(path)}),
+]
+
+
+# runs program, or reads every input line with get_input_int if it's None, and
+# records the time taken in elapsed
+def run_with_input(interpreter_class, kwargs, program):
+    interpreter = interpreter_class(console_output=False, **kwargs)
+    start = time.perf_counter()
+    try:
+        if program is None:
+            for _ in range(INPUT_LINES + 1):
+                interpreter.get_input_int()
+        else:
+            interpreter.run(program)
+    finally:
+        interpreter.elapsed = time.perf_counter() - start
+        close = getattr(kwargs.get("input_source"), "close", None)
+        if close is not None:
+            close()
+    return interpreter
+
+
+def run_input_benchmark():
+    path = os.path.join(tempfile.mkdtemp(), "input.txt")
+    with open(path, "w") as f:
+        f.write("\n".join(input_lines()) + "\n")
+    try:
+        expected = None
+        for label, make_input in INPUT_CONFIGS:
+            interpreter = run_with_input(interpreterv3.Interpreter, make_input(path), READ_INTS)
+            elapsed = interpreter.elapsed
+            reader = run_with_input(InterpreterBase, make_input(path), None)
+            tracemalloc.start()
+            try:
+                run_with_input(interpreterv3.Interpreter, make_input(path), READ_INTS)
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            if expected is None:
+                expected = interpreter.get_output()
+            note = "" if interpreter.get_output() == expected else "  OUTPUT DIFFERS"
+            print(f"read_ints {label:9} {elapsed * 1000:9.1f} ms  "
+                  f"get_input_int {INPUT_LINES / reader.elapsed / 1e6:5.2f} Mlines/s  "
+                  f"{peak / 1024:9.1f} KiB peak{note}")
+    finally:
+        os.remove(path)
+        os.rmdir(os.path.dirname(path))
+
+
+FLAGS = ("--memory", "--warmup", "--unboxed", "--output", "--input", "--sampling")
+NAMED_FLAGS = ("--memory", "--sampling")  # the flags that take benchmark names
+
+
+def usage():
+    return (f"usage: python bench.py [--memory | --sampling] [name ...]\n"
+            f"       python bench.py {{{' | '.join(flag for flag in FLAGS if flag not in NAMED_FLAGS)}}}\n"
+            f"benchmarks: {' '.join(BENCHMARKS)}")
+
+
+def main():
+    args = sys.argv[1:]
+    if "-h" in args or "--help" in args:
+        print(usage())
+        return
+    unknown = [arg for arg in args if arg not in FLAGS and arg not in BENCHMARKS]
+    if unknown:
+        sys.exit(f"unknown option or benchmark: {' '.join(unknown)}\n{usage()}")
+    if "--input" in args:
+        run_input_benchmark()
+        return
+    if "--output" in args:
+        run_output_benchmark()
+        return
+    names = [arg for arg in args if arg in BENCHMARKS] or BENCHMARKS
+    if "--sampling" in args:
+        for name in names:
+            run_sampling_benchmark(name)
+        return
+    if "--warmup" in args:
+        run_warmup_benchmark()
+        return
+    if "--unboxed" in args:
+        for name, (module, _) in BENCHMARKS.items():
+            if module is interpreterv4:
+                run_unboxed_benchmark(name)
+        return
+    memory = "--memory" in args
+    for name in names:
+        if memory:
+            run_memory_benchmark(name)
+        else:
+            run_benchmark(name)
+
+
+if __name__ == "__main__":
+    main()
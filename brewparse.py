@@ -14,6 +14,15 @@ precedence = (
     ("right", "UMINUS", "NOT"),
 )
 
+# an Element for production p, with the line of its first token and the [start, end)
+# character offsets of the text of all its symbols in the program
+def node(p, elem_type, **kwargs):
+    element = Element(elem_type, **kwargs)
+    element.line = p.lineno(1)
+    element.start = p.lexpos(1)
+    element.end = p.lexspan(len(p) - 1)[1]
+    return element
+
 def collapse_items(p, group_index, singleton_index):
     if len(p) == 2:
         p[0] = [p[1]]
@@ -26,9 +35,9 @@ def p_program(p):
     """program : structs funcs
     | funcs"""
     if len(p) == 2:
-        p[0] = Element(InterpreterBase.PROGRAM_NODE, structs=[], functions=p[1])
+        p[0] = node(p, InterpreterBase.PROGRAM_NODE, structs=[], functions=p[1])
     else:
-        p[0] = Element(InterpreterBase.PROGRAM_NODE, structs=p[1], functions=p[2])
+        p[0] = node(p, InterpreterBase.PROGRAM_NODE, structs=p[1], functions=p[2])
 
 def p_structs(p):
     """structs : structs struct
@@ -37,7 +46,7 @@ def p_structs(p):
 
 def p_struct(p):
    "struct : STRUCT NAME LBRACE fields RBRACE"
-   p[0] = Element(InterpreterBase.STRUCT_NODE, name=p[2], fields=p[4])
+   p[0] = node(p, InterpreterBase.STRUCT_NODE, name=p[2], fields=p[4])
 
 def p_fields(p):
    """fields : fields field
@@ -46,7 +55,7 @@ def p_fields(p):
 
 def p_field(p):
   "field : NAME COLON NAME SEMI"  # field_name: type
-  p[0] = Element(InterpreterBase.FIELD_DEF_NODE, name=p[1], var_type=p[3])
+  p[0] = node(p, InterpreterBase.FIELD_DEF_NODE, name=p[1], var_type=p[3])
 
 def p_funcs(p):
     """funcs : funcs func
@@ -58,17 +67,17 @@ def p_func(p):
     """func : FUNC NAME LPAREN formal_args RPAREN COLON NAME LBRACE statements RBRACE
     | FUNC NAME LPAREN RPAREN COLON NAME LBRACE statements RBRACE"""
     if len(p) == 11:  # handle with 1+ formal args
-        p[0] = Element(InterpreterBase.FUNC_NODE, name=p[2], args=p[4], return_type = p[7], statements=p[9])
+        p[0] = node(p, InterpreterBase.FUNC_NODE, name=p[2], args=p[4], return_type = p[7], statements=p[9])
     else:  # handle no formal args
-        p[0] = Element(InterpreterBase.FUNC_NODE, name=p[2], args=[], return_type = p[6], statements=p[8])
+        p[0] = node(p, InterpreterBase.FUNC_NODE, name=p[2], args=[], return_type = p[6], statements=p[8])
 
 def p_func2(p):
     """func : FUNC NAME LPAREN formal_args RPAREN LBRACE statements RBRACE
     | FUNC NAME LPAREN RPAREN LBRACE statements RBRACE"""
     if len(p) == 9:  # handle with 1+ formal args
-        p[0] = Element(InterpreterBase.FUNC_NODE, name=p[2], args=p[4], return_type = None, statements=p[7])
+        p[0] = node(p, InterpreterBase.FUNC_NODE, name=p[2], args=p[4], return_type = None, statements=p[7])
     else:  # handle no formal args
-        p[0] = Element(InterpreterBase.FUNC_NODE, name=p[2], args=[], return_type = None, statements=p[6])
+        p[0] = node(p, InterpreterBase.FUNC_NODE, name=p[2], args=[], return_type = None, statements=p[6])
 
 def p_formal_args(p):
     """formal_args : formal_args COMMA formal_arg
@@ -80,9 +89,9 @@ def p_formal_arg(p):
     """formal_arg : NAME COLON NAME
     | NAME"""
     if len(p) == 2:
-      p[0] = Element(InterpreterBase.ARG_NODE, name=p[1], var_type = None)
+      p[0] = node(p, InterpreterBase.ARG_NODE, name=p[1], var_type = None)
     else:
-      p[0] = Element(InterpreterBase.ARG_NODE, name=p[1], var_type = p[3])
+      p[0] = node(p, InterpreterBase.ARG_NODE, name=p[1], var_type = p[3])
 
 def p_statements(p):
     """statements : statements statement
@@ -96,15 +105,18 @@ def p_statement___assign(p):
 
 def p_assign(p):
     "assign : variable_w_dot ASSIGN expression"
-    p[0] = Element("=", name=p[1], expression=p[3])
+    if len(p[1]) > 1:  # assignment to a struct field
+        p[0] = node(p, "=", name=".".join(p[1]), fields=p[1], expression=p[3])
+    else:
+        p[0] = node(p, "=", name=p[1][0], expression=p[3])
 
 def p_statement___var(p):
     """statement : VAR variable COLON NAME SEMI
     | VAR variable SEMI"""
     if len(p) == 6:
-      p[0] = Element(InterpreterBase.VAR_DEF_NODE, name=p[2], var_type=p[4])
+      p[0] = node(p, InterpreterBase.VAR_DEF_NODE, name=p[2], var_type=p[4])
     else:
-      p[0] = Element(InterpreterBase.VAR_DEF_NODE, name=p[2], var_type=None)
+      p[0] = node(p, InterpreterBase.VAR_DEF_NODE, name=p[2], var_type=None)
 
 def p_variable(p):
     "variable : NAME"
@@ -114,23 +126,25 @@ def p_variable_w_dot(p):
     """variable_w_dot : variable_w_dot DOT NAME
     | NAME"""
     if len(p) == 4:
-        p[0] = p[1] + "." + p[3]
+        p[0] = p[1] + (p[3],)
     else:
-        p[0] = p[1]
+        p[0] = (p[1],)
 
 def p_statement_if(p):
     """statement : IF LPAREN expression RPAREN LBRACE statements RBRACE
     | IF LPAREN expression RPAREN LBRACE statements RBRACE ELSE LBRACE statements RBRACE
     """
     if len(p) == 8:
-        p[0] = Element(
+        p[0] = node(
+            p,
             InterpreterBase.IF_NODE,
             condition=p[3],
             statements=p[6],
             else_statements=None,
         )
     else:
-        p[0] = Element(
+        p[0] = node(
+            p,
             InterpreterBase.IF_NODE,
             condition=p[3],
             statements=p[6],
@@ -139,7 +153,7 @@ def p_statement_if(p):
 
 def p_statement_try(p):
     """statement : TRY LBRACE statements RBRACE catchers"""
-    p[0] = Element(InterpreterBase.TRY_NODE, statements=p[3], catchers=p[5])
+    p[0] = node(p, InterpreterBase.TRY_NODE, statements=p[3], catchers=p[5])
 
 def p_catches(p):
     """catchers : catchers catch
@@ -148,15 +162,15 @@ def p_catches(p):
 
 def p_catch(p):
     "catch : CATCH STRING LBRACE statements RBRACE"
-    p[0] = Element(InterpreterBase.CATCH_NODE, exception_type=p[2], statements=p[4])
+    p[0] = node(p, InterpreterBase.CATCH_NODE, exception_type=p[2], statements=p[4])
 
 def p_statement_for(p):
     "statement : FOR LPAREN assign SEMI expression SEMI assign RPAREN LBRACE statements RBRACE"
-    p[0] = Element(InterpreterBase.FOR_NODE, init=p[3], condition=p[5], update=p[7], statements=p[10])
+    p[0] = node(p, InterpreterBase.FOR_NODE, init=p[3], condition=p[5], update=p[7], statements=p[10])
 
 def p_statement_raise(p):
     "statement : RAISE expression SEMI"
-    p[0] = Element(InterpreterBase.RAISE_NODE, exception_type=p[2])
+    p[0] = node(p, InterpreterBase.RAISE_NODE, exception_type=p[2])
 
 def p_statement_expr(p):
     "statement : expression SEMI"
@@ -170,21 +184,21 @@ def p_statement_return(p):
         expr = p[2]
     else:
         expr = None
-    p[0] = Element(InterpreterBase.RETURN_NODE, expression=expr)
+    p[0] = node(p, InterpreterBase.RETURN_NODE, expression=expr)
 
 
 def p_expression_not(p):
     "expression : NOT expression"
-    p[0] = Element(InterpreterBase.NOT_NODE, op1=p[2])
+    p[0] = node(p, InterpreterBase.NOT_NODE, op1=p[2])
 
 
 def p_expression_uminus(p):
     "expression : MINUS expression %prec UMINUS"
-    p[0] = Element(InterpreterBase.NEG_NODE, op1=p[2])
+    p[0] = node(p, InterpreterBase.NEG_NODE, op1=p[2])
 
 def p_expression_new(p):
     "expression : NEW NAME"
-    p[0] = Element(InterpreterBase.NEW_NODE, var_type=p[2])
+    p[0] = node(p, InterpreterBase.NEW_NODE, var_type=p[2])
 
 
 def p_arith_expression_binop(p):
@@ -198,7 +212,7 @@ def p_arith_expression_binop(p):
     | expression MINUS expression
     | expression MULTIPLY expression
     | expression DIVIDE expression"""
-    p[0] = Element(p[2], op1=p[1], op2=p[3])
+    p[0] = node(p, p[2], op1=p[1], op2=p[3])
 
 
 def p_expression_group(p):
@@ -209,43 +223,46 @@ def p_expression_group(p):
 def p_expression_and_or(p):
     """expression : expression OR expression
     | expression AND expression"""
-    p[0] = Element(p[2], op1=p[1], op2=p[3])
+    p[0] = node(p, p[2], op1=p[1], op2=p[3])
 
 
 def p_expression_number(p):
     "expression : NUMBER"
-    p[0] = Element(InterpreterBase.INT_NODE, val=p[1])
+    p[0] = node(p, InterpreterBase.INT_NODE, val=p[1])
 
 
 def p_expression_bool(p):
     """expression : TRUE
     | FALSE"""
     bool_val = p[1] == InterpreterBase.TRUE_DEF
-    p[0] = Element(InterpreterBase.BOOL_NODE, val=bool_val)
+    p[0] = node(p, InterpreterBase.BOOL_NODE, val=bool_val)
 
 
 def p_expression_nil(p):
     "expression : NIL"
-    p[0] = Element(InterpreterBase.NIL_NODE)
+    p[0] = node(p, InterpreterBase.NIL_NODE)
 
 
 def p_expression_string(p):
     "expression : STRING"
-    p[0] = Element(InterpreterBase.STRING_NODE, val=p[1])
+    p[0] = node(p, InterpreterBase.STRING_NODE, val=p[1])
 
 
 def p_expression_variable(p):
     "expression : variable_w_dot"
-    p[0] = Element(InterpreterBase.VAR_NODE, name=p[1])
+    if len(p[1]) > 1:
+        p[0] = node(p, InterpreterBase.FIELD_NODE, name=".".join(p[1]), fields=p[1])
+    else:
+        p[0] = node(p, InterpreterBase.VAR_NODE, name=p[1][0])
 
 
 def p_func_call(p):
     """expression : NAME LPAREN args RPAREN
     | NAME LPAREN RPAREN"""
     if len(p) == 5:
-        p[0] = Element(InterpreterBase.FCALL_NODE, name=p[1], args=p[3])
+        p[0] = node(p, InterpreterBase.FCALL_NODE, name=p[1], args=p[3])
     else:
-        p[0] = Element(InterpreterBase.FCALL_NODE, name=p[1], args=[])
+        p[0] = node(p, InterpreterBase.FCALL_NODE, name=p[1], args=[])
 
 
 def p_expression_args(p):
@@ -261,10 +278,18 @@ def p_error(p):
         print("Syntax error at EOF")
 
 
+# the lexer's next token, which also records where it ends for node spans
+def next_token():
+    token = lexer.token()
+    if token is not None:
+        token.endlexpos = lexer.lexpos
+    return token
+
+
 # exported function
 def parse_program(program):
     reset_lineno()
-    ast = yacc.parse(program)
+    ast = yacc.parse(program, lexer=lexer, tracking=True, tokenfunc=next_token)
     if ast is None:
         raise SyntaxError("Syntax error")
     return ast
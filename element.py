@@ -1,7 +1,13 @@
 class Element:
+    # slots keep the source position to three references per node
+    __slots__ = ("elem_type", "dict", "line", "start", "end")
+
     def __init__(self, elem_type, **kwargs):
         self.elem_type = elem_type
         self.dict = {}
+        # the line and [start, end) character offsets of the text brewparse parsed the
+        # node from, or None for nodes made after parsing
+        self.line = self.start = self.end = None
         for key, value in kwargs.items():
             self.dict[key] = value
 
@@ -33,29 +33,17 @@ class EnvironmentManager:
 
         return False
 
-    def set_struct(self, symbol, value):
+    # fields is the path of a field, e.g. ("a", "b", "c") for a.b.c
+    def set_struct(self, fields, value):
         cur_func_env = self.environment[-1]
-        fields = symbol.split('.')
         for env in reversed(cur_func_env):
             if fields[0] in env:
-                struct = env[fields[0]]
-                struct_values = struct.value()
-                if len(fields) == 2:
-                    field = fields[1]
-                    for i in struct_values:
-                        if i == field:
-                            struct_values[i] = value
-                            return True
-                if len(fields) > 2:
-                    for field in fields[1:-1]:
-                        if field in struct_values:
-                            struct_values = struct_values[field].value()
-                            # print("value of struct value", struct_values.value())
-                    # struct_values = struct_values[fields[-1]]
-                    struct_values[fields[-1]] = value
-                    return True
+                struct = env[fields[0]].value()
+                for field in fields[1:-1]:
+                    struct = struct.get_field(field).value()
+                return struct.set_field(fields[-1], value)
         return False
-    
+
 
 
     # create a new symbol in the top-most environment, regardless of whether that symbol exists
@@ -68,8 +56,9 @@ class EnvironmentManager:
         return True
 
     # used when we enter a new function - start with empty dictionary to hold parameters.
-    def push_func(self):
-        self.environment.append([{}])  # [[...]] -> [[...], [{}]]
+    # bindings optionally gives the new activation record's variables up front
+    def push_func(self, bindings=None):
+        self.environment.append([{} if bindings is None else bindings])  # [[...]] -> [[...], [{}]]
 
     def push_block(self):
         cur_func_env = self.environment[-1]
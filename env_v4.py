@@ -60,8 +60,9 @@ class EnvironmentManager:
         return True
 
     # used when we enter a new function - start with empty dictionary to hold parameters.
-    def push_func(self):
-        self.environment.append([{}])  # [[...]] -> [[...], [{}]]
+    # bindings optionally gives the new activation record's variables up front
+    def push_func(self, bindings=None):
+        self.environment.append([{} if bindings is None else bindings])  # [[...]] -> [[...], [{}]]
 
     def push_block(self):
         cur_func_env = self.environment[-1]
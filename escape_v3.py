@@ -0,0 +1,147 @@
+from astutil import walk, walk_all
+from element import Element
+from intbase import InterpreterBase
+
+# Escape analysis and scalar replacement of structs for interpreterv3.
+#
+# A struct variable is replaced by one local per field when, within its function,
+#   - it is declared once (and isn't a parameter) and the very next statement is
+#     `p = new S;`, with every other mention of p after that in the same block,
+#   - it is never used as a value (so it can't be returned, passed, stored in another
+#     struct or compared) and never assigned anything else, and
+#   - it is only used through p.f reads and writes of fields S declares with a
+#     primitive type.
+# `var p: S; p = new S;` then becomes `var p$f: T;` for each field used (fresh
+# locals start with the same defaults a new struct's fields get), and p.f becomes
+# the variable p$f. The lexer never produces "$", so the names can't clash.
+
+PRIMITIVES = {"int", "string", "bool"}
+
+
+class EscapeReport:
+    def __init__(self):
+        self.replaced = []  # (function name, variable, struct type, fields)
+
+    def __str__(self):
+        lines = [f"replaced {len(self.replaced)} structs with locals"]
+        for func_name, var_name, struct_type, fields in self.replaced:
+            lines.append(f"  {func_name}: {var_name} ({struct_type}) -> " + ", ".join(fields))
+        return "\n".join(lines)
+
+
+def scalar_replace(functions, structs):
+    report = EscapeReport()
+    for func in functions:
+        for var_name, struct_type, fields in _replace_in_function(func, structs):
+            report.replaced.append((func.get("name"), var_name, struct_type, fields))
+    return report
+
+
+def scalar_name(var_name, field):
+    return f"{var_name}${field}"
+
+
+def _replace_in_function(func, structs):
+    replaced = []
+    # later declarations first, so earlier indices in the same block stay valid
+    candidates = sorted(_candidates(func, structs), key=lambda c: c[2], reverse=True)
+    for var_name, block, index, uses in candidates:
+        struct_type = block[index].get("var_type")
+        fields = [f for f in structs[struct_type] if any(use.get("fields")[1] == f for use in uses)]
+        block[index:index + 2] = [
+            Element(InterpreterBase.VAR_DEF_NODE, name=scalar_name(var_name, f),
+                    var_type=structs[struct_type][f].type())
+            for f in fields
+        ]
+        for use in uses:
+            name = scalar_name(var_name, use.get("fields")[1])
+            del use.dict["fields"]
+            use.dict["name"] = name
+            if use.elem_type == InterpreterBase.FIELD_NODE:
+                use.elem_type = InterpreterBase.VAR_NODE
+        replaced.append((var_name, struct_type, fields))
+    replaced.reverse()
+    return replaced
+
+
+# yields (variable name, statement list, index of its declaration, its field uses)
+def _candidates(func, structs):
+    statements = func.get("statements")
+    vardefs = {}
+    for node in walk_all(statements):
+        if node.elem_type == InterpreterBase.VAR_DEF_NODE:
+            vardefs.setdefault(node.get("name"), []).append(node)
+    params = {arg.get("name") for arg in func.get("args")}
+
+    for block in _blocks(statements):
+        for index, statement in enumerate(block[:-1]):
+            if statement.elem_type != InterpreterBase.VAR_DEF_NODE:
+                continue
+            var_name = statement.get("name")
+            struct_type = statement.get("var_type")
+            if struct_type not in structs or var_name in params or len(vardefs[var_name]) > 1:
+                continue
+            if not _is_allocation(block[index + 1], var_name, struct_type):
+                continue
+            if not _all_fields_valid(structs[struct_type], structs):
+                continue
+            # every mention of the variable must be a use of a primitive field after the
+            # allocation, in the block that declares it
+            mentions = _count_mentions(statements, var_name)
+            uses = list(_uses(block[index + 2:], var_name))
+            if mentions != len(uses) + 1:
+                continue
+            if all(_is_scalar_field(use, structs[struct_type]) for use in uses):
+                yield var_name, block, index, uses
+
+
+def _blocks(statements):
+    yield statements
+    for node in walk_all(statements):
+        for key in ("statements", "else_statements"):
+            if node.get(key) is not None:
+                yield node.get(key)
+
+
+def _is_allocation(statement, var_name, struct_type):
+    if statement.elem_type != "=" or statement.get("fields") is not None:
+        return False
+    expression = statement.get("expression")
+    return (
+        statement.get("name") == var_name
+        and expression.elem_type == InterpreterBase.NEW_NODE
+        and expression.get("var_type") == struct_type
+    )
+
+
+def _all_fields_valid(struct_def, structs):
+    return all(value.type() in PRIMITIVES or value.type() in structs for value in struct_def.values())
+
+
+# mentions of a variable as a value, an assignment target or the start of a field path
+def _count_mentions(statements, var_name):
+    count = 0
+    for node in walk_all(statements):
+        kind = node.elem_type
+        if kind == InterpreterBase.VAR_NODE or kind == "=" or kind == InterpreterBase.FIELD_NODE:
+            fields = node.get("fields")
+            name = fields[0] if fields is not None else node.get("name")
+            if name == var_name:
+                count += 1
+    return count
+
+
+# field reads and writes whose path starts at the variable
+def _uses(statements, var_name):
+    for statement in statements:
+        for node in walk(statement):
+            fields = node.get("fields")
+            if node.elem_type not in ("=", InterpreterBase.FIELD_NODE) or fields is None:
+                continue
+            if fields[0] == var_name:
+                yield node
+
+
+def _is_scalar_field(use, struct_def):
+    fields = use.get("fields")
+    return len(fields) == 2 and fields[1] in struct_def and struct_def[fields[1]].type() in PRIMITIVES
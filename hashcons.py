@@ -0,0 +1,76 @@
+from intbase import InterpreterBase
+
+# Expression node types that can be merged when structurally identical
+LEAF_NODES = {
+    InterpreterBase.INT_NODE,
+    InterpreterBase.STRING_NODE,
+    InterpreterBase.BOOL_NODE,
+    InterpreterBase.NIL_NODE,
+    InterpreterBase.VAR_NODE,
+}
+OP_NODES = {
+    "+", "-", "*", "/", "==", "!=", ">", ">=", "<", "<=", "||", "&&",
+    InterpreterBase.NEG_NODE,
+    InterpreterBase.NOT_NODE,
+}
+# statement keys that hold an expression
+EXPR_KEYS = ("condition", "expression", "exception_type")
+
+
+# Rewrites every function of the program so that structurally identical expression
+# subtrees are the same Element object, turning each expression tree into a DAG.
+# Statements, calls made as statements included, are never merged, so each keeps
+# its own source position and its own counts in a profiler. Returns the number of
+# nodes that were merged away.
+def hash_cons(ast):
+    table = {}
+    merged = [0]
+    for func in ast.get("functions"):
+        _intern_statements(func.get("statements"), table, merged)
+    return merged[0]
+
+
+def _intern_statements(statements, table, merged):
+    if statements is None:
+        return
+    for statement in statements:
+        kind = statement.elem_type
+        if kind == InterpreterBase.FCALL_NODE:
+            statement.dict["args"] = [_intern(arg, table, merged) for arg in statement.get("args")]
+            continue
+        for key in EXPR_KEYS:
+            expr = statement.dict.get(key)
+            if expr is not None and not isinstance(expr, str):
+                statement.dict[key] = _intern(expr, table, merged)
+        if kind == InterpreterBase.FOR_NODE:
+            _intern_statements([statement.get("init"), statement.get("update")], table, merged)
+        _intern_statements(statement.get("statements"), table, merged)
+        _intern_statements(statement.get("else_statements"), table, merged)
+        for catcher in statement.get("catchers") or []:
+            _intern_statements(catcher.get("statements"), table, merged)
+
+
+# returns the canonical node for expr, interning its children first
+def _intern(expr, table, merged):
+    kind = expr.elem_type
+    if kind in LEAF_NODES:
+        val = expr.get("val")
+        key = (kind, expr.get("name"), type(val), val)
+    elif kind in OP_NODES:
+        for op in ("op1", "op2"):
+            if expr.get(op) is not None:
+                expr.dict[op] = _intern(expr.get(op), table, merged)
+        key = (kind, id(expr.get("op1")), id(expr.get("op2")))
+    elif kind == InterpreterBase.FCALL_NODE:
+        args = [_intern(arg, table, merged) for arg in expr.get("args")]
+        expr.dict["args"] = args
+        key = (kind, expr.get("name"), tuple(id(arg) for arg in args))
+    else:
+        return expr
+
+    canonical = table.get(key)
+    if canonical is None:
+        table[key] = expr
+        return expr
+    merged[0] += 1
+    return canonical
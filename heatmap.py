@@ -0,0 +1,74 @@
+import bisect
+import math
+
+# Line-level heat maps of Brewin programs.
+#
+# brewparse records on every node the line it starts on and the [start, end)
+# character offsets of its text; SourceMap turns offsets into (line, column), both
+# counted from 1. HeatMap(program, counts) takes counts mapping statement nodes to
+# the times each ran (a Profiler's hits) and gives each line the count of its
+# busiest statement, so a line holding a whole loop shows how often the loop ran
+# rather than the sum of its statements. str() prints the program with every
+# line's count and a bar of up to BAR_WIDTH characters on a log scale:
+#
+#      20000 #######    6 |     s = s + i;
+#
+# Statements without a line (made after parsing) are left out, and a line no
+# counted statement starts on has no count.
+
+BAR_WIDTH = 10
+
+
+class SourceMap:
+    def __init__(self, program):
+        self.line_starts = [0]
+        for index, char in enumerate(program):
+            if char == "\n":
+                self.line_starts.append(index + 1)
+
+    def line_col(self, offset):
+        line = bisect.bisect_right(self.line_starts, offset)
+        return line, offset - self.line_starts[line - 1] + 1
+
+    # (line, column, end line, end column) of a node's text, or None if it has none
+    def span(self, node):
+        if node.start is None:
+            return None
+        return self.line_col(node.start) + self.line_col(node.end)
+
+
+class HeatMap:
+    def __init__(self, program, counts):
+        self.lines = program.split("\n")
+        self.counts = {}  # line -> count
+        for node, count in counts.items():
+            if node.line is not None and count > self.counts.get(node.line, 0):
+                self.counts[node.line] = count
+
+    # the n lines with the highest counts, as (line, count, text)
+    def hottest(self, n=10):
+        ranked = sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))[:n]
+        return [(line, count, self.lines[line - 1].strip()) for line, count in ranked]
+
+    def __str__(self):
+        top = max(self.counts.values(), default=0)
+        out = []
+        for number, text in enumerate(self.lines, 1):
+            count = self.counts.get(number)
+            if count is None:
+                out.append(f"{'':10} {'':{BAR_WIDTH}} {number:4} | {text}")
+            else:
+                bar = "#" * _bar_length(count, top)
+                out.append(f"{count:10} {bar:{BAR_WIDTH}} {number:4} | {text}")
+        return "\n".join(out)
+
+    def save(self, path):
+        with open(path, "w") as f:
+            f.write(str(self) + "\n")
+
+
+# BAR_WIDTH for the top count and at least one character for any line that ran
+def _bar_length(count, top):
+    if count <= 0:
+        return 0
+    return max(1, round(BAR_WIDTH * math.log1p(count) / math.log1p(top)))
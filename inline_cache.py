@@ -0,0 +1,79 @@
+from astutil import walk_all
+
+# Type-feedback inline caches for the binary operators of interpreterv4.
+#
+# Each operator node gets an InlineCache under "ic" that maps the (left type,
+# right type) pairs seen at that node to the handler the generic path picked for
+# them. While the operand types stay among those seen, the interpreter calls the
+# handler directly; new types go through the generic checks and are added to the
+# cache. A cache that has seen more than MAX_ENTRIES type pairs is megamorphic and
+# stops caching.
+
+BIN_OPS = {"+", "-", "*", "/", "==", "!=", ">", ">=", "<", "<=", "||", "&&"}
+MAX_ENTRIES = 4
+
+
+class InlineCache:
+    def __init__(self, op):
+        self.op = op
+        self.entries = {}  # (left type, right type) -> handler
+        self.megamorphic = False
+        self.mono_hits = 0  # hits while only one type pair had been seen
+        self.poly_hits = 0
+        self.misses = 0
+
+    def lookup(self, key):
+        handler = self.entries.get(key)
+        if handler is None:
+            self.misses += 1
+        elif len(self.entries) == 1:
+            self.mono_hits += 1
+        else:
+            self.poly_hits += 1
+        return handler
+
+    def record(self, key, handler):
+        if self.megamorphic:
+            return
+        if len(self.entries) >= MAX_ENTRIES:
+            self.megamorphic = True
+            self.entries = {}
+            return
+        self.entries[key] = handler
+
+    def state(self):
+        if self.megamorphic:
+            return "megamorphic"
+        if not self.entries:
+            return "uninitialized"
+        if len(self.entries) == 1:
+            return "monomorphic"
+        return "polymorphic"
+
+
+# gives every binary operator node a cache and returns them all
+def install_inline_caches(functions):
+    caches = []
+    for node in walk_all(functions):
+        if node.elem_type in BIN_OPS and node.get("ic") is None:
+            node.dict["ic"] = InlineCache(node.elem_type)
+            caches.append(node.dict["ic"])
+    return caches
+
+
+def summarize(caches):
+    stats = {
+        "uninitialized": 0,
+        "monomorphic": 0,
+        "polymorphic": 0,
+        "megamorphic": 0,
+        "mono_hits": 0,
+        "poly_hits": 0,
+        "misses": 0,
+    }
+    for cache in caches:
+        stats[cache.state()] += 1
+        stats["mono_hits"] += cache.mono_hits
+        stats["poly_hits"] += cache.poly_hits
+        stats["misses"] += cache.misses
+    return stats
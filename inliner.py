@@ -0,0 +1,90 @@
+from astutil import walk, walk_all
+from intbase import InterpreterBase
+
+# Call inlining for small functions, shared by interpreterv3 and interpreterv4.
+#
+# A function can be inlined when its whole body is `return <expression>;`, the
+# expression has at most max_size nodes and the function can't reach itself through
+# its calls. Every call to it that the linker resolved becomes an INLINE_NODE in
+# place: it keeps the call's name, args and annotations and gets the callee's
+# return expression under "body". The interpreter binds the arguments the way a
+# call does (v3 checks and coerces them, v4 wraps them in closures), evaluates the
+# body in a frame holding just the parameters and checks the result like a return,
+# without running a statement block.
+#
+# "body" isn't a child key, so passes that walk the tree see the callee's
+# expression only once, in the callee.
+
+DEFAULT_MAX_SIZE = 20
+
+
+class InlineReport:
+    def __init__(self):
+        self.inlined = {}  # (function name, num params) -> number of call sites
+
+    def __str__(self):
+        sites = sum(self.inlined.values())
+        lines = [f"inlined {sites} calls to {len(self.inlined)} functions"]
+        for (name, num_params), count in self.inlined.items():
+            lines.append(f"  {name}/{num_params}: {count} call sites")
+        return "\n".join(lines)
+
+
+# needs the "func" annotations from link_calls; max_sizes optionally gives other
+# limits for some functions, keyed by (name, num params)
+def inline_calls(functions, max_size=DEFAULT_MAX_SIZE, max_sizes=None):
+    report = InlineReport()
+    inlinable = set()
+    for func in functions:
+        size = max_size
+        if max_sizes is not None:
+            size = max_sizes.get((func.get("name"), len(func.get("args"))), max_size)
+        if size > 0 and _return_expression(func, size) is not None:
+            inlinable.add(id(func))
+    inlinable -= _recursive_functions(functions)
+    for node in walk_all(functions):
+        func_ast = node.get("func")
+        if node.elem_type != InterpreterBase.FCALL_NODE or func_ast is None:
+            continue
+        if id(func_ast) not in inlinable:
+            continue
+        node.elem_type = InterpreterBase.INLINE_NODE
+        node.dict["body"] = func_ast.get("statements")[0].get("expression")
+        key = (func_ast.get("name"), len(func_ast.get("args")))
+        report.inlined[key] = report.inlined.get(key, 0) + 1
+    return report
+
+
+# the expression a function's body returns, if that is all the body does
+def _return_expression(func_ast, max_size):
+    statements = func_ast.get("statements")
+    if len(statements) != 1 or statements[0].elem_type != InterpreterBase.RETURN_NODE:
+        return None
+    expression = statements[0].get("expression")
+    if expression is None or sum(1 for _ in walk(expression)) > max_size:
+        return None
+    return expression
+
+
+# ids of the functions that can call themselves, directly or not
+def _recursive_functions(functions):
+    callees = {}
+    for func in functions:
+        callees[id(func)] = {
+            id(node.get("func"))
+            for node in walk_all(func.get("statements"))
+            if node.get("func") is not None
+        }
+    recursive = set()
+    for func_id in callees:
+        seen = set()
+        stack = list(callees[func_id])
+        while stack:
+            cur = stack.pop()
+            if cur == func_id:
+                recursive.add(func_id)
+                break
+            if cur not in seen:
+                seen.add(cur)
+                stack.extend(callees.get(cur, ()))
+    return recursive
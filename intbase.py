@@ -24,7 +24,10 @@ class InterpreterBase:
     BOOL_NODE = "bool"
     STRING_NODE = "string"
     FCALL_NODE = "fcall"
+    INLINE_NODE = "inline"  # call replaced by its callee's return expression ("body")
+    INVARIANT_NODE = "invariant"  # loop-invariant "expression", computed once per run of its loop
     VAR_NODE = "var"
+    FIELD_NODE = "field"  # struct field access: name is the dotted path, fields its parts
     NOT_NODE = "!"
     VAR_DEF_NODE = "vardef"
     FIELD_DEF_NODE = "fielddef"
@@ -40,9 +43,11 @@ class InterpreterBase:
     VOID_DEF = "void"
     
     # methods
-    def __init__(self, console_output=True, inp=None):
+    def __init__(self, console_output=True, inp=None, output_sink=None, input_source=None):
         self.console_output = console_output
         self.inp = inp  # if not none, then read input from passed-in list
+        self.input_source = input_source  # if not none, read input from it instead (see sources.py)
+        self.output_sink = output_sink  # if not none, takes every output line (see sinks.py)
         self.reset()
 
     # Call to reset I/O for another run of the program
@@ -57,6 +62,8 @@ class InterpreterBase:
         pass
 
     def get_input(self):
+        if self.input_source is not None:
+            return self.input_source.next_line()
         if not self.inp:
             return input()  # Get input from keyboard if not input list provided
 
@@ -66,6 +73,14 @@ class InterpreterBase:
             return cur_input
         return None
 
+    # get_input() converted to an int, in bulk when reading from an input source
+    def get_input_int(self):
+        if self.input_source is not None:
+            val = self.input_source.next_int()
+            if val is not None:
+                return val
+        return int(self.get_input())
+
     # students must call this for any errors that they run into
     def error(self, error_type, description=None, line_num=None):
         # log the error before we throw
@@ -81,11 +96,21 @@ class InterpreterBase:
         raise Exception(f"{error_type} on line {line_num}{description}")
 
     def output(self, v):
+        if self.output_sink is not None:
+            self.output_sink.write(v)
+            return
         if self.console_output:
             print(v)
         self.output_log.append(v)
 
+    # writes out anything the output sink buffered
+    def flush_output(self):
+        if self.output_sink is not None:
+            self.output_sink.flush()
+
     def get_output(self):
+        if self.output_sink is not None:
+            return self.output_sink.lines()
         return self.output_log
 
     def get_error_type_and_line(self):
@@ -3,13 +3,22 @@ from intbase import ErrorType
 from brewparse import parse_program
 from env_v2 import EnvironmentManager
 from helper import nil, Nil
+from linker import link_calls
+from memo import MISS, make_memo_caches
+from purity import find_pure_functions
 
 class Interpreter(InterpreterBase):
     Map_func = dict() #holds functions
     return_value = False
-    def __init__(self, console_output=True, inp=None, trace_output=False):
+    def __init__(self, console_output=True, inp=None, trace_output=False, memoize=False, memo_size=1024):
         super().__init__(console_output, inp)   # call InterpreterBase's constructor
         self.env_manager = EnvironmentManager()
+        #memoize: True for every pure function, or a collection of function names
+        self.memoize = memoize
+        self.memo_size = memo_size
+        self.memo_caches = {}
+        #builtin name -> method running a call to it
+        self.builtin_calls = {"print": self.run_print, "inputi": self.run_inputi, "inputs": self.run_inputs}
 
     def get_func(self, ast):
         funcs = ast.get('functions')
@@ -36,28 +45,32 @@ class Interpreter(InterpreterBase):
 
         function = self.get_func(ast)
         main_func_node = function.get('statements')
+        self.link_diagnostics = link_calls(ast.get('functions'), self.Map_func)
+        if self.memoize:
+            pure_funcs = find_pure_functions(self.Map_func, dynamic_scope=True)
+            self.memo_caches = make_memo_caches(pure_funcs, self.memoize, self.memo_size)
         
         self.run_func(main_func_node)
 
+    def get_memo_stats(self):
+        return {key: cache.stats() for key, cache in self.memo_caches.items()}
+
     def run_defined_func(self, node):
         #func: name: main, args: [], return_type: None, statements: [fcall: name: foo, args: [int: val: 5]]
-        #get function
-        func_name = node.get('name')
-        param_num = len(node.get('args'))
-
-        if func_name == "print":
-            value = self.run_print(node)
-            return value
-        #if function is inputi, return value
-        elif func_name == "inputi":
-            return self.run_inputi(node)
-        elif func_name == "inputs":
-            return self.run_inputs(node)
-        
-        if (func_name, param_num) not in self.Map_func:
-            super().error(ErrorType.NAME_ERROR, f"Function {func_name} with {param_num} parameters not defined",)
-        
-        func_node = self.Map_func[func_name, param_num]
+        #get function, already resolved by the linker unless it's a builtin or undefined
+        func_node = node.get('func')
+        if func_node is None:
+            #builtins were tagged by the linker
+            builtin = node.get('builtin')
+            if builtin is not None:
+                return self.builtin_calls[builtin](node)
+            func_name = node.get('name')
+            param_num = len(node.get('args'))
+
+            if (func_name, param_num) not in self.Map_func:
+                super().error(ErrorType.NAME_ERROR, f"Function {func_name} with {param_num} parameters not defined",)
+            
+            func_node = self.Map_func[func_name, param_num]
         parameters = func_node.get('args')
         #get variables passed in
         variables = node.get('args')
@@ -73,7 +86,24 @@ class Interpreter(InterpreterBase):
             param_name = param.get('name')
             self.env_manager.set_variable(param_name, value)
             # self.Map[param_name] = value
-        
+
+        #pure function: reuse the result for the same argument values
+        if self.memo_caches:
+            cache = self.memo_caches.get((func_node.get('name'), len(parameters)))
+        else:
+            cache = None
+        if cache is not None:
+            key = tuple((type(v), v) for v in self.env_manager.get_scope().values())
+            result = cache.get(key)
+            if result is MISS:
+                result = self.run_func_body(func_node)
+                cache.put(key, result)
+            else:
+                self.env_manager.pop_scope()
+            return result
+        return self.run_func_body(func_node)
+
+    def run_func_body(self, func_node):
         #run statements
         func_statements = func_node.get('statements')
         for node in func_statements:
@@ -127,7 +157,7 @@ class Interpreter(InterpreterBase):
 
     def run_print(self, node):
         args = node.get('args')
-        output = ""
+        output = []
         for a in args:
             # If it is a function
             if a.elem_type == super().FCALL_NODE:
@@ -147,10 +177,10 @@ class Interpreter(InterpreterBase):
             if isinstance(value, bool):
                 value = self.convert_bool(value)
             if value is not None:
-                output += str(value)
+                output.append(str(value))
             else:
                 super().error(ErrorType.NAME_ERROR, f"Variable {var_name} is not defined")
-        super().output(output)
+        super().output("".join(output))
         return nil
         
     def convert_bool(self, val):
@@ -5,8 +5,27 @@ from enum import Enum
 
 from brewparse import parse_program
 from env_v3 import EnvironmentManager
+from escape_v3 import scalar_replace
+from inliner import DEFAULT_MAX_SIZE, inline_calls
 from intbase import InterpreterBase, ErrorType
-from type_value3 import Type, Value, TypeCheck, create_value, get_printable
+from licm import hoist_invariants
+from linker import BUILTINS, link_calls
+from loops_v3 import recognize_loop_idioms
+from memo import MISS, make_memo_caches
+from optimizer import optimize_program
+from parallel import close_pool, make_pool, mark_parallel_sites, run_call, ship_call
+from pgo_v3 import (ExecutionProfile, PGOReport, function_key, inline_sizes, load_profile,
+                    number_sites, profiled_heat, program_hash, speculate_ops)
+from partial_eval import DEFAULT_BUDGET, OutOfSteps, PartialEvaluator
+from profiler import Profiler
+from sampler import DEFAULT_INTERVAL, SamplingProfiler
+from purity import find_pure_functions, flatten_func_table
+from regvm_v3 import RegisterVM
+from specialize_v3 import specialize_ops
+from struct_v3 import StructInstance, build_layouts, resolve_field_offsets
+from tier_v3 import DEFAULT_THRESHOLD, TieredCompiler
+from typecheck_v3 import TypeChecker
+from type_value3 import Type, Value, TypeCheck, concat_strings, create_value, get_printable
 
 
 
@@ -25,9 +44,85 @@ class Interpreter(InterpreterBase):
     __TYPES = {"int", "string", "bool", "nil"}
 
     # methods
-    def __init__(self, console_output=True, inp=None, trace_output=False):
-        super().__init__(console_output, inp)
+    def __init__(self, console_output=True, inp=None, trace_output=False, memoize=False, memo_size=1024,
+                 parallel=False, optimize=False, typecheck=False, specialize=False,
+                 escape_analysis=False, inline_functions=False, inline_size=DEFAULT_MAX_SIZE,
+                 hoist_invariants=False, loop_idioms=False, partial_eval=False,
+                 partial_eval_budget=DEFAULT_BUDGET, tiered=False, tier_threshold=DEFAULT_THRESHOLD,
+                 profile_output=None, profile_input=None, register_vm=False, output_sink=None,
+                 input_source=None, profiling=False, sampling=False,
+                 sample_interval=DEFAULT_INTERVAL):
+        # output_sink: a sink from sinks.py that replaces console output and the output log
+        # input_source: a source from sources.py that replaces input() and inp
+        super().__init__(console_output, inp, output_sink, input_source)
         self.trace_output = trace_output
+        # memoize: True for every pure function, or a collection of function names
+        self.memoize = memoize
+        self.memo_size = memo_size
+        self.memo_caches = {}
+        # parallel: True, or the number of worker processes for independent pure calls
+        self.parallel = parallel
+        self.pool = None
+        self.pending = {}
+        # fold constants and drop dead code before running
+        self.optimize = optimize
+        self.optimization_report = None
+        # check types, raising before main runs the error main is certain to hit first, and skip
+        # the runtime checks it proves
+        self.typecheck = typecheck
+        self.type_diagnostics = []
+        # replace binary operators with variants for their static operand types
+        self.specialize = specialize
+        # replace structs that never leave their function with a local per field
+        self.escape_analysis = escape_analysis
+        self.escape_report = None
+        self.struct_allocations = 0
+        # evaluate calls to small non-recursive functions in place of running their body
+        self.inline_functions = inline_functions
+        self.inline_size = inline_size
+        self.inline_report = None
+        # compute loop-invariant expressions once per run of their loop
+        self.hoist_invariants = hoist_invariants
+        self.hoist_report = None
+        self.invariant_values = {}  # invariant node -> value for the loop running it
+        # compute counting loops that only sum integer expressions without iterating
+        self.loop_idioms = loop_idioms
+        self.loop_idiom_report = None
+        # run pure calls with literal arguments while optimizing (implies optimize)
+        self.partial_eval = partial_eval
+        self.partial_eval_budget = partial_eval_budget
+        self.partial_eval_report = None
+        self.steps_left = None  # blocks a partially evaluated call may still enter
+        # compile functions to Python once their calls and loop iterations reach tier_threshold
+        self.tiered = tiered
+        self.tier_threshold = tier_threshold
+        self.tier = None
+        self.tier_report = None
+        # record an execution profile to this path (everything runs on the tree walker)
+        self.profile_output = profile_output
+        self.profile = None
+        # let the profile at this path guide inlining, specialization and tiering
+        self.profile_input = profile_input
+        self.pgo_report = None
+        # run the functions the type checker fully proved as register machine code
+        self.register_vm = register_vm
+        self.vm = None
+        self.vm_report = None
+        # time every call and count every statement run in self.profiler (everything runs on
+        # the tree walker); without it the methods below are never wrapped
+        self.profiler = None
+        if profiling:
+            self.profiler = Profiler()
+            self.__call_bound = self.profiler.time_calls(self.__call_bound)
+            self.__eval_inline = self.profiler.time_calls(self.__eval_inline, inline=True)
+            self.__run_statement = self.profiler.count_statements(self.__run_statement)
+        # count the Brewin call stack every sample_interval seconds in self.sampler while main
+        # runs (everything runs on the tree walker); without it the methods below are never wrapped
+        self.sampler = None
+        if sampling:
+            self.sampler = SamplingProfiler(Interpreter.__run_statement.__code__, sample_interval)
+            self.__call_bound = self.sampler.track_calls(self.__call_bound)
+            self.__eval_inline = self.sampler.track_calls(self.__eval_inline, inline=True)
         self.__setup_ops()
 
     # run a program that's provided in a string
@@ -35,10 +130,118 @@ class Interpreter(InterpreterBase):
     # into an abstract syntax tree (ast)
     def run(self, program):
         ast = parse_program(program)
+        guide = None
+        if self.profile_output is not None or self.profile_input is not None:
+            digest = program_hash(ast)
+            number_sites(ast.get("functions"))
+            if self.profile_output is not None:
+                self.profile = ExecutionProfile(digest)
+            if self.profile_input is not None:
+                guide = self.__load_guide(digest)
         self.__set_up_structs(ast)
         self.__set_up_function_table(ast)
+        if self.optimize or self.partial_eval:
+            evaluator = self.__make_partial_evaluator() if self.partial_eval else None
+            self.optimization_report = optimize_program(ast, "v3", evaluator)
+            self.__set_up_function_table(ast)
+        if self.escape_analysis:
+            self.escape_report = scalar_replace(ast.get("functions"), self.structs)
+        if self.typecheck or self.specialize or self.tiered or self.register_vm:
+            checker = TypeChecker(self.structs, self.func_name_to_ast)
+            self.type_diagnostics = checker.check_program(ast.get("functions"))
+            main_ast = self.func_name_to_ast.get("main", {}).get(0)
+            if self.typecheck and main_ast is not None:
+                error = checker.certain_error(main_ast)
+                if error is not None:
+                    error_type, message = error
+                    super().error(error_type, message)
+            resolve_field_offsets(ast.get("functions"), self.struct_layouts)
+        if self.specialize:
+            specialize_ops(ast.get("functions"), self.structs)
+        if guide is not None:
+            self.pgo_report.speculated = speculate_ops(guide, ast.get("functions"), self.structs)
+        func_table = flatten_func_table(self.func_name_to_ast)
+        self.link_diagnostics = link_calls(ast.get("functions"), func_table)
+        if self.inline_functions:
+            max_sizes = None
+            if guide is not None:
+                max_sizes = inline_sizes(guide, ast.get("functions"), self.inline_size, self.pgo_report)
+            self.inline_report = inline_calls(ast.get("functions"), self.inline_size, max_sizes)
+        if self.loop_idioms:
+            self.loop_idiom_report = recognize_loop_idioms(ast.get("functions"))
+        if self.hoist_invariants:
+            self.hoist_report = hoist_invariants(ast.get("functions"))
+        if self.memoize or self.parallel:
+            pure_funcs = find_pure_functions(func_table)
+        if self.memoize:
+            self.memo_caches = make_memo_caches(pure_funcs, self.memoize, self.memo_size)
+        if self.parallel and mark_parallel_sites(ast.get("functions"), pure_funcs):
+            workers = None if self.parallel is True else self.parallel
+            self.pool = make_pool(type(self), self.func_name_to_ast, self.structs, workers)
+        if self.profiler is not None:
+            self.profiler.program = ast.get("functions")
+            self.profiler.source = program
+        if self.sampler is not None:
+            self.sampler.program = ast.get("functions")
+        if self.register_vm and self.profile is None and self.profiler is None and self.sampler is None:
+            self.vm = RegisterVM(self, ast.get("functions"))
+            self.vm_report = self.vm.report
+        if self.tiered and self.profile is None and self.profiler is None and self.sampler is None:
+            self.tier = TieredCompiler(self, ast.get("functions"), self.tier_threshold)
+            self.tier_report = self.tier.report
+            if guide is not None:
+                for func_ast, heat in profiled_heat(guide, ast.get("functions")).items():
+                    if heat >= self.tier_threshold and self.tier.precompile(func_ast):
+                        self.pgo_report.precompiled.append(function_key(func_ast))
         self.env = EnvironmentManager()
-        self.__call_func_aux("main", [])
+        self.invariant_values = {}
+        if self.sampler is not None:
+            self.sampler.start()
+        finished = False
+        try:
+            self.__call_func_aux("main", [])
+            finished = True
+        finally:
+            if self.sampler is not None:
+                self.sampler.stop()
+            if self.pool is not None:
+                close_pool(self.pool, finished)
+                self.pool = None
+            self.pending = {}
+            if self.profile is not None:
+                self.profile.save(self.profile_output)
+            super().flush_output()
+
+    # evaluates a single call expression outside of run(); used by worker processes
+    def evaluate_call(self, call_ast):
+        self.env = EnvironmentManager()
+        return self.__call_func(call_ast)
+
+    # the profile at profile_input if it was recorded for this program, else None
+    def __load_guide(self, digest):
+        self.pgo_report = PGOReport()
+        try:
+            profile = load_profile(self.profile_input)
+        except (OSError, ValueError, KeyError):
+            return None
+        if profile is None or profile.program != digest:
+            return None
+        self.pgo_report.used = True
+        return profile
+
+    # evaluates pure calls on a separate interpreter sharing the program's tables
+    def __make_partial_evaluator(self):
+        sandbox = type(self)(console_output=False)
+        sandbox.func_name_to_ast = self.func_name_to_ast
+        sandbox.structs = self.structs
+        sandbox.struct_layouts = self.struct_layouts
+        pure_funcs = find_pure_functions(flatten_func_table(self.func_name_to_ast))
+        evaluator = PartialEvaluator(sandbox, pure_funcs, self.partial_eval_budget)
+        self.partial_eval_report = evaluator.report
+        return evaluator
+
+    def get_memo_stats(self):
+        return {key: cache.stats() for key, cache in self.memo_caches.items()}
 
     def __set_up_structs(self, ast):
         self.structs = {}
@@ -52,6 +255,7 @@ class Interpreter(InterpreterBase):
                 val = Value(field_type, field_name)
                 struct_dict[field_name] = val
             self.structs[struct_name] = struct_dict
+        self.struct_layouts = build_layouts(self.structs)
 
     def __get_struct(self, name):
         if name not in self.structs:
@@ -97,6 +301,10 @@ class Interpreter(InterpreterBase):
         return candidate_funcs[num_params]
 
     def __run_statements(self, statements):
+        if self.steps_left is not None:
+            self.steps_left -= 1
+            if self.steps_left < 0:
+                raise OutOfSteps()
         self.env.push_block()
         for statement in statements:
             if self.trace_output:
@@ -114,6 +322,8 @@ class Interpreter(InterpreterBase):
         return_val = None
         if statement.elem_type == InterpreterBase.FCALL_NODE:
             self.__call_func(statement)
+        elif statement.elem_type == InterpreterBase.INLINE_NODE:
+            self.__eval_inline(statement)
         elif statement.elem_type == "=":
             self.__assign(statement)
         elif statement.elem_type == InterpreterBase.VAR_DEF_NODE:
@@ -127,28 +337,93 @@ class Interpreter(InterpreterBase):
 
         return (status, return_val)
     
+    # start independent pure calls among the operands of node on the worker pool
+    def __dispatch_parallel(self, node):
+        for call_ast in node.get("parallel_calls"):
+            if call_ast not in self.pending:
+                payload = ship_call(call_ast)
+                if payload is not None:  # otherwise the call runs here when it's reached
+                    self.pending[call_ast] = self.pool.submit(run_call, payload)
+
+    # wait for a dispatched call; errors surface here, in sequential order
+    def __join_parallel(self, call_ast):
+        ok, result, error_type = self.pending.pop(call_ast).result()
+        if ok:
+            return result
+        if error_type is not None:
+            self.error_type = error_type
+        raise result
+
     def __call_func(self, call_node):
-        func_name = call_node.get("name")
+        if self.pool is not None and call_node.get("parallel_calls"):
+            self.__dispatch_parallel(call_node)
         actual_args = call_node.get("args")
+        # calls resolved by the linker go straight to their target
+        func_ast = call_node.get("func")
+        if func_ast is not None:
+            return self.__call_user_func(func_ast, actual_args, call_node.get("checked"))
+        # and builtins were tagged by it
+        builtin = call_node.get("builtin")
+        if builtin is not None:
+            return self.__call_builtin(builtin, actual_args)
+        func_name = call_node.get("name")
         return self.__call_func_aux(func_name, actual_args)
 
     def __call_func_aux(self, func_name, actual_args):
+        if func_name in BUILTINS:
+            return self.__call_builtin(func_name, actual_args)
+        func_ast = self.__get_func_by_name(func_name, len(actual_args))
+        return self.__call_user_func(func_ast, actual_args)
+
+    def __call_builtin(self, func_name, actual_args):
         if func_name == "print":
             return self.__call_print(actual_args)
-        if func_name == "inputi" or func_name == "inputs":
-            return self.__call_input(func_name, actual_args)
+        return self.__call_input(func_name, actual_args)
 
-        func_ast = self.__get_func_by_name(func_name, len(actual_args))
-        return_type = func_ast.get('return_type')
+    def __call_user_func(self, func_ast, actual_args, checked=False):
+        args = self.__bind_args(func_ast, actual_args, checked)
+        return self.__call_bound(func_ast, args)
+
+    # calls a user function for compiled or register machine code, given the Python values of its arguments
+    def call_from_compiled(self, func_ast, values):
+        args = {}
+        for formal_ast, value in zip(func_ast.get("args"), values):
+            args[formal_ast.get("name")] = Value(formal_ast.get("var_type"), value)
+        return self.__call_bound(func_ast, args).value()
+
+    def __call_bound(self, func_ast, args):
+        if self.profile is not None:
+            self.profile.record_call(func_ast)
+        # pure functions reuse the result computed for the same argument values
+        cache = self.memo_caches.get((func_ast.get("name"), len(args)))
+        if cache is not None:
+            key = tuple((value.type(), value.value()) for value in args.values())
+            return_val = cache.get(key)
+            if return_val is MISS:
+                return_val = self.__run_func_body(func_ast, args)
+                cache.put(key, return_val)
+            return return_val
+        return self.__run_func_body(func_ast, args)
+
+    # evaluates a call the inliner replaced with the callee's return expression
+    def __eval_inline(self, inline_ast):
+        func_ast = inline_ast.get("func")
+        if self.profile is not None:
+            self.profile.record_call(func_ast)
+        args = self.__bind_args(func_ast, inline_ast.get("args"), inline_ast.get("checked"))
+        self.env.push_func(args)
+        return_val = self.__eval_expr(inline_ast.get("body"))
+        self.env.pop_func()
+        return self.__check_return(func_ast, return_val)
+
+    # evaluates the actual parameters and maps each formal parameter name to its value
+    def __bind_args(self, func_ast, actual_args, checked):
         formal_args = func_ast.get("args")
-        if len(actual_args) != len(formal_args):
-            super().error(
-                ErrorType.NAME_ERROR,
-                f"Function {func_ast.get('name')} with {len(actual_args)} args not found",
-            )
-    
-        # first evaluate all of the actual parameters and associate them with the formal parameter names
         args = {}
+        if checked:  # the type checker proved every argument has its formal type
+            for formal_ast, actual_ast in zip(formal_args, actual_args):
+                args[formal_ast.get("name")] = self.__eval_expr(actual_ast)
+            actual_args = ()
         for formal_ast, actual_ast in zip(formal_args, actual_args):
             result = copy.copy(self.__eval_expr(actual_ast))
             # print("actual parameter", result.type())
@@ -165,7 +440,18 @@ class Interpreter(InterpreterBase):
                     ErrorType.TYPE_ERROR, f"Incompatable types {actual_type} and {formal_type} in parameter passing"
                 )
             args[arg_name] = result
+        return args
 
+    def __run_func_body(self, func_ast, args):
+        if self.tier is not None:
+            compiled = self.tier.compiled.get(func_ast)
+            if compiled is not None:
+                return self.tier.run(func_ast, compiled, args)
+            self.tier.warm(func_ast)
+        if self.vm is not None:
+            vm_func = func_ast.get("vm")
+            if vm_func is not None:
+                return self.vm.run(func_ast, vm_func, args)
         # then create the new activation record 
         self.env.push_func()
         # and add the formal arguments to the activation record
@@ -173,6 +459,14 @@ class Interpreter(InterpreterBase):
           self.env.create(arg_name, value.value(), value.type())
         _, return_val = self.__run_statements(func_ast.get("statements"))
         self.env.pop_func()
+        return self.__check_return(func_ast, return_val)
+
+    def __check_return(self, func_ast, return_val):
+        return_type = func_ast.get('return_type')
+        if func_ast.get("checked_return"):
+            if return_type == "void":
+                return Value(Type.NIL, "void")
+            return return_val
         return_val_type = return_val.type()
         # print(return_val_type, return_type)
         if return_type == "void":
@@ -200,7 +494,7 @@ class Interpreter(InterpreterBase):
         return return_val
 
     def __call_print(self, args):
-        output = ""
+        output = []
         for arg in args:
             result = self.__eval_expr(arg)  # result is a Value object
             if result.value() == "void":
@@ -209,8 +503,8 @@ class Interpreter(InterpreterBase):
                 )
             if result.type() in self.structs:
                 result = result.value()
-            output = output + get_printable(result)
-        super().output(output)
+            output.append(get_printable(result))
+        super().output("".join(output))
         return Interpreter.NIL_VALUE
 
     def __call_input(self, name, args):
@@ -221,15 +515,13 @@ class Interpreter(InterpreterBase):
             super().error(
                 ErrorType.NAME_ERROR, "No inputi() function that takes > 1 parameter"
             )
-        inp = super().get_input()
         if name == "inputi":
-            val =  Value(Type.INT, int(inp))
+            val =  Value(Type.INT, super().get_input_int())
             return val
         if name == "inputs":
-            return Value(Type.STRING, inp)
+            return Value(Type.STRING, super().get_input())
 
-    def __get_field(self, var_name):
-        fields = var_name.split('.')
+    def __get_field(self, fields):
         #get from env
         name = self.env.get(fields[0])
         # print("name", name.value())
@@ -257,13 +549,13 @@ class Interpreter(InterpreterBase):
                 super().error(
                     ErrorType.FAULT_ERROR, "not defined yet with new"
                 )  
-            if field not in name.value():
+            #the actual struct thats been created alrdy
+            struct = name.value()
+            field_to_be_assigned = struct.get_field(field)
+            if field_to_be_assigned is None:
                 super().error(
                     ErrorType.NAME_ERROR, f"{field} not in struct"
                 )  
-            #the actual struct thats been created alrdy
-            struct = name.value()
-            field_to_be_assigned = struct.get(field)
             #print("field to be assigned", field_to_be_assigned.value(), field_to_be_assigned.type())
             return field_to_be_assigned
         elif len(fields) > 2:
@@ -277,22 +569,31 @@ class Interpreter(InterpreterBase):
                         ErrorType.FAULT_ERROR, "not defined yet with new"
                     ) 
                 #get next field
-                if field not in name.value():
+                struct = name.value()
+                if not isinstance(struct, StructInstance) or struct.get_field(field) is None:
                     super().error(
                         ErrorType.NAME_ERROR, f"{field} not in struct"
                     ) 
-                struct = name.value()
-                name = struct.get(field)
+                name = struct.get_field(field)
             return name
             
 
     def __assign(self, assign_ast):
         var_name = assign_ast.get("name")
         value_obj = self.__eval_expr(assign_ast.get("expression"))
+        if assign_ast.get("checked"):
+            self.env.set(var_name, value_obj)
+            return
         # print("return", value_obj)
         # print(assign_ast)
-        if '.' in var_name:
-            field = self.__get_field(var_name)
+        fields = assign_ast.get("fields")
+        if fields is not None:
+            slot = self.__resolve_offsets(assign_ast)
+            if slot is not None:
+                struct, offset = slot
+                field = struct.slots[offset]
+            else:
+                field = self.__get_field(fields)
             var_type = field.type()
             val_type = value_obj.type()
             # print(value_obj.value())
@@ -305,7 +606,9 @@ class Interpreter(InterpreterBase):
                 super().error(
                     ErrorType.TYPE_ERROR, f"Incompatable types {var_type} and {val_type} in assignment"
                 )
-            if not self.env.set_struct(var_name, value_obj):
+            if slot is not None:
+                struct.slots[offset] = value_obj
+            elif not self.env.set_struct(fields, value_obj):
                 super().error(
                     ErrorType.NAME_ERROR, f"Undefined variable {var_name} in assignment"
                 )
@@ -366,67 +669,6 @@ class Interpreter(InterpreterBase):
         if expr_ast.elem_type == InterpreterBase.BOOL_NODE:
             return Value(Type.BOOL, expr_ast.get("val"))
         if expr_ast.elem_type == InterpreterBase.VAR_NODE:
-            #if dot operator
-            if "." in expr_ast.get('name'):
-                struct_name = expr_ast.get('name')
-                fields = struct_name.split('.')
-
-                name = self.env.get(fields[0])
-
-                #check if struct
-                if name.type() not in self.structs:
-                    super().error(
-                        ErrorType.TYPE_ERROR, f"{fields[0]} not defined or not a struct type"
-                    )
-                if name.value() == super().NIL_NODE:
-                    super().error(
-                        ErrorType.FAULT_ERROR, f"Cannot access {fields[0]} because it is nil"
-                    )
-
-                cur_struct = name.value()
-                for field in fields[1:-1]:
-                    # Ensure the current value is a struct
-                    # print(cur_struct)
-                    if cur_struct == None:
-                        super().error(
-                            ErrorType.FAULT_ERROR, f"is none"
-                        )
-                    if not isinstance(cur_struct, dict):
-                        super().error(
-                            ErrorType.TYPE_ERROR, f"{field} is not a valid field of a struct"
-                        )
-                    if field not in cur_struct:
-                        super().error(
-                            ErrorType.FAULT_ERROR, f"{field} not found in struct"
-                        )
-
-                    # Move to the next field
-                    cur_struct = cur_struct[field].value()
-
-                    # If the value is nil, raise a fault error
-                    if cur_struct == super().NIL_NODE:
-                        super().error(
-                            ErrorType.NAME_ERROR, f"Cannot access {field} because it is nil"
-                        )
-                # Get the final field and its value/type
-                final_field = fields[-1]
-                if cur_struct == None:
-                    super().error(
-                        ErrorType.FAULT_ERROR, f"is none"
-                    )
-                if not isinstance(cur_struct, dict):
-                    super().error(
-                        ErrorType.FAULT_ERROR, f"{fields[-1]} is not a valid field of a struct"
-                    )
-                if final_field not in cur_struct:
-                    super().error(
-                        ErrorType.NAME_ERROR, f"{final_field} not found in struct"
-                    )
-
-                val = cur_struct[final_field].value()
-                typ = cur_struct[final_field].type()
-                return Value(typ, val)
-            
             var_name = expr_ast.get("name")
             val = self.env.get(var_name)
             if val is None:
@@ -436,8 +678,20 @@ class Interpreter(InterpreterBase):
                 return Value(val.type(), val.value())
             # print("Variable: ", val)
             return val
+        if expr_ast.elem_type == InterpreterBase.FIELD_NODE:
+            return self.__eval_field(expr_ast)
         if expr_ast.elem_type == InterpreterBase.FCALL_NODE:
+            if self.pending and expr_ast in self.pending:
+                return self.__join_parallel(expr_ast)
             return self.__call_func(expr_ast)
+        if expr_ast.elem_type == InterpreterBase.INLINE_NODE:
+            return self.__eval_inline(expr_ast)
+        if expr_ast.elem_type == InterpreterBase.INVARIANT_NODE:
+            value = self.invariant_values.get(expr_ast)
+            if value is None:
+                value = self.__eval_expr(expr_ast.get("expression"))
+                self.invariant_values[expr_ast] = value
+            return value
         if expr_ast.elem_type in Interpreter.BIN_OPS:
             return self.__eval_op(expr_ast)
         if expr_ast.elem_type == Interpreter.NEG_NODE:
@@ -450,30 +704,101 @@ class Interpreter(InterpreterBase):
             struct_type = expr_ast.get('var_type')
             if not struct_type in self.structs:
                 super().error(ErrorType.TYPE_ERROR, f"Struct type {struct_type} not found")
-            struct_def = self.structs[struct_type]
-            new_struct = {}
-            for obj_name, value in struct_def.items():
-                type = value.type()
-                name = value.value()
-                # print("name", obj_name)
-                # print("type", type)
-                if type == Type.INT:
-                    new_struct[name] = Value(Type.INT, 0)
-                elif type == Type.STRING:
-                    new_struct[name] = Value(Type.STRING, "")
-                elif type == Type.BOOL:
-                    new_struct[name] = Value(Type.BOOL, False)
-                elif type in self.structs:
-                    new_struct[name] = Value(type, super().NIL_NODE)
-                else:
-                    super().error(
-                        ErrorType.TYPE_ERROR, f"Invalid field type {type}"
-                    )
-            return Value(struct_type, new_struct)
+            layout = self.struct_layouts[struct_type]
+            if layout.invalid_type is not None:
+                super().error(
+                    ErrorType.TYPE_ERROR, f"Invalid field type {layout.invalid_type}"
+                )
+            self.struct_allocations += 1
+            return Value(struct_type, layout.new_instance())
         if expr_ast.elem_tyoe in self.structs:
             print("struct")
         
         
+    def __eval_field(self, field_ast):
+        slot = self.__resolve_offsets(field_ast)
+        if slot is not None:
+            struct, offset = slot
+            field_value = struct.slots[offset]
+            return Value(field_value.type(), field_value.value())
+        fields = field_ast.get("fields")
+
+        name = self.env.get(fields[0])
+
+        #check if struct
+        if name.type() not in self.structs:
+            super().error(
+                ErrorType.TYPE_ERROR, f"{fields[0]} not defined or not a struct type"
+            )
+        if name.value() == super().NIL_NODE:
+            super().error(
+                ErrorType.FAULT_ERROR, f"Cannot access {fields[0]} because it is nil"
+            )
+
+        cur_struct = name.value()
+        for field in fields[1:-1]:
+            # Ensure the current value is a struct
+            # print(cur_struct)
+            if cur_struct == None:
+                super().error(
+                    ErrorType.FAULT_ERROR, f"is none"
+                )
+            if not isinstance(cur_struct, StructInstance):
+                super().error(
+                    ErrorType.TYPE_ERROR, f"{field} is not a valid field of a struct"
+                )
+            field_value = cur_struct.get_field(field)
+            if field_value is None:
+                super().error(
+                    ErrorType.FAULT_ERROR, f"{field} not found in struct"
+                )
+
+            # Move to the next field
+            cur_struct = field_value.value()
+
+            # If the value is nil, raise a fault error
+            if cur_struct == super().NIL_NODE:
+                super().error(
+                    ErrorType.NAME_ERROR, f"Cannot access {field} because it is nil"
+                )
+        # Get the final field and its value/type
+        final_field = fields[-1]
+        if cur_struct == None:
+            super().error(
+                ErrorType.FAULT_ERROR, f"is none"
+            )
+        if not isinstance(cur_struct, StructInstance):
+            super().error(
+                ErrorType.FAULT_ERROR, f"{fields[-1]} is not a valid field of a struct"
+            )
+        field_value = cur_struct.get_field(final_field)
+        if field_value is None:
+            super().error(
+                ErrorType.NAME_ERROR, f"{final_field} not found in struct"
+            )
+        return Value(field_value.type(), field_value.value())
+
+    # Follows the field offsets resolved ahead of time for a field access or
+    # assignment, returning the struct instance that holds the last field and its
+    # offset. Returns None if they weren't resolved or a struct on the path isn't the
+    # expected instance (e.g. it's nil); the caller then takes the checked path.
+    def __resolve_offsets(self, node):
+        offsets = node.get("offsets")
+        if offsets is None:
+            return None
+        base = self.env.get(node.get("fields")[0])
+        if base is None:
+            return None
+        struct = base.value()
+        for layout, offset in offsets[:-1]:
+            if not isinstance(struct, StructInstance) or struct.layout is not layout:
+                return None
+            struct = struct.slots[offset].value()
+        layout, offset = offsets[-1]
+        if not isinstance(struct, StructInstance) or struct.layout is not layout:
+            return None
+        return struct, offset
+
     def __coerce_to_bool(self, value_obj):
         if value_obj.type() == Type.BOOL:
             return value_obj
@@ -485,12 +810,36 @@ class Interpreter(InterpreterBase):
         
     def __eval_op(self, arith_ast):
         # print(arith_ast)
+        if self.pool is not None and arith_ast.get("parallel_calls"):
+            self.__dispatch_parallel(arith_ast)
+        spec = arith_ast.get("spec")
+        if self.profile is not None:  # every operator takes the path that sees its operands
+            left_value_obj = self.__eval_expr(arith_ast.get("op1"))
+            right_value_obj = self.__eval_expr(arith_ast.get("op2"))
+            self.profile.record_operands(arith_ast, left_value_obj.type(), right_value_obj.type())
+            result = spec(left_value_obj, right_value_obj) if spec is not None else None
+            if result is not None:
+                return result
+            return self.__apply_op(arith_ast, left_value_obj, right_value_obj)
+        if spec is not None:
+            left_value_obj = self.__eval_expr(arith_ast.get("op1"))
+            right_value_obj = self.__eval_expr(arith_ast.get("op2"))
+            result = spec(left_value_obj, right_value_obj)
+            if result is not None:
+                return result
+            return self.__apply_op(arith_ast, left_value_obj, right_value_obj)
+        checked_type = arith_ast.get("checked")
+        if checked_type is not None:
+            return self.__eval_checked_op(arith_ast, checked_type)
         left_value_obj = self.__eval_expr(arith_ast.get("op1"))
         right_value_obj = self.__eval_expr(arith_ast.get("op2"))
+        return self.__apply_op(arith_ast, left_value_obj, right_value_obj)
+
+    def __apply_op(self, arith_ast, left_value_obj, right_value_obj):
         # print("left", left_value_obj.value(), left_value_obj.type())
         # print("right", right_value_obj.value(), right_value_obj.type())
        
-        if left_value_obj.value() == "void" or right_value_obj.value() == "void":
+        if left_value_obj.is_void() or right_value_obj.is_void():
             super().error(
                 ErrorType.TYPE_ERROR,
                 f"Using return in expression",
@@ -544,14 +893,14 @@ class Interpreter(InterpreterBase):
 
         if left_value_obj.type() == Type.NIL:
             left_is_nil = True
-        elif isinstance(left_value_obj.value(), Value) and left_value_obj.value().value() is None:
+        elif left_value_obj.type() != Type.STRING and isinstance(left_value_obj.value(), Value) and left_value_obj.value().value() is None:
             left_is_nil = True
         else: 
             left_is_nil = False
         
         if right_value_obj.type() == Type.NIL:
             right_is_nil = True
-        elif isinstance(right_value_obj.value(), Value) and right_value_obj.value().value() is None:
+        elif right_value_obj.type() != Type.STRING and isinstance(right_value_obj.value(), Value) and right_value_obj.value().value() is None:
             right_is_nil = True
         else: 
             right_is_nil = False
@@ -599,6 +948,17 @@ class Interpreter(InterpreterBase):
         f = self.op_to_lambda[left_value_obj.type()][arith_ast.elem_type]
         return f(left_value_obj, right_value_obj)
 
+    # both operands are proven to have type t, which supports the operator
+    def __eval_checked_op(self, arith_ast, t):
+        left_value_obj = self.__eval_expr(arith_ast.get("op1"))
+        right_value_obj = self.__eval_expr(arith_ast.get("op2"))
+        if t == Type.STRING and (left_value_obj.is_void() or right_value_obj.is_void()):
+            super().error(
+                ErrorType.TYPE_ERROR,
+                f"Using return in expression",
+            )
+        return self.op_to_lambda[t][arith_ast.elem_type](left_value_obj, right_value_obj)
+
     def __compatible_types(self, oper, obj1, obj2):
         # DOCUMENT: allow comparisons ==/!= of anything against anything
         if oper in ["==", "!="]:
@@ -654,9 +1014,7 @@ class Interpreter(InterpreterBase):
         )
         #  set up operations on strings
         self.op_to_lambda[Type.STRING] = {}
-        self.op_to_lambda[Type.STRING]["+"] = lambda x, y: Value(
-            x.type(), x.value() + y.value()
-        )
+        self.op_to_lambda[Type.STRING]["+"] = concat_strings
         self.op_to_lambda[Type.STRING]["=="] = lambda x, y: Value(
             Type.BOOL, x.value() == y.value()
         )
@@ -697,6 +1055,8 @@ class Interpreter(InterpreterBase):
                 ErrorType.TYPE_ERROR,
                 "Incompatible type for if condition",
             )
+        if self.profile is not None:
+            self.profile.record_branch(if_ast, result.value())
         if result.value():
             statements = if_ast.get("statements")
             status, return_val = self.__run_statements(statements)
@@ -710,11 +1070,31 @@ class Interpreter(InterpreterBase):
         return (ExecStatus.CONTINUE, Interpreter.NIL_VALUE)
 
     def __do_for(self, for_ast):
+        invariants = for_ast.get("invariants")
+        if invariants is None:
+            return self.__run_for(for_ast)
+        # start without values, and keep those of an outer run of the same loop (in a
+        # recursive call) for when this one finishes
+        saved = [self.invariant_values.pop(node, None) for node in invariants]
+        result = self.__run_for(for_ast)
+        for node, value in zip(invariants, saved):
+            if value is None:
+                self.invariant_values.pop(node, None)
+            else:
+                self.invariant_values[node] = value
+        return result
+
+    def __run_for(self, for_ast):
         init_ast = for_ast.get("init") 
         cond_ast = for_ast.get("condition")
         update_ast = for_ast.get("update") 
 
         self.__run_statement(init_ast)  # initialize counter variable
+        idiom = for_ast.get("idiom")
+        if idiom is not None and self.__run_idiom(idiom):
+            return (ExecStatus.CONTINUE, Interpreter.NIL_VALUE)
+        owner = for_ast.get("owner") if self.tier is not None else None
+        iterations = 0
         run_for = Interpreter.TRUE_VALUE
         while run_for.value():
             run_for = self.__eval_expr(cond_ast)  # check for-loop condition
@@ -726,14 +1106,36 @@ class Interpreter(InterpreterBase):
                     "Incompatible type for for condition",
                 )
             if run_for.value():
+                iterations += 1
                 statements = for_ast.get("statements")
                 status, return_val = self.__run_statements(statements)
                 if status == ExecStatus.RETURN:
+                    if self.profile is not None:
+                        self.profile.record_loop(for_ast, iterations)
                     return status, return_val
                 self.__run_statement(update_ast)  # update counter variable
+                if owner is not None:
+                    self.tier.warm(owner)
 
+        if self.profile is not None:
+            self.profile.record_loop(for_ast, iterations)
         return (ExecStatus.CONTINUE, Interpreter.NIL_VALUE)
 
+    # sets the variables a recognized loop leaves behind; False if it has to iterate
+    def __run_idiom(self, idiom):
+        values = {}
+        for name in idiom.names:
+            value = self.env.get(name)
+            if value is None or value.type() != Type.INT:
+                return False
+            values[name] = value.value()
+        result = idiom.run(values)
+        if result is None:
+            return False
+        for name, value in result.items():
+            self.env.set(name, Value(Type.INT, value))
+        return True
+
     def __do_return(self, return_ast):
         expr_ast = return_ast.get("expression")
         if expr_ast is None:
@@ -755,4 +1157,5 @@ func main() : void {
     interpreter = Interpreter()
     interpreter.run(program)  
 
-main()
+if __name__ == "__main__":
+    main()
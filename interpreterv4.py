@@ -5,8 +5,18 @@ from enum import Enum
 
 from brewparse import parse_program
 from env_v4 import EnvironmentManager, Closure, Exception
+from hashcons import hash_cons
+from inline_cache import install_inline_caches, summarize
+from inliner import DEFAULT_MAX_SIZE, inline_calls
 from intbase import InterpreterBase, ErrorType
-from type_value4 import Type, Value, create_value, get_printable
+from linker import BUILTINS, link_calls
+from optimizer import optimize_program
+from partial_eval import DEFAULT_BUDGET, OutOfSteps, PartialEvaluator
+from profiler import Profiler
+from sampler import DEFAULT_INTERVAL, SamplingProfiler
+from purity import find_pure_functions, flatten_func_table
+from type_value4 import (NIL, Type, Value, box, concat_strings, create_value, get_printable, get_printable_unboxed,
+                         type_of)
 
 
 class ExecStatus(Enum):
@@ -23,10 +33,55 @@ class Interpreter(InterpreterBase):
     BIN_OPS = {"+", "-", "*", "/", "==", "!=", ">", ">=", "<", "<=", "||", "&&"}
 
     # methods
-    def __init__(self, console_output=True, inp=None, trace_output=False):
-        super().__init__(console_output, inp)
+    def __init__(self, console_output=True, inp=None, trace_output=False, hash_cons=False, optimize=False,
+                 inline_cache=False, inline_functions=False, inline_size=DEFAULT_MAX_SIZE,
+                 partial_eval=False, partial_eval_budget=DEFAULT_BUDGET, unboxed=False, output_sink=None,
+                 input_source=None, profiling=False, sampling=False,
+                 sample_interval=DEFAULT_INTERVAL):
+        # output_sink: a sink from sinks.py that replaces console output and the output log
+        # input_source: a source from sources.py that replaces input() and inp
+        super().__init__(console_output, inp, output_sink, input_source)
         self.trace_output = trace_output
+        # share one thunk between identical expressions over identical bindings
+        self.hash_cons = hash_cons
+        # fold constants and drop dead code before running
+        self.optimize = optimize
+        self.optimization_report = None
+        # cache the operator handler for the operand types seen at each node
+        self.inline_cache = inline_cache
+        self.inline_caches = []
+        # evaluate calls to small non-recursive functions in place of running their body
+        self.inline_functions = inline_functions
+        self.inline_size = inline_size
+        self.inline_report = None
+        # run pure calls with literal arguments while optimizing (implies optimize)
+        self.partial_eval = partial_eval
+        self.partial_eval_budget = partial_eval_budget
+        self.partial_eval_report = None
+        self.steps_left = None  # blocks a partially evaluated call may still enter
+        self.thunks = None
+        # hold ints, strings and bools as Python values and nil as type_value4.NIL, and
+        # only box them into Values for evaluate_call
+        self.unboxed = unboxed
+        self.nil_value = NIL if unboxed else Interpreter.NIL_VALUE
+        # time every call and count every statement run in self.profiler; without it the
+        # methods below are never wrapped
+        self.profiler = None
+        if profiling:
+            self.profiler = Profiler()
+            self.__call_user_func = self.profiler.time_calls(self.__call_user_func)
+            self.__eval_inline = self.profiler.time_calls(self.__eval_inline, inline=True)
+            self.__run_statement = self.profiler.count_statements(self.__run_statement)
+        # count the Brewin call stack every sample_interval seconds in self.sampler while main
+        # runs (everything runs on the tree walker); without it the methods below are never wrapped
+        self.sampler = None
+        if sampling:
+            self.sampler = SamplingProfiler(Interpreter.__run_statement.__code__, sample_interval)
+            self.__call_user_func = self.sampler.track_calls(self.__call_user_func)
+            self.__eval_inline = self.sampler.track_calls(self.__eval_inline, inline=True)
         self.__setup_ops()
+        if unboxed:
+            self.__setup_unboxed_ops()
 
     # run a program that's provided in a string
     # usese the provided Parser found in brewparse.py to parse the program
@@ -34,10 +89,59 @@ class Interpreter(InterpreterBase):
     def run(self, program):
         ast = parse_program(program)
         self.__set_up_function_table(ast)
+        if self.optimize or self.partial_eval:
+            evaluator = self.__make_partial_evaluator() if self.partial_eval else None
+            self.optimization_report = optimize_program(ast, "v4", evaluator)
+            self.__set_up_function_table(ast)
+        func_table = flatten_func_table(self.func_name_to_ast)
+        self.thunks = None
+        if self.hash_cons:
+            hash_cons(ast)
+            self.pure_funcs = find_pure_functions(func_table)
+            self.thunks = {}  # expression node -> last thunk created for it
+            self.shareable = {}
+        self.link_diagnostics = link_calls(ast.get("functions"), func_table)
+        if self.inline_functions:
+            self.inline_report = inline_calls(ast.get("functions"), self.inline_size)
+        if self.inline_cache:
+            self.inline_caches = install_inline_caches(ast.get("functions"))
+        if self.profiler is not None:
+            self.profiler.program = ast.get("functions")
+            self.profiler.source = program
+        if self.sampler is not None:
+            self.sampler.program = ast.get("functions")
         self.env = EnvironmentManager()
-        val = self.__call_func_aux("main", [])
-        if isinstance(val, tuple) and isinstance(val[1], Exception):
-            super().error(ErrorType.FAULT_ERROR, "Raise statement must be caught")
+        if self.sampler is not None:
+            self.sampler.start()
+        try:
+            val = self.__call_func_aux("main", [])
+            if isinstance(val, tuple) and isinstance(val[1], Exception):
+                super().error(ErrorType.FAULT_ERROR, "Raise statement must be caught")
+        finally:
+            if self.sampler is not None:
+                self.sampler.stop()
+            super().flush_output()
+
+    # evaluates a single call expression outside of run(); used for partial evaluation
+    def evaluate_call(self, call_ast):
+        self.env = EnvironmentManager()
+        result = self.__call_func(call_ast)
+        if self.unboxed and not isinstance(result, tuple):
+            return box(result)
+        return result
+
+    # evaluates pure calls on a separate interpreter sharing the program's tables
+    def __make_partial_evaluator(self):
+        sandbox = type(self)(console_output=False)
+        sandbox.func_name_to_ast = self.func_name_to_ast
+        pure_funcs = find_pure_functions(flatten_func_table(self.func_name_to_ast))
+        evaluator = PartialEvaluator(sandbox, pure_funcs, self.partial_eval_budget)
+        self.partial_eval_report = evaluator.report
+        return evaluator
+
+    # counts of caches in each state and of hits while monomorphic/polymorphic
+    def get_ic_stats(self):
+        return summarize(self.inline_caches)
 
     def __set_up_function_table(self, ast):
         self.func_name_to_ast = {}
@@ -60,6 +164,10 @@ class Interpreter(InterpreterBase):
         return candidate_funcs[num_params]
 
     def __run_statements(self, statements):
+        if self.steps_left is not None:
+            self.steps_left -= 1
+            if self.steps_left < 0:
+                raise OutOfSteps()
         self.env.push_block()
         for statement in statements:
             if self.trace_output:
@@ -73,14 +181,19 @@ class Interpreter(InterpreterBase):
                 return (status, return_val)
 
         self.env.pop_block()
-        return (ExecStatus.CONTINUE, Interpreter.NIL_VALUE)
+        return (ExecStatus.CONTINUE, self.nil_value)
 
     def __run_statement(self, statement):
         status = ExecStatus.CONTINUE
         return_val = None
         if statement.elem_type == InterpreterBase.FCALL_NODE:
             val = self.__call_func(statement)
-            if not isinstance(val, Value) and val[0] == ExecStatus.RAISE:
+            if isinstance(val, tuple) and val[0] == ExecStatus.RAISE:
+                status = ExecStatus.RAISE
+                return_val = val[1]
+        elif statement.elem_type == InterpreterBase.INLINE_NODE:
+            val = self.__eval_inline(statement)
+            if isinstance(val, tuple) and val[0] == ExecStatus.RAISE:
                 status = ExecStatus.RAISE
                 return_val = val[1]
         elif statement.elem_type == InterpreterBase.TRY_NODE:
@@ -126,45 +239,52 @@ class Interpreter(InterpreterBase):
                 self.env.pop_block()
                 return (ExecStatus.RAISE, e)
         self.env.pop_block()  
-        return ExecStatus.CONTINUE, Interpreter.NIL_VALUE
+        return ExecStatus.CONTINUE, self.nil_value
 
     def __call_raise(self, raise_statement):
         exception = raise_statement.get("exception_type")
         value = self.__eval_expr(exception)
-        if not isinstance(value.value(), str):
+        message = value if self.unboxed else value.value()
+        if not isinstance(message, str):
             super().error(ErrorType.TYPE_ERROR, "Raise statement must evaluate to a string")
-        exception_instance = Exception(value.value())
+        exception_instance = Exception(message)
         return (ExecStatus.RAISE, exception_instance)
 
     def __call_func(self, call_node):
-        func_name = call_node.get("name")
         actual_args = call_node.get("args")
+        # calls resolved by the linker go straight to their target
+        func_ast = call_node.get("func")
+        if func_ast is not None:
+            return self.__call_user_func(func_ast, actual_args)
+        # and builtins were tagged by it
+        builtin = call_node.get("builtin")
+        if builtin is not None:
+            return self.__call_builtin(builtin, actual_args)
+        func_name = call_node.get("name")
         return self.__call_func_aux(func_name, actual_args)
 
     def __call_func_aux(self, func_name, actual_args):
+        if func_name in BUILTINS:
+            return self.__call_builtin(func_name, actual_args)
+        func_ast = self.__get_func_by_name(func_name, len(actual_args))
+        return self.__call_user_func(func_ast, actual_args)
+
+    def __call_builtin(self, func_name, actual_args):
         if func_name == "print":
             try:
                 return self.__call_print(actual_args)
             except Exception as e:
                 return (ExecStatus.RAISE, e)
-        if func_name == "inputi" or func_name == "inputs":
-            return self.__call_input(func_name, actual_args)
+        return self.__call_input(func_name, actual_args)
 
-        func_ast = self.__get_func_by_name(func_name, len(actual_args))
+    def __call_user_func(self, func_ast, actual_args):
         formal_args = func_ast.get("args")
-        if len(actual_args) != len(formal_args):
-            super().error(
-                ErrorType.NAME_ERROR,
-                f"Function {func_ast.get('name')} with {len(actual_args)} args not found",
-            ) 
 
         # first evaluate all of the actual parameters and associate them with the formal parameter names
         args = {}
         for formal_ast, actual_ast in zip(formal_args, actual_args):
             # result = copy.copy(self.__eval_expr(actual_ast))
-            environment = self.__make_copy(actual_ast)
-            # print(expression, " check ", environment)
-            result = Closure(actual_ast, environment)
+            result = self.__make_closure(actual_ast)
             arg_name = formal_ast.get("name")
             args[arg_name] = result
 
@@ -180,44 +300,90 @@ class Interpreter(InterpreterBase):
         self.env.pop_func()
         return return_val
 
+    # evaluates a call the inliner replaced with the callee's return expression; the
+    # arguments are closures, as for a call
+    def __eval_inline(self, inline_ast):
+        args = {}
+        for formal_ast, actual_ast in zip(inline_ast.get("func").get("args"), inline_ast.get("args")):
+            args[formal_ast.get("name")] = self.__make_closure(actual_ast)
+        self.env.push_func(args)
+        return_val = self.__eval_expr(inline_ast.get("body"))
+        self.env.pop_func()
+        return return_val
+
     def __call_print(self, args):
-        output = ""
+        output = []
         for arg in args:
             result = self.__eval_expr(arg)  # result is a Value object
-            val = get_printable(result)
+            val = get_printable_unboxed(result) if self.unboxed else get_printable(result)
             if isinstance(val, Exception):
                 # print("value of print", val)
                 return (ExecStatus.RAISE, val)
-            output = output + val
-        super().output(output)
-        return Interpreter.NIL_VALUE
+            output.append(val)
+        super().output("".join(output))
+        return self.nil_value
 
     def __call_input(self, name, args):
         if args is not None and len(args) == 1:
             result = self.__eval_expr(args[0])
-            super().output(get_printable(result))
+            super().output(get_printable_unboxed(result) if self.unboxed else get_printable(result))
         elif args is not None and len(args) > 1:
             super().error(
                 ErrorType.NAME_ERROR, "No inputi() function that takes > 1 parameter"
             )
-        inp = super().get_input()
         if name == "inputi":
-            return Value(Type.INT, int(inp))
+            inp = super().get_input_int()
+            return inp if self.unboxed else Value(Type.INT, inp)
         if name == "inputs":
-            return Value(Type.STRING, inp)
+            inp = super().get_input()
+            return inp if self.unboxed else Value(Type.STRING, inp)
 
     def __assign(self, assign_ast):
         var_name = assign_ast.get("name")
         # value_obj = self.__eval_expr(assign_ast.get("expression"))
         expression = assign_ast.get("expression")
-        environment = self.__make_copy(expression)
-        # print(expression, " check ", environment)
-        value_obj = Closure(expression, environment)
+        value_obj = self.__make_closure(expression)
         if not self.env.set(var_name, value_obj):
             super().error(
                 ErrorType.NAME_ERROR, f"Undefined variable {var_name} in assignment"
             )
 
+    def __make_closure(self, expr_ast):
+        environment = self.__make_copy(expr_ast)
+        # print(expression, " check ", environment)
+        if self.thunks is None or not self.__is_shareable(expr_ast):
+            return Closure(expr_ast, environment)
+        # reuse the previous thunk if it captured exactly the same bindings
+        prev = self.thunks.get(expr_ast)
+        if prev is not None:
+            _, prev_env = prev.get_closure()
+            if len(prev_env) == len(environment) and all(
+                prev_env.get(name) is value for name, value in environment.items()
+            ):
+                return prev
+        closure = Closure(expr_ast, environment)
+        self.thunks[expr_ast] = closure
+        return closure
+
+    # only expressions without side effects may share a thunk
+    def __is_shareable(self, expr_ast):
+        if expr_ast in self.shareable:
+            return self.shareable[expr_ast]
+        if expr_ast.elem_type == InterpreterBase.FCALL_NODE or expr_ast.elem_type == InterpreterBase.INLINE_NODE:
+            key = (expr_ast.get("name"), len(expr_ast.get("args")))
+            result = key in self.pure_funcs
+        else:
+            result = True
+        if result:
+            for op in ("op1", "op2"):
+                if expr_ast.get(op) is not None and not self.__is_shareable(expr_ast.get(op)):
+                    result = False
+            for arg in expr_ast.get("args") or []:
+                if not self.__is_shareable(arg):
+                    result = False
+        self.shareable[expr_ast] = result
+        return result
+
     def __make_copy(self, expr_ast):
         env = {}
         stack = [expr_ast]
@@ -234,21 +400,23 @@ class Interpreter(InterpreterBase):
                 stack.append(expr.get("op2"))
             elif expr.elem_type in [Interpreter.NEG_NODE, Interpreter.NOT_NODE]:
                  stack.append(expr.get("op1"))
-            elif expr.elem_type == InterpreterBase.FCALL_NODE:
+            elif expr.elem_type == InterpreterBase.FCALL_NODE or expr.elem_type == InterpreterBase.INLINE_NODE:
                 for arg in expr.get("args"):
                     stack.append(arg)
         return env
     
     def __var_def(self, var_ast):
         var_name = var_ast.get("name")
-        if not self.env.create(var_name, Interpreter.NIL_VALUE):
+        if not self.env.create(var_name, self.nil_value):
             super().error(
                 ErrorType.NAME_ERROR, f"Duplicate definition for variable {var_name}"
             )
 
     def __eval_expr(self, expr_ast):
+        if self.unboxed:
+            return self.__eval_unboxed(expr_ast)
         if expr_ast.elem_type == InterpreterBase.NIL_NODE:
-            return Interpreter.NIL_VALUE
+            return self.nil_value
         if expr_ast.elem_type == InterpreterBase.INT_NODE:
             return Value(Type.INT, expr_ast.get("val"))
         if expr_ast.elem_type == InterpreterBase.STRING_NODE:
@@ -263,9 +431,14 @@ class Interpreter(InterpreterBase):
             if isinstance(val, Closure):
                 return self.__eval_closure(val)
             return val
+        if expr_ast.elem_type == InterpreterBase.FIELD_NODE:
+            # Brewin# has no structs, so a dotted name is never a variable
+            super().error(ErrorType.NAME_ERROR, f"Variable {expr_ast.get('name')} not found")
         if expr_ast.elem_type == InterpreterBase.FCALL_NODE:
             return self.__call_func(expr_ast)
             # return Closure(expr_ast, self.env.environment)
+        if expr_ast.elem_type == InterpreterBase.INLINE_NODE:
+            return self.__eval_inline(expr_ast)
         if expr_ast.elem_type in Interpreter.BIN_OPS:
             result =  self.__eval_op(expr_ast)
             return result
@@ -274,6 +447,39 @@ class Interpreter(InterpreterBase):
         if expr_ast.elem_type == Interpreter.NOT_NODE:
             return self.__eval_unary(expr_ast, Type.BOOL, lambda x: not x)
 
+    # __eval_expr over unboxed values
+    def __eval_unboxed(self, expr_ast):
+        kind = expr_ast.elem_type
+        if kind == InterpreterBase.VAR_NODE:
+            var_name = expr_ast.get("name")
+            val = self.env.get(var_name)
+            if val is None:
+                super().error(ErrorType.NAME_ERROR, f"Variable {var_name} not found")
+            if isinstance(val, Closure):
+                return self.__eval_closure(val)
+            return val
+        if kind in Interpreter.BIN_OPS:
+            return self.__eval_op_unboxed(expr_ast)
+        if kind == InterpreterBase.INT_NODE or kind == InterpreterBase.STRING_NODE or kind == InterpreterBase.BOOL_NODE:
+            return expr_ast.get("val")
+        if kind == InterpreterBase.NIL_NODE:
+            return NIL
+        if kind == InterpreterBase.FIELD_NODE:
+            super().error(ErrorType.NAME_ERROR, f"Variable {expr_ast.get('name')} not found")
+        if kind == InterpreterBase.FCALL_NODE:
+            return self.__call_func(expr_ast)
+        if kind == InterpreterBase.INLINE_NODE:
+            return self.__eval_inline(expr_ast)
+        if kind == Interpreter.NEG_NODE or kind == Interpreter.NOT_NODE:
+            t = Type.INT if kind == Interpreter.NEG_NODE else Type.BOOL
+            value = self.__eval_unboxed(expr_ast.get("op1"))
+            if type_of(value) != t:
+                super().error(
+                    ErrorType.TYPE_ERROR,
+                    f"Incompatible type for {kind} operation",
+                )
+            return -1 * value if t == Type.INT else not value
+
     def __eval_closure(self, closure):
         if closure.is_evaluated():
             return closure.get_val()
@@ -301,6 +507,14 @@ class Interpreter(InterpreterBase):
 
         if arith_ast.elem_type == '/' and right_value_obj.value() == 0:
             return (ExecStatus.RAISE, Exception("div0"))
+        cache = arith_ast.get("ic")
+        if cache is not None and isinstance(left_value_obj, Value) and isinstance(right_value_obj, Value):
+            key = (left_value_obj.type(), right_value_obj.type())
+            f = cache.lookup(key)
+            if f is not None:
+                return f(left_value_obj, right_value_obj)
+        else:
+            cache = None
         # if isinstance(left_value_obj, Closure):
         #     left_value_obj = self.__eval_closure(left_value_obj)
         #     # print("left", left_value_obj)
@@ -324,9 +538,54 @@ class Interpreter(InterpreterBase):
                 f"Incompatible operator {arith_ast.elem_type} for type {left_value_obj.type()}",
             )
         f = self.op_to_lambda[left_value_obj.type()][arith_ast.elem_type]
+        if cache is not None:
+            cache.record(key, f)
         val = f(left_value_obj, right_value_obj)
         return val
 
+    # __eval_op over unboxed values
+    def __eval_op_unboxed(self, arith_ast):
+        kind = arith_ast.elem_type
+        left = self.__eval_unboxed(arith_ast.get("op1"))
+        #short circuiting
+        if isinstance(left, tuple) and isinstance(left[1], Exception):
+            return left
+        if kind == '&&' and left == False:
+            return False
+        if kind == '||' and left == True:
+            return True
+        right = self.__eval_unboxed(arith_ast.get("op2"))
+
+        if kind == '/' and right == 0:
+            return (ExecStatus.RAISE, Exception("div0"))
+        cache = arith_ast.get("ic")
+        if cache is not None and not isinstance(left, tuple) and not isinstance(right, tuple):
+            key = (type_of(left), type_of(right))
+            f = cache.lookup(key)
+            if f is not None:
+                return f(left, right)
+        else:
+            cache = None
+        # the boxed path fails on an exception on the right of == and !=; raise it
+        if isinstance(right, tuple) and isinstance(right[1], Exception):
+            return right
+        if kind not in ("==", "!="):
+            if type_of(left) != type_of(right):
+                super().error(
+                    ErrorType.TYPE_ERROR,
+                    f"Incompatible types for {kind} operation",
+                )
+        left_type = type_of(left)
+        if kind not in self.unboxed_ops[left_type]:
+            super().error(
+                ErrorType.TYPE_ERROR,
+                f"Incompatible operator {kind} for type {left_type}",
+            )
+        f = self.unboxed_ops[left_type][kind]
+        if cache is not None:
+            cache.record(key, f)
+        return f(left, right)
+
     def __compatible_types(self, oper, obj1, obj2):
         # DOCUMENT: allow comparisons ==/!= of anything against anything
         if oper in ["==", "!="]:
@@ -382,9 +641,7 @@ class Interpreter(InterpreterBase):
         )
         #  set up operations on strings
         self.op_to_lambda[Type.STRING] = {}
-        self.op_to_lambda[Type.STRING]["+"] = lambda x, y: Value(
-            x.type(), x.value() + y.value()
-        )
+        self.op_to_lambda[Type.STRING]["+"] = concat_strings
         self.op_to_lambda[Type.STRING]["=="] = lambda x, y: Value(
             Type.BOOL, x.value() == y.value()
         )
@@ -415,6 +672,38 @@ class Interpreter(InterpreterBase):
             Type.BOOL, x.type() != y.type() or x.value() != y.value()
         )
 
+    # op_to_lambda for unboxed values
+    def __setup_unboxed_ops(self):
+        self.unboxed_ops = {
+            Type.INT: {
+                "+": lambda x, y: x + y,
+                "-": lambda x, y: x - y,
+                "*": lambda x, y: x * y,
+                "/": lambda x, y: x // y,
+                "==": lambda x, y: type(y) is int and x == y,
+                "!=": lambda x, y: type(y) is not int or x != y,
+                "<": lambda x, y: x < y,
+                "<=": lambda x, y: x <= y,
+                ">": lambda x, y: x > y,
+                ">=": lambda x, y: x >= y,
+            },
+            Type.STRING: {
+                "+": lambda x, y: x + y,
+                "==": lambda x, y: x == y,
+                "!=": lambda x, y: x != y,
+            },
+            Type.BOOL: {
+                "&&": lambda x, y: x and y,
+                "||": lambda x, y: x or y,
+                "==": lambda x, y: type(y) is bool and x == y,
+                "!=": lambda x, y: type(y) is not bool or x != y,
+            },
+            Type.NIL: {
+                "==": lambda x, y: y is NIL,
+                "!=": lambda x, y: y is not NIL,
+            },
+        }
+
     def __do_if(self, if_ast):
         cond_ast = if_ast.get("condition")
         result = self.__eval_expr(cond_ast)
@@ -423,12 +712,12 @@ class Interpreter(InterpreterBase):
             return (ExecStatus.RAISE, result[1])
         if isinstance(result, Closure):
             result = self.__eval_closure(result)
-        if result.type() != Type.BOOL:
+        if (type(result) is not bool) if self.unboxed else (result.type() != Type.BOOL):
             super().error(
                 ErrorType.TYPE_ERROR,
                 "Incompatible type for if condition",
             )
-        if result.value():
+        if result if self.unboxed else result.value():
             statements = if_ast.get("statements")
             status, return_val = self.__run_statements(statements)
             return (status, return_val)
@@ -438,7 +727,7 @@ class Interpreter(InterpreterBase):
                 status, return_val = self.__run_statements(else_statements)
                 return (status, return_val)
 
-        return (ExecStatus.CONTINUE, Interpreter.NIL_VALUE)
+        return (ExecStatus.CONTINUE, self.nil_value)
 
     def __do_for(self, for_ast):
         init_ast = for_ast.get("init") 
@@ -446,32 +735,34 @@ class Interpreter(InterpreterBase):
         update_ast = for_ast.get("update") 
 
         self.__run_statement(init_ast)  # initialize counter variable
-        run_for = Interpreter.TRUE_VALUE
-        while run_for.value():
+        while True:
             run_for = self.__eval_expr(cond_ast)  # check for-loop condition
             if isinstance(run_for, tuple) and isinstance(run_for[1], Exception):
                 return run_for
-            if run_for.type() != Type.BOOL:
+            if (type(run_for) is not bool) if self.unboxed else (run_for.type() != Type.BOOL):
                 super().error(
                     ErrorType.TYPE_ERROR,
                     "Incompatible type for for condition",
                 )
-            if run_for.value():
-                statements = for_ast.get("statements")
-                status, return_val = self.__run_statements(statements)
-                if status == ExecStatus.RAISE:
-                    return status, return_val
-                if status == ExecStatus.RETURN:
-                    return status, return_val
-                self.__run_statement(update_ast)  # update counter variable
+            if not (run_for if self.unboxed else run_for.value()):
+                break
+            statements = for_ast.get("statements")
+            status, return_val = self.__run_statements(statements)
+            if status == ExecStatus.RAISE:
+                return status, return_val
+            if status == ExecStatus.RETURN:
+                return status, return_val
+            self.__run_statement(update_ast)  # update counter variable
 
-        return (ExecStatus.CONTINUE, Interpreter.NIL_VALUE)
+        return (ExecStatus.CONTINUE, self.nil_value)
 
     def __do_return(self, return_ast):
         expr_ast = return_ast.get("expression")
         if expr_ast is None:
-            return (ExecStatus.RETURN, Interpreter.NIL_VALUE)
-        value_obj = copy.copy(self.__eval_expr(expr_ast))
+            return (ExecStatus.RETURN, self.nil_value)
+        value_obj = self.__eval_expr(expr_ast)
+        if not self.unboxed:
+            value_obj = copy.copy(value_obj)
         return (ExecStatus.RETURN, value_obj)
     
 
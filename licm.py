@@ -0,0 +1,137 @@
+from astutil import CHILD_KEYS, walk
+from element import Element
+from intbase import InterpreterBase
+
+# Loop-invariant code motion for the for loops of interpreterv3.
+#
+# An expression inside a loop (its condition, update or body) is invariant when
+# it only reads literals and variables the loop never assigns or declares, and
+# struct fields when the loop writes no field and makes no calls (a callee may
+# write fields of a struct it shares with the caller). The largest invariant
+# expressions that do any work are wrapped in an INVARIANT_NODE, listed on the
+# loop under "invariants".
+#
+# An invariant is evaluated the first time the loop reaches it and the value is
+# reused until the loop finishes, so it is computed at most once per run of the
+# loop, and only if the original program would have computed it: errors and
+# short-circuiting happen where they did before. Outer loops are processed
+# first, so an expression invariant in a whole loop nest is computed once for it.
+
+LEAF_NODES = {
+    InterpreterBase.INT_NODE,
+    InterpreterBase.STRING_NODE,
+    InterpreterBase.BOOL_NODE,
+    InterpreterBase.NIL_NODE,
+}
+OP_NODES = {
+    "+", "-", "*", "/", "==", "!=", ">", ">=", "<", "<=", "||", "&&",
+    InterpreterBase.NEG_NODE,
+    InterpreterBase.NOT_NODE,
+}
+CALL_NODES = {InterpreterBase.FCALL_NODE, InterpreterBase.INLINE_NODE}
+
+
+class HoistReport:
+    def __init__(self):
+        self.loops = 0  # loops with at least one invariant
+        self.hoisted = 0  # invariant expressions
+
+    def __str__(self):
+        return f"hoisted {self.hoisted} invariant expressions out of {self.loops} loops"
+
+
+def hoist_invariants(functions):
+    report = HoistReport()
+    for func in functions:
+        for node in _walk_loops(func.get("statements")):
+            invariants = _hoist_loop(node)
+            if invariants:
+                node.dict["invariants"] = invariants
+                report.loops += 1
+                report.hoisted += len(invariants)
+    return report
+
+
+# preorder over the for loops below statements; a loop is yielded before the loops
+# nested in it, and its invariants are in place by the time those are reached
+def _walk_loops(statements):
+    stack = list(reversed(statements))
+    while stack:
+        node = stack.pop()
+        if node.elem_type == InterpreterBase.FOR_NODE:
+            yield node
+        for key in ("statements", "else_statements"):
+            stack.extend(reversed(node.get(key) or []))
+
+
+def _hoist_loop(for_ast):
+    assigned = set()
+    fields_stable = True
+    parts = [for_ast.get("init"), for_ast.get("condition"), for_ast.get("update")]
+    parts += for_ast.get("statements")
+    for part in parts:
+        for node in _walk_visible(part):
+            kind = node.elem_type
+            if kind == "=" and node.get("fields") is not None:
+                fields_stable = False
+            elif kind == "=" or kind == InterpreterBase.VAR_DEF_NODE:
+                assigned.add(node.get("name"))
+            elif kind in CALL_NODES:
+                fields_stable = False
+
+    invariants = []
+    for_ast.dict["condition"] = _wrap(for_ast.get("condition"), assigned, fields_stable, invariants)
+    for node in [for_ast.get("update")] + for_ast.get("statements"):
+        _wrap_children(node, assigned, fields_stable, invariants)
+    return invariants
+
+
+# walk that doesn't look inside expressions an outer loop already hoisted
+def _walk_visible(node):
+    stack = [node]
+    while stack:
+        cur = stack.pop()
+        yield cur
+        if cur.elem_type != InterpreterBase.INVARIANT_NODE:
+            for key in CHILD_KEYS:
+                child = cur.dict.get(key)
+                if isinstance(child, Element):
+                    stack.append(child)
+                elif isinstance(child, list):
+                    stack.extend(item for item in child if isinstance(item, Element))
+
+
+def _wrap_children(node, assigned, fields_stable, invariants):
+    if node.elem_type == InterpreterBase.INVARIANT_NODE:
+        return
+    for key in CHILD_KEYS:
+        child = node.dict.get(key)
+        if isinstance(child, Element):
+            node.dict[key] = _wrap(child, assigned, fields_stable, invariants)
+        elif isinstance(child, list):
+            for i, item in enumerate(child):
+                if isinstance(item, Element):
+                    child[i] = _wrap(item, assigned, fields_stable, invariants)
+
+
+def _wrap(node, assigned, fields_stable, invariants):
+    if node.elem_type in OP_NODES or node.elem_type == InterpreterBase.FIELD_NODE:
+        if _is_invariant(node, assigned, fields_stable):
+            wrapped = Element(InterpreterBase.INVARIANT_NODE, expression=node)
+            invariants.append(wrapped)
+            return wrapped
+    _wrap_children(node, assigned, fields_stable, invariants)
+    return node
+
+
+def _is_invariant(node, assigned, fields_stable):
+    for cur in walk(node):
+        kind = cur.elem_type
+        if kind in LEAF_NODES or kind in OP_NODES:
+            continue
+        if kind == InterpreterBase.VAR_NODE and cur.get("name") not in assigned:
+            continue
+        if kind == InterpreterBase.FIELD_NODE and fields_stable and cur.get("fields")[0] not in assigned:
+            continue
+        return False
+    return True
@@ -0,0 +1,29 @@
+from astutil import walk_all
+from intbase import InterpreterBase, ErrorType
+
+BUILTINS = {"print", "inputi", "inputs"}
+
+
+# Resolves every call to a user function against func_table ({(name, num_params): func_ast})
+# and stores the target on the call node under "func", and tags every call to a builtin
+# with its name under "builtin", so calls skip the name lookup at runtime. Calls that
+# can't be resolved are left alone (they still fail with NAME_ERROR
+# if they run) and are returned as (ErrorType.NAME_ERROR, message) diagnostics.
+def link_calls(functions, func_table):
+    diagnostics = []
+    for node in walk_all(functions):
+        if node.elem_type != InterpreterBase.FCALL_NODE:
+            continue
+        name = node.get("name")
+        if name in BUILTINS:
+            node.dict["builtin"] = name
+            continue
+        num_params = len(node.get("args"))
+        func_ast = func_table.get((name, num_params))
+        if func_ast is None:
+            diagnostics.append(
+                (ErrorType.NAME_ERROR, f"Function {name} taking {num_params} params not found")
+            )
+        else:
+            node.dict["func"] = func_ast
+    return diagnostics
@@ -0,0 +1,299 @@
+from astutil import walk
+from element import Element
+from intbase import InterpreterBase
+
+try:
+    import numpy
+except ImportError:  # vectorized reductions are skipped without numpy
+    numpy = None
+
+# Loop idiom recognition for interpreterv3.
+#
+# Recognizes counting loops whose body only accumulates integer expressions:
+#
+#   for (i = A; i < B; i = i + 1) { s = s + E; t = t - F + G; u = H + u; ... }
+#
+# (or i <= B), where B and each term E are made of integer literals, variables and
+# + - * / and negation, and neither B nor any term uses i or an accumulator. The
+# loop gets a LoopIdiom under "idiom"; the interpreter runs the init statement,
+# checks that all the variables involved hold ints and asks the idiom for the
+# values the loop leaves behind. The idiom keeps copies of the expressions, so
+# later passes may rewrite the loop itself. The sums are computed by, in order of preference
+#   - multiplication, for an E that doesn't use i,
+#   - the closed forms of sum(i**k) for an E that is a polynomial of degree <= 3 in i,
+#   - a numpy reduction over arange(A, B), when numpy is installed and interval
+#     arithmetic shows no intermediate value can leave int64.
+# Python ints are exact, so the results match iterative execution, bigints
+# included. When none applies, or evaluating B or an E would divide by zero, the
+# loop runs normally, which reproduces whatever the program does.
+
+ARITH_NODES = {"+", "-", "*", "/", InterpreterBase.NEG_NODE}
+INT64_LIMIT = 2**62  # bound on any value a vectorized reduction may produce
+
+
+class LoopIdiomReport:
+    def __init__(self):
+        self.recognized = 0  # loops with an idiom
+        # runs of those loops by how they were computed
+        self.runs = {"multiplied": 0, "closed_form": 0, "vectorized": 0, "iterated": 0}
+
+    def __str__(self):
+        runs = ", ".join(f"{count} {kind}" for kind, count in self.runs.items())
+        return f"recognized {self.recognized} accumulator loops; runs: {runs}"
+
+
+class LoopIdiom:
+    def __init__(self, var_name, inclusive, bound, accumulators, report):
+        self.var_name = var_name
+        self.inclusive = inclusive  # i <= B rather than i < B
+        self.bound = _copy(bound)
+        # (variable, 1 or -1, term); a variable has an entry per term added to it
+        self.accumulators = [(name, sign, _copy(expr)) for name, sign, expr in accumulators]
+        self.report = report
+        # every variable the loop reads, which must all hold ints
+        self.names = {var_name}
+        for node in [bound] + [expr for _, _, expr in accumulators]:
+            self.names.update(_var_names(node))
+        self.names.update(name for name, _, _ in accumulators)
+
+    # Returns {variable: final value} for the loop variable and the accumulators,
+    # given the int value of every variable in names after the init statement, or
+    # None if the loop has to run normally.
+    def run(self, values):
+        try:
+            start = values[self.var_name]
+            stop = _evaluate(self.bound, values) + (1 if self.inclusive else 0)
+            result = {self.var_name: max(start, stop)}
+            kind = "multiplied"
+            for name, sign, expr in self.accumulators:
+                total, expr_kind = self.__sum(expr, values, start, stop)
+                if total is None:
+                    self.report.runs["iterated"] += 1
+                    return None
+                if expr_kind != "multiplied":
+                    kind = expr_kind
+                result[name] = result.get(name, values[name]) + sign * total
+        except ZeroDivisionError:
+            self.report.runs["iterated"] += 1
+            return None
+        self.report.runs[kind] += 1
+        return result
+
+    # sum of expr over start <= i < stop, and how it was computed
+    def __sum(self, expr, values, start, stop):
+        count = max(stop - start, 0)
+        if count == 0:
+            return 0, "multiplied"
+        if self.var_name not in _var_names(expr):
+            return count * _evaluate(expr, values), "multiplied"
+        coefficients = _polynomial(expr, self.var_name, values)
+        if coefficients is not None and len(coefficients) <= len(POWER_SUMS):
+            total = 0
+            for power, coefficient in enumerate(coefficients):
+                total += coefficient * (POWER_SUMS[power](stop) - POWER_SUMS[power](start))
+            return total, "closed_form"
+        if numpy is not None and self.__fits_int64(expr, values, start, stop - 1, count):
+            vector = dict(values)
+            vector[self.var_name] = numpy.arange(start, stop, dtype=numpy.int64)
+            return int(_evaluate(expr, vector).sum()), "vectorized"
+        return None, None
+
+    def __fits_int64(self, expr, values, low, high, count):
+        intervals = {name: (value, value) for name, value in values.items()}
+        intervals[self.var_name] = (low, high)
+        bounds = _bounds(expr, intervals)
+        return bounds is not None and max(-bounds[0], bounds[1]) * count < INT64_LIMIT
+
+
+# sum(i**k for i in range(x)) for k = 0..3; exact for any int x
+POWER_SUMS = [
+    lambda x: x,
+    lambda x: x * (x - 1) // 2,
+    lambda x: (x - 1) * x * (2 * x - 1) // 6,
+    lambda x: (x * (x - 1) // 2) ** 2,
+]
+
+
+def recognize_loop_idioms(functions):
+    report = LoopIdiomReport()
+    for func in functions:
+        for node in walk(func):
+            if node.elem_type == InterpreterBase.FOR_NODE:
+                idiom = _match_loop(node, report)
+                if idiom is not None:
+                    node.dict["idiom"] = idiom
+                    report.recognized += 1
+    return report
+
+
+def _match_loop(for_ast, report):
+    init = for_ast.get("init")
+    if init.elem_type != "=" or init.get("fields") is not None:
+        return None
+    var_name = init.get("name")
+    condition = for_ast.get("condition")
+    if condition.elem_type not in ("<", "<=") or not _is_var(condition.get("op1"), var_name):
+        return None
+    if not _is_increment(for_ast.get("update"), var_name):
+        return None
+    bound = condition.get("op2")
+    if not _is_arith(bound) or var_name in _var_names(bound):
+        return None
+
+    accumulators = []
+    for statement in for_ast.get("statements"):
+        terms = _match_accumulator(statement)
+        if terms is None:
+            return None
+        accumulators += terms
+    targets = {name for name, _, _ in accumulators}
+    if var_name in targets or targets & _var_names(bound):
+        return None
+    for _, _, expr in accumulators:
+        if targets & _var_names(expr):
+            return None
+    return LoopIdiom(var_name, condition.elem_type == "<=", bound, accumulators, report)
+
+
+# [(variable, sign, term)] for s = s + E - F ... or s = E + s
+def _match_accumulator(statement):
+    if statement.elem_type != "=" or statement.get("fields") is not None:
+        return None
+    name = statement.get("name")
+    expression = statement.get("expression")
+    if expression.elem_type == "+" and _is_var(expression.get("op2"), name):
+        terms = [(name, 1, expression.get("op1"))]
+    else:
+        # s + E - F parses as (s + E) - F
+        terms = []
+        node = expression
+        while node.elem_type in ("+", "-"):
+            terms.append((name, 1 if node.elem_type == "+" else -1, node.get("op2")))
+            node = node.get("op1")
+        if not terms or not _is_var(node, name):
+            return None
+    if not all(_is_arith(term) for _, _, term in terms):
+        return None
+    return terms
+
+
+def _is_increment(update, var_name):
+    if update.elem_type != "=" or update.get("fields") is not None or update.get("name") != var_name:
+        return False
+    expression = update.get("expression")
+    if expression.elem_type != "+" or not _is_var(expression.get("op1"), var_name):
+        return False
+    step = expression.get("op2")
+    return step.elem_type == InterpreterBase.INT_NODE and step.get("val") == 1
+
+
+def _is_var(node, name):
+    return node.elem_type == InterpreterBase.VAR_NODE and node.get("name") == name
+
+
+def _is_arith(node):
+    for cur in walk(node):
+        if cur.elem_type not in ARITH_NODES and cur.elem_type not in (
+            InterpreterBase.INT_NODE,
+            InterpreterBase.VAR_NODE,
+        ):
+            return False
+    return True
+
+
+def _copy(node):
+    if node is None:
+        return None
+    return Element(node.elem_type, name=node.get("name"), val=node.get("val"),
+                   op1=_copy(node.get("op1")), op2=_copy(node.get("op2")))
+
+
+def _var_names(node):
+    return {cur.get("name") for cur in walk(node) if cur.elem_type == InterpreterBase.VAR_NODE}
+
+
+# evaluates an arithmetic expression the way the interpreter does; values may hold
+# numpy arrays, which evaluates it elementwise
+def _evaluate(node, values):
+    kind = node.elem_type
+    if kind == InterpreterBase.INT_NODE:
+        return node.get("val")
+    if kind == InterpreterBase.VAR_NODE:
+        return values[node.get("name")]
+    if kind == InterpreterBase.NEG_NODE:
+        return -1 * _evaluate(node.get("op1"), values)
+    x = _evaluate(node.get("op1"), values)
+    y = _evaluate(node.get("op2"), values)
+    if kind == "+":
+        return x + y
+    if kind == "-":
+        return x - y
+    if kind == "*":
+        return x * y
+    return x // y
+
+
+# coefficients of an arithmetic expression as a polynomial in var_name, lowest
+# power first, or None if it divides by anything that depends on var_name
+def _polynomial(node, var_name, values):
+    kind = node.elem_type
+    if kind == InterpreterBase.INT_NODE:
+        return [node.get("val")]
+    if kind == InterpreterBase.VAR_NODE:
+        return [0, 1] if node.get("name") == var_name else [values[node.get("name")]]
+    if kind == "/":
+        if var_name in _var_names(node):
+            return None
+        return [_evaluate(node, values)]
+    x = _polynomial(node.get("op1"), var_name, values)
+    if x is None:
+        return None
+    if kind == InterpreterBase.NEG_NODE:
+        return [-c for c in x]
+    y = _polynomial(node.get("op2"), var_name, values)
+    if y is None:
+        return None
+    if kind == "*":
+        product = [0] * (len(x) + len(y) - 1)
+        for i, a in enumerate(x):
+            for j, b in enumerate(y):
+                product[i + j] += a * b
+        return product
+    sign = 1 if kind == "+" else -1
+    total = x + [0] * (len(y) - len(x))
+    for i, b in enumerate(y):
+        total[i] += sign * b
+    return total
+
+
+# (low, high) bounds of every value an arithmetic expression takes given bounds for
+# its variables, or None if they may leave the int64 range or it may divide by zero
+def _bounds(node, intervals):
+    kind = node.elem_type
+    if kind == InterpreterBase.INT_NODE:
+        low = high = node.get("val")
+    elif kind == InterpreterBase.VAR_NODE:
+        low, high = intervals[node.get("name")]
+    elif kind == InterpreterBase.NEG_NODE:
+        x = _bounds(node.get("op1"), intervals)
+        if x is None:
+            return None
+        low, high = -x[1], -x[0]
+    else:
+        x = _bounds(node.get("op1"), intervals)
+        y = _bounds(node.get("op2"), intervals)
+        if x is None or y is None:
+            return None
+        if kind == "+":
+            low, high = x[0] + y[0], x[1] + y[1]
+        elif kind == "-":
+            low, high = x[0] - y[1], x[1] - y[0]
+        else:
+            if kind == "/" and y[0] <= 0 <= y[1]:
+                return None
+            f = (lambda a, b: a * b) if kind == "*" else (lambda a, b: a // b)
+            corners = [f(a, b) for a in x for b in y]
+            low, high = min(corners), max(corners)
+    if low < -INT64_LIMIT or high > INT64_LIMIT:
+        return None
+    return low, high
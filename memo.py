@@ -0,0 +1,40 @@
+from collections import OrderedDict
+
+# returned by MemoCache.get when the key isn't cached (results may legitimately be None)
+MISS = object()
+
+
+# Size-bounded LRU cache of results for one pure Brewin function, keyed by argument values
+class MemoCache:
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        if key not in self.entries:
+            self.misses += 1
+            return MISS
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)  # evict least recently used
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.entries)}
+
+
+# Builds a cache for every pure function that was opted in.
+# memoize is either True (all pure functions) or a collection of function names.
+def make_memo_caches(pure_funcs, memoize, max_size):
+    caches = {}
+    for key in pure_funcs:
+        if memoize is True or key[0] in memoize:
+            caches[key] = MemoCache(max_size)
+    return caches
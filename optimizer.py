@@ -0,0 +1,272 @@
+from astutil import walk_all
+from element import Element
+from intbase import InterpreterBase
+
+# Constant folding and dead code elimination between parsing and execution.
+# Folding follows the rules of the interpreter the program is run with (dialect
+# "v3" or "v4"); anything that would raise an error or an exception at runtime is
+# left in place so the error still happens when (and if) the code runs.
+#
+# With an evaluator (see partial_eval.py), calls whose arguments fold to literals
+# are offered to it and replaced by the literal it returns, if any.
+
+LITERALS = {
+    InterpreterBase.INT_NODE: "int",
+    InterpreterBase.STRING_NODE: "string",
+    InterpreterBase.BOOL_NODE: "bool",
+    InterpreterBase.NIL_NODE: "nil",
+}
+BIN_OPS = {"+", "-", "*", "/", "==", "!=", ">", ">=", "<", "<=", "||", "&&"}
+ARITH = {
+    "+": lambda x, y: x + y,
+    "-": lambda x, y: x - y,
+    "*": lambda x, y: x * y,
+    "/": lambda x, y: x // y,
+}
+COMPARE = {
+    "<": lambda x, y: x < y,
+    "<=": lambda x, y: x <= y,
+    ">": lambda x, y: x > y,
+    ">=": lambda x, y: x >= y,
+}
+# operators each type supports, besides == and !=
+TYPE_OPS = {
+    "int": set(ARITH) | set(COMPARE),
+    "string": {"+"},
+    "bool": {"&&", "||"},
+    "nil": set(),
+}
+
+
+class OptimizationReport:
+    def __init__(self):
+        self.folded = 0  # expressions replaced by a literal
+        self.pruned_branches = 0  # if/for statements whose condition is constant
+        self.removed_statements = 0  # statements that can never run
+        self.removed_functions = []  # functions never reachable from main
+
+    def __str__(self):
+        return "\n".join([
+            f"folded {self.folded} constant expressions",
+            f"pruned {self.pruned_branches} constant branches",
+            f"removed {self.removed_statements} unreachable statements",
+            f"removed {len(self.removed_functions)} unreachable functions: "
+            + ", ".join(self.removed_functions),
+        ])
+
+
+def optimize_program(ast, dialect, evaluator=None):
+    report = OptimizationReport()
+    for func in ast.get("functions"):
+        func.dict["statements"] = _optimize_block(func.get("statements"), dialect, report, evaluator)
+    _remove_unreachable_functions(ast, report)
+    return report
+
+
+# returns (type, python value) for a literal node, or None
+def literal_value(node):
+    kind = LITERALS.get(node.elem_type)
+    if kind is None:
+        return None
+    return kind, node.get("val")
+
+
+def make_literal(kind, val):
+    if kind == "nil":
+        return Element(InterpreterBase.NIL_NODE)
+    return Element(kind, val=val)
+
+
+def _optimize_block(statements, dialect, report, evaluator):
+    result = []
+    for i, statement in enumerate(statements):
+        result.extend(_optimize_statement(statement, dialect, report, evaluator))
+        # nothing after a return or raise (including one spliced in from a pruned if) runs
+        if result and result[-1].elem_type in (InterpreterBase.RETURN_NODE, InterpreterBase.RAISE_NODE):
+            report.removed_statements += len(statements) - i - 1
+            break
+    return result
+
+
+# returns the list of statements that replace statement
+def _optimize_statement(statement, dialect, report, evaluator):
+    kind = statement.elem_type
+    for key in ("expression", "exception_type"):
+        expr = statement.get(key)
+        if isinstance(expr, Element):
+            statement.dict[key] = fold(expr, dialect, report, evaluator)
+    if kind == InterpreterBase.FCALL_NODE:
+        statement.dict["args"] = [fold(arg, dialect, report, evaluator) for arg in statement.get("args")]
+    elif kind == InterpreterBase.IF_NODE:
+        return _optimize_if(statement, dialect, report, evaluator)
+    elif kind == InterpreterBase.FOR_NODE:
+        _optimize_statement(statement.get("init"), dialect, report, evaluator)
+        _optimize_statement(statement.get("update"), dialect, report, evaluator)
+        statement.dict["condition"] = fold(statement.get("condition"), dialect, report, evaluator)
+        statement.dict["statements"] = _optimize_block(statement.get("statements"), dialect, report, evaluator)
+        if _truth(statement.get("condition"), dialect) is False:
+            # the body never runs, only the initializer does
+            report.pruned_branches += 1
+            return [statement.get("init")]
+    elif kind == InterpreterBase.TRY_NODE:
+        statement.dict["statements"] = _optimize_block(statement.get("statements"), dialect, report, evaluator)
+        for catcher in statement.get("catchers"):
+            catcher.dict["statements"] = _optimize_block(catcher.get("statements"), dialect, report, evaluator)
+    return [statement]
+
+
+def _optimize_if(statement, dialect, report, evaluator):
+    statement.dict["condition"] = fold(statement.get("condition"), dialect, report, evaluator)
+    statement.dict["statements"] = _optimize_block(statement.get("statements"), dialect, report, evaluator)
+    else_statements = statement.get("else_statements")
+    if else_statements is not None:
+        statement.dict["else_statements"] = _optimize_block(else_statements, dialect, report, evaluator)
+
+    taken = _truth(statement.get("condition"), dialect)
+    if taken is None:
+        return [statement]
+    report.pruned_branches += 1
+    block = statement.get("statements") if taken else statement.get("else_statements")
+    if not block:
+        return []
+    # the block can be spliced into the enclosing one unless it declares variables
+    if all(s.elem_type != InterpreterBase.VAR_DEF_NODE for s in block):
+        return block
+    statement.dict["condition"] = Element(InterpreterBase.BOOL_NODE, val=True)
+    statement.dict["statements"] = block
+    statement.dict["else_statements"] = None
+    return [statement]
+
+
+# truth value of a constant condition, or None if it isn't constant or would be an error
+def _truth(expr, dialect):
+    lit = literal_value(expr)
+    if lit is None:
+        return None
+    kind, val = lit
+    if kind == "bool":
+        return val
+    if kind == "int" and dialect == "v3":  # v3 coerces int conditions to bool
+        return val != 0
+    return None
+
+
+def fold(expr, dialect, report, evaluator):
+    kind = expr.elem_type
+    if kind in BIN_OPS:
+        expr.dict["op1"] = fold(expr.get("op1"), dialect, report, evaluator)
+        if dialect == "v4":
+            # short circuiting: the right operand is never evaluated
+            left = literal_value(expr.get("op1"))
+            if left is not None and kind == "&&" and left[1] == False:
+                report.folded += 1
+                return make_literal("bool", False)
+            if left is not None and kind == "||" and left[1] == True:
+                report.folded += 1
+                return make_literal("bool", True)
+        expr.dict["op2"] = fold(expr.get("op2"), dialect, report, evaluator)
+        result = _fold_binop(kind, expr.get("op1"), expr.get("op2"), dialect)
+    elif kind == InterpreterBase.NEG_NODE or kind == InterpreterBase.NOT_NODE:
+        expr.dict["op1"] = fold(expr.get("op1"), dialect, report, evaluator)
+        result = _fold_unary(kind, expr.get("op1"), dialect)
+    elif kind == InterpreterBase.FCALL_NODE:
+        expr.dict["args"] = [fold(arg, dialect, report, evaluator) for arg in expr.get("args")]
+        if evaluator is not None and all(literal_value(arg) is not None for arg in expr.get("args")):
+            literal = evaluator.evaluate(expr)
+            if literal is not None:
+                return literal
+        return expr
+    else:
+        return expr
+    if result is None:
+        return expr
+    report.folded += 1
+    return make_literal(*result)
+
+
+def _fold_unary(kind, op, dialect):
+    lit = literal_value(op)
+    if lit is None:
+        return None
+    t, v = lit
+    if kind == InterpreterBase.NEG_NODE:
+        if t == "int":
+            return "int", -1 * v
+        return None
+    if t == "int" and dialect == "v3":
+        t, v = "bool", v != 0
+    if t == "bool":
+        return "bool", not v
+    return None
+
+
+# returns (type, value) of the folded operation, or None if it can't be folded
+def _fold_binop(op, left, right, dialect):
+    lit1 = literal_value(left)
+    lit2 = literal_value(right)
+    if lit1 is None or lit2 is None:
+        return None
+    t1, v1 = lit1
+    t2, v2 = lit2
+    if dialect == "v3":
+        if v1 == "void" or v2 == "void":  # v3 treats this string as a void result
+            return None
+        # ints are coerced to bools for logical operators and int/bool comparisons
+        if {t1, t2} == {"int", "bool"} and op in ("||", "&&", "==", "!="):
+            t1, v1, t2, v2 = "bool", v1 != 0, "bool", v2 != 0
+        elif t1 == "int" and t2 == "int" and op in ("||", "&&"):
+            t1, v1, t2, v2 = "bool", v1 != 0, "bool", v2 != 0
+        if t1 == "nil" or t2 == "nil":
+            if t1 == t2 and op in ("==", "!="):
+                return "bool", op == "=="
+            return None
+    if dialect == "v4" and op == "/" and v2 == 0:
+        return None  # raises div0 at runtime
+
+    if op in ("==", "!="):
+        if t1 == "string":
+            equal = v1 == v2
+        else:
+            equal = t1 == t2 and v1 == v2
+        return "bool", equal if op == "==" else not equal
+    if t1 != t2 or op not in TYPE_OPS[t1]:
+        return None
+    if op in COMPARE:
+        return "bool", COMPARE[op](v1, v2)
+    if op == "&&":
+        return "bool", v1 and v2
+    if op == "||":
+        return "bool", v1 or v2
+    if op == "/" and v2 == 0:
+        return None
+    return t1, ARITH[op](v1, v2)
+
+
+def _remove_unreachable_functions(ast, report):
+    functions = ast.get("functions")
+    table = {(f.get("name"), len(f.get("args"))): f for f in functions}
+    if ("main", 0) not in table:
+        return
+    reachable = set()
+    stack = [("main", 0)]
+    while stack:
+        key = stack.pop()
+        if key in reachable or key not in table:
+            continue
+        reachable.add(key)
+        for node in _walk_calls(table[key].get("statements")):
+            stack.append((node.get("name"), len(node.get("args"))))
+
+    kept = []
+    for func in functions:
+        if (func.get("name"), len(func.get("args"))) in reachable:
+            kept.append(func)
+        else:
+            report.removed_functions.append(func.get("name"))
+    ast.dict["functions"] = kept
+
+
+def _walk_calls(statements):
+    for node in walk_all(statements):
+        if node.elem_type == InterpreterBase.FCALL_NODE:
+            yield node
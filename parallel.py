@@ -0,0 +1,93 @@
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+from astutil import walk_all
+from intbase import InterpreterBase
+
+CONSTANT_NODES = {
+    InterpreterBase.INT_NODE,
+    InterpreterBase.STRING_NODE,
+    InterpreterBase.BOOL_NODE,
+    InterpreterBase.NIL_NODE,
+}
+BIN_OPS = {"+", "-", "*", "/", "==", "!=", ">", ">=", "<", "<=", "||", "&&"}
+
+# interpreter owned by each worker process
+_worker = None
+
+
+# a call to a pure function whose arguments are all literals can run anywhere
+def is_independent_call(expr_ast, pure_funcs):
+    if expr_ast.elem_type != InterpreterBase.FCALL_NODE:
+        return False
+    args = expr_ast.get("args")
+    if (expr_ast.get("name"), len(args)) not in pure_funcs:
+        return False
+    for arg in args:
+        if arg.elem_type == InterpreterBase.NEG_NODE:
+            arg = arg.get("op1")
+        if arg.elem_type not in CONSTANT_NODES:
+            return False
+    return True
+
+
+# Marks every call and binary operator with 2+ independent pure calls among its
+# operands by storing them under "parallel_calls". Returns the number of sites.
+def mark_parallel_sites(functions, pure_funcs):
+    sites = 0
+    for node in walk_all(functions):
+        if node.elem_type == InterpreterBase.FCALL_NODE:
+            operands = node.get("args")
+        elif node.elem_type in BIN_OPS:
+            operands = [node.get("op1"), node.get("op2")]
+        else:
+            continue
+        calls = [op for op in operands if is_independent_call(op, pure_funcs)]
+        if len(calls) >= 2:
+            node.dict["parallel_calls"] = calls
+            sites += 1
+    return sites
+
+
+def make_pool(interpreter_class, func_name_to_ast, structs, workers=None):
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(interpreter_class, func_name_to_ast, structs),
+    )
+
+
+# Shuts the pool down. After an error, calls that were started may never finish,
+# and the executor's exit hook would wait for them, so the workers are killed.
+def close_pool(pool, finished):
+    if not finished:
+        for process in list((pool._processes or {}).values()):
+            process.kill()
+    pool.shutdown(wait=finished, cancel_futures=True)
+
+
+# each worker gets a copy of the prebuilt function and struct tables
+def _init_worker(interpreter_class, func_name_to_ast, structs):
+    global _worker
+    _worker = interpreter_class(console_output=False)
+    _worker.func_name_to_ast = func_name_to_ast
+    _worker.structs = structs
+
+
+# The pickled form of call_ast to submit to the pool, or None if it can't be
+# pickled, in which case the caller runs the call itself.
+def ship_call(call_ast):
+    try:
+        return pickle.dumps(call_ast)
+    except (pickle.PicklingError, TypeError, AttributeError):
+        return None
+
+
+# Runs one shipped call in a worker. Errors are sent back so the caller can
+# re-raise them at the point where sequential execution would have reached the call.
+def run_call(payload):
+    _worker.error_type = None
+    try:
+        return (True, _worker.evaluate_call(pickle.loads(payload)), None)
+    except Exception as e:
+        return (False, e, _worker.error_type)
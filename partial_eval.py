@@ -0,0 +1,77 @@
+from optimizer import make_literal
+
+# Compile-time partial evaluation of pure calls, shared by interpreterv3 and
+# interpreterv4.
+#
+# The optimizer calls evaluate() on each call whose arguments folded to literals.
+# Calls to pure functions (see purity.py) are run on a separate interpreter of the
+# same class, so they follow the dialect's rules exactly, and a call that returns
+# an int, bool, string or nil becomes that literal. A call may enter at most
+# `budget` statement blocks (function bodies, loop iterations and branches); one
+# that runs longer, fails or (in v4) raises is left for the program to run.
+
+DEFAULT_BUDGET = 10000
+LITERAL_TYPES = {"int", "bool", "string", "nil"}
+
+
+class OutOfSteps(Exception):
+    pass
+
+
+class PartialEvalReport:
+    def __init__(self):
+        self.folded = []  # (call, literal value)
+        self.over_budget = []  # calls that ran out of steps
+        self.failed = []  # calls that stopped with an error or exception
+
+    def __str__(self):
+        lines = [f"folded {len(self.folded)} calls"]
+        lines += [f"  {call} = {value}" for call, value in self.folded]
+        lines.append(f"{len(self.over_budget)} calls over budget: " + ", ".join(self.over_budget))
+        lines.append(f"{len(self.failed)} calls failed: " + ", ".join(self.failed))
+        return "\n".join(lines)
+
+
+class PartialEvaluator:
+    def __init__(self, interpreter, pure_funcs, budget=DEFAULT_BUDGET):
+        self.interpreter = interpreter  # has the program's function (and struct) tables
+        self.pure_funcs = pure_funcs
+        self.budget = budget
+        self.report = PartialEvalReport()
+
+    # literal node for the result of a call with literal arguments, or None
+    def evaluate(self, call_ast):
+        args = call_ast.get("args")
+        if (call_ast.get("name"), len(args)) not in self.pure_funcs:
+            return None
+        call = f"{call_ast.get('name')}({', '.join(_show(arg) for arg in args)})"
+        self.interpreter.steps_left = self.budget
+        try:
+            result = self.interpreter.evaluate_call(call_ast)
+        except OutOfSteps:
+            self.report.over_budget.append(call)
+            return None
+        except Exception:
+            self.report.failed.append(call)
+            return None
+        finally:
+            self.interpreter.steps_left = None
+        if isinstance(result, tuple) or result.type() not in LITERAL_TYPES:
+            self.report.failed.append(call)
+            return None
+        self.report.folded.append((call, _show_value(result.type(), result.value())))
+        return make_literal(result.type(), result.value())
+
+
+def _show(literal):
+    return _show_value(literal.elem_type, literal.get("val"))
+
+
+def _show_value(kind, val):
+    if kind == "string":
+        return f'"{val}"'
+    if kind == "bool":
+        return "true" if val else "false"
+    if kind == "nil":
+        return "nil"
+    return str(val)
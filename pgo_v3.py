@@ -0,0 +1,203 @@
+import hashlib
+import json
+
+from astutil import walk
+from intbase import InterpreterBase
+from specialize_v3 import BIN_OPS, VARIANTS, _kind
+from type_value3 import Type
+
+# Profile-guided optimization for interpreterv3.
+#
+# A run with profile_output records an ExecutionProfile and writes it as JSON:
+#   calls      "name/num params" -> calls (including memoized and inlined ones)
+#   branches   if site -> [times taken, times not taken]
+#   loops      for site -> [runs, iterations]
+#   operands   operator site -> {"left type,right type": count}
+# Sites name nodes of the parsed program as "name/num params:index", the node's
+# position in a preorder walk of its function, so they survive the passes that
+# rewrite the tree. The profile is keyed by the SHA-256 of the parsed program, and
+# a run with profile_input only uses a profile recorded for the same program. It
+#   - inlines functions the profile calls at least HOT_CALLS times when their body
+#     has up to HOT_INLINE_FACTOR times inline_size nodes, and never inlines
+#     functions the profile didn't call (with inline_functions),
+#   - specializes operators the type checker couldn't type but whose operands had
+#     one pair of types in the profile; the variant is guarded by those types and
+#     any other pair takes the generic path,
+#   - compiles functions whose profiled calls plus loop iterations reach the
+#     threshold before main starts (with tiered).
+# Branch ratios and trip counts are recorded and reported; a tree walker has no
+# code layout for them to change.
+
+PROFILE_VERSION = 1
+HOT_CALLS = 100
+HOT_INLINE_FACTOR = 3
+
+
+def program_hash(ast):
+    return hashlib.sha256(str(ast).encode("utf-8")).hexdigest()
+
+
+def function_key(func_ast):
+    return f"{func_ast.get('name')}/{len(func_ast.get('args'))}"
+
+
+# stores a "site" on every if, for and binary operator
+def number_sites(functions):
+    for func_ast in functions:
+        key = function_key(func_ast)
+        for index, node in enumerate(walk(func_ast)):
+            if node.elem_type in (InterpreterBase.IF_NODE, InterpreterBase.FOR_NODE) or node.elem_type in BIN_OPS:
+                node.dict["site"] = f"{key}:{index}"
+
+
+class ExecutionProfile:
+    def __init__(self, program):
+        self.program = program  # program_hash of the program it was recorded for
+        self.calls = {}
+        self.branches = {}
+        self.loops = {}
+        self.operands = {}
+
+    def record_call(self, func_ast):
+        key = function_key(func_ast)
+        self.calls[key] = self.calls.get(key, 0) + 1
+
+    def record_branch(self, node, taken):
+        site = node.get("site")
+        if site is not None:
+            counts = self.branches.setdefault(site, [0, 0])
+            counts[0 if taken else 1] += 1
+
+    def record_loop(self, node, iterations):
+        site = node.get("site")
+        if site is not None:
+            counts = self.loops.setdefault(site, [0, 0])
+            counts[0] += 1
+            counts[1] += iterations
+
+    def record_operands(self, node, left_type, right_type):
+        site = node.get("site")
+        if site is not None:
+            types = self.operands.setdefault(site, {})
+            pair = f"{left_type},{right_type}"
+            types[pair] = types.get(pair, 0) + 1
+
+    def save(self, path):
+        data = {
+            "version": PROFILE_VERSION,
+            "program": self.program,
+            "calls": self.calls,
+            "branches": self.branches,
+            "loops": self.loops,
+            "operands": self.operands,
+        }
+        with open(path, "w") as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+
+    def __str__(self):
+        lines = [f"profile of {self.program[:12]}"]
+        for key, count in sorted(self.calls.items(), key=lambda item: -item[1]):
+            lines.append(f"  {key}: {count} calls")
+        for site, (taken, not_taken) in sorted(self.branches.items()):
+            lines.append(f"  if {site}: taken {taken} of {taken + not_taken}")
+        for site, (runs, iterations) in sorted(self.loops.items()):
+            lines.append(f"  for {site}: {iterations} iterations in {runs} runs")
+        return "\n".join(lines)
+
+
+def load_profile(path):
+    with open(path) as f:
+        data = json.load(f)
+    if data.get("version") != PROFILE_VERSION:
+        return None
+    profile = ExecutionProfile(data["program"])
+    profile.calls = data["calls"]
+    profile.branches = data["branches"]
+    profile.loops = data["loops"]
+    profile.operands = data["operands"]
+    return profile
+
+
+class PGOReport:
+    def __init__(self):
+        self.used = False  # False if the profile was missing or for another program
+        self.hot = []  # functions inlined with the larger size limit
+        self.cold = []  # functions never inlined because the profile didn't call them
+        self.speculated = 0  # operators specialized from profiled operand types
+        self.precompiled = []  # functions compiled before main started
+
+    def __str__(self):
+        if not self.used:
+            return "no profile for this program"
+        return "\n".join([
+            f"hot functions: {', '.join(self.hot)}",
+            f"cold functions: {', '.join(self.cold)}",
+            f"speculated {self.speculated} operators",
+            f"precompiled: {', '.join(self.precompiled)}",
+        ])
+
+
+# per-function size limits for inline_calls, keyed by (name, num params)
+def inline_sizes(profile, functions, max_size, report):
+    sizes = {}
+    for func_ast in functions:
+        key = function_key(func_ast)
+        calls = profile.calls.get(key, 0)
+        if calls == 0:
+            sizes[(func_ast.get("name"), len(func_ast.get("args")))] = 0
+            report.cold.append(key)
+        elif calls >= HOT_CALLS:
+            sizes[(func_ast.get("name"), len(func_ast.get("args")))] = max_size * HOT_INLINE_FACTOR
+            report.hot.append(key)
+    return sizes
+
+
+# A variant that only applies to the operand types it was chosen for. Returning None
+# sends other operands down the interpreter's generic path, like a variant does for
+# the values it can't handle. A class rather than a closure, so trees still pickle.
+class Guarded:
+    def __init__(self, variant, left_type, right_type):
+        self.variant = variant
+        self.left_type = left_type
+        self.right_type = right_type
+
+    def __call__(self, x, y):
+        if x.t != self.left_type or y.t != self.right_type:
+            return None
+        # void results are nil values that must raise in the generic path
+        if (x.t == Type.NIL and x.v == "void") or (y.t == Type.NIL and y.v == "void"):
+            return None
+        return self.variant(x, y)
+
+
+def speculate_ops(profile, functions, structs):
+    count = 0
+    for func_ast in functions:
+        for node in walk(func_ast):
+            if node.elem_type not in BIN_OPS or node.get("spec") is not None or node.get("checked") is not None:
+                continue
+            types = profile.operands.get(node.get("site"))
+            if not types or len(types) != 1:
+                continue
+            left_type, right_type = next(iter(types)).split(",")
+            if left_type in structs and right_type in structs and left_type != right_type:
+                continue
+            variant = VARIANTS.get((node.elem_type, _kind(left_type, structs), _kind(right_type, structs)))
+            if variant is not None:
+                node.dict["spec"] = Guarded(variant, left_type, right_type)
+                count += 1
+    return count
+
+
+# calls plus loop iterations the profile recorded for each function
+def profiled_heat(profile, functions):
+    heat = {}
+    by_key = {function_key(func_ast): func_ast for func_ast in functions}
+    for key, calls in profile.calls.items():
+        if key in by_key:
+            heat[by_key[key]] = heat.get(by_key[key], 0) + calls
+    for site, (_, iterations) in profile.loops.items():
+        key = site.rsplit(":", 1)[0]
+        if key in by_key:
+            heat[by_key[key]] = heat.get(by_key[key], 0) + iterations
+    return heat
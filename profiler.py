@@ -0,0 +1,153 @@
+import marshal
+import time
+
+from astutil import walk
+from heatmap import HeatMap
+from pgo_v3 import function_key
+
+# Deterministic profiler for interpreterv3 and interpreterv4.
+#
+# An interpreter created with profiling=True replaces its call and statement
+# methods on the instance with the wrappers below, so an interpreter without it
+# runs exactly the code it did before. The profiler records, per function
+# ("name/num params"):
+#   calls       every call, including memoized and inlined ones
+#   primitive   calls made while the function wasn't already running
+#   inclusive   wall time of the primitive calls, callees included
+#   exclusive   wall time spent in the function's own statements
+# the same four per (caller, callee) pair, the exclusive time of every call stack,
+# and how many times each statement ran (see statement_names below for how functions
+# and statements are named); heat_map() shows the counts line by line on the
+# program's source.
+#
+# save_pstats writes the pstats format (pstats.Stats(path) loads it) and
+# save_collapsed the folded stacks flamegraph.pl and speedscope read, in
+# microseconds. In v4, evaluating a lazy argument is charged to the function that
+# needs its value.
+
+PROGRAM_FILE = "<brewin>"
+
+
+class Profiler:
+    def __init__(self):
+        self.functions = {}  # key -> [calls, primitive, inclusive, exclusive]
+        self.edges = {}  # (caller key, callee key) -> [calls, primitive, inclusive, exclusive]
+        self.stacks = {}  # "main/0;f/1" -> exclusive seconds
+        self.hits = {}  # statement node -> times run; hash_cons never merges statements
+        self.program = []  # function nodes of the last program run, to name statements
+        self.source = ""  # text of the last program run
+        self.stack = []  # [key, stack, start, seconds in callees] per running call
+        self.running = {}  # key -> activations on the stack
+
+    # wraps an interpreter method whose first argument is a function node, or a
+    # node holding the function under "func" if inline
+    def time_calls(self, method, inline=False):
+        def timed(node, *args):
+            self.enter(node.get("func") if inline else node)
+            try:
+                return method(node, *args)
+            finally:
+                self.exit()
+        return timed
+
+    def count_statements(self, method):
+        hits = self.hits
+
+        def counted(statement):
+            hits[statement] = hits.get(statement, 0) + 1
+            return method(statement)
+        return counted
+
+    def enter(self, func_ast):
+        key = function_key(func_ast)
+        stack = f"{self.stack[-1][1]};{key}" if self.stack else key
+        self.running[key] = self.running.get(key, 0) + 1
+        self.stack.append([key, stack, time.perf_counter(), 0.0])
+
+    def exit(self):
+        key, stack, start, in_callees = self.stack.pop()
+        elapsed = time.perf_counter() - start
+        self.running[key] -= 1
+        primitive = self.running[key] == 0
+        exclusive = elapsed - in_callees
+        _add(self.functions.setdefault(key, [0, 0, 0.0, 0.0]), primitive, elapsed, exclusive)
+        if self.stack:
+            caller = self.stack[-1]
+            caller[3] += elapsed
+            _add(self.edges.setdefault((caller[0], key), [0, 0, 0.0, 0.0]), primitive, elapsed, exclusive)
+        self.stacks[stack] = self.stacks.get(stack, 0.0) + exclusive
+
+    # statement name -> times run
+    def statement_hits(self):
+        names = statement_names(self.program, self.hits)
+        return {names[node]: count for node, count in self.hits.items()}
+
+    def heat_map(self):
+        return HeatMap(self.source, self.hits)
+
+    def pstats(self):
+        lines = {function_key(func_ast): func_ast.line for func_ast in self.program}
+        stats = {}
+        for key, (calls, primitive, inclusive, exclusive) in self.functions.items():
+            stats[_label(key, lines)] = (primitive, calls, exclusive, inclusive, {})
+        for (caller, callee), (calls, primitive, inclusive, exclusive) in self.edges.items():
+            stats[_label(callee, lines)][4][_label(caller, lines)] = (primitive, calls, exclusive, inclusive)
+        return stats
+
+    def save_pstats(self, path):
+        with open(path, "wb") as f:
+            marshal.dump(self.pstats(), f)
+
+    def collapsed(self):
+        return [f"{stack} {round(seconds * 1e6)}" for stack, seconds in sorted(self.stacks.items())]
+
+    def save_collapsed(self, path):
+        with open(path, "w") as f:
+            f.write("".join(line + "\n" for line in self.collapsed()))
+
+    def __str__(self):
+        lines = [f"{'function':24} {'calls':>9} {'inclusive ms':>13} {'exclusive ms':>13}"]
+        for key, (calls, _, inclusive, exclusive) in sorted(self.functions.items(), key=lambda item: -item[1][3]):
+            lines.append(f"{key:24} {calls:9} {inclusive * 1000:13.2f} {exclusive * 1000:13.2f}")
+        lines.append(f"{'statement':38} {'hits':>9}")
+        for name, count in sorted(self.statement_hits().items(), key=lambda item: -item[1]):
+            lines.append(f"{name:38} {count:9}")
+        return "\n".join(lines)
+
+
+# Naming shared with sampler.py. Functions are "name/num params", as pgo_v3.function_key
+# names them, and statements are named like pgo_v3 sites, "name/num params:index" of
+# their node in a preorder walk of the function, plus the line the statement starts
+# on. Both profilers only see the calls and statements the tree walker runs, so while
+# either is on, functions the register machine or compiled code would run stay on
+# the tree walker.
+#
+# node -> "name/num params:index kind line N" for each of nodes, which are statements of functions
+def statement_names(functions, nodes):
+    names = {}
+    for func_ast in functions:
+        key = function_key(func_ast)
+        for index, node in enumerate(walk(func_ast)):
+            if node in nodes:
+                names[node] = f"{key}:{index} {node.elem_type}" + _line(node)
+    for node in nodes:
+        if node not in names:
+            names[node] = f"? {node.elem_type}" + _line(node)
+    return names
+
+
+def _line(node):
+    return "" if node.line is None else f" line {node.line}"
+
+
+# the pstats name of a function: the program, the line it's defined on (0 if unknown) and its key
+def _label(key, lines):
+    return (PROGRAM_FILE, lines.get(key) or 0, key)
+
+
+def _add(stats, primitive, elapsed, exclusive):
+    stats[0] += 1
+    if primitive:
+        stats[1] += 1
+        stats[2] += elapsed
+    stats[3] += exclusive
@@ -0,0 +1,79 @@
+from astutil import walk, walk_all
+from intbase import InterpreterBase
+
+# Builtins that do I/O; any function reaching one of these is impure
+IO_FUNCS = {"print", "inputi", "inputs"}
+# Types whose values can be used as (hashable) cache keys and results
+PURE_TYPES = {None, "int", "bool", "string"}
+
+
+# flatten {name: {num_params: func_ast}} into {(name, num_params): func_ast}
+def flatten_func_table(func_name_to_ast):
+    table = {}
+    for name, overloads in func_name_to_ast.items():
+        for num_params, func_ast in overloads.items():
+            table[(name, num_params)] = func_ast
+    return table
+
+
+# Returns the set of (name, num_params) keys of functions that are pure functions
+# of their arguments: they never do I/O, raise, allocate or touch struct fields,
+# only use their own parameters and locals, and only call other pure functions.
+# With dynamic_scope (v2, where a name not declared in an enclosing block of the
+# function resolves to the caller's variable), a local is only a parameter or a
+# top-level var of the body declared before the statement using it.
+def find_pure_functions(func_table, dynamic_scope=False):
+    callees = {}
+    for key, func_ast in func_table.items():
+        calls = _local_callees(func_ast, dynamic_scope)
+        if calls is not None:
+            callees[key] = calls
+
+    pure = set(callees)
+    changed = True
+    while changed:
+        changed = False
+        for key in list(pure):
+            if not callees[key] <= pure:
+                pure.discard(key)
+                changed = True
+    return pure
+
+
+# Returns the functions called by func_ast, or None if func_ast is impure on its own
+def _local_callees(func_ast, dynamic_scope):
+    if func_ast.get("return_type") not in PURE_TYPES:
+        return None
+    local_names = set()
+    for arg in func_ast.get("args"):
+        if arg.get("var_type") not in PURE_TYPES:
+            return None
+        local_names.add(arg.get("name"))
+    statements = func_ast.get("statements")
+    if dynamic_scope:
+        for statement in statements:
+            for node in walk(statement):
+                if (node.elem_type == InterpreterBase.VAR_NODE or node.elem_type == "=") and \
+                        node.get("name") not in local_names:
+                    return None
+            if statement.elem_type == InterpreterBase.VAR_DEF_NODE:
+                local_names.add(statement.get("name"))
+    else:
+        for node in walk_all(statements):
+            if node.elem_type == InterpreterBase.VAR_DEF_NODE:
+                local_names.add(node.get("name"))
+
+    calls = set()
+    for node in walk_all(statements):
+        kind = node.elem_type
+        if kind in (InterpreterBase.RAISE_NODE, InterpreterBase.TRY_NODE, InterpreterBase.NEW_NODE,
+                    InterpreterBase.FIELD_NODE):
+            return None
+        if kind == InterpreterBase.VAR_NODE or kind == "=":
+            if node.get("name") not in local_names:  # also rejects dotted field paths
+                return None
+        elif kind == InterpreterBase.FCALL_NODE or kind == InterpreterBase.INLINE_NODE:
+            if node.get("name") in IO_FUNCS:
+                return None
+            calls.add((node.get("name"), len(node.get("args"))))
+    return calls
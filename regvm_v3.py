@@ -0,0 +1,397 @@
+from intbase import InterpreterBase, ErrorType
+from type_value3 import Type, Value
+
+# Register machine backend for interpreterv3.
+#
+# Each function is compiled to three-address code over a register file of fixed
+# size. Every register has one static type: a declared variable keeps the type of
+# its declaration (each declaration gets its own register, so shadowing works as
+# it does in blocks) and temporaries are only reused for values of the same type.
+# Literals live in registers filled in before the first instruction runs. Ints,
+# bools and strings are plain Python values; they are boxed into Values only where
+# they leave the machine: results returned to the tree walker, calls to functions
+# that run there, and print.
+#
+# The machine takes the same functions tier_v3 does: the type checker proved every
+# type, parameters, locals and results are primitive, and assignments, calls and
+# operators are "checked". Everything else runs on the tree walker, and the report
+# says why. Operators behave as op_to_lambda's: && and || evaluate both operands,
+# and strings equal to "void" raise the tree walker's error.
+
+PRIMITIVES = {Type.INT, Type.STRING, Type.BOOL}
+DEFAULTS = {Type.INT: 0, Type.STRING: "", Type.BOOL: False}
+CALL_NODES = {InterpreterBase.FCALL_NODE, InterpreterBase.INLINE_NODE}
+
+# opcodes; an instruction is (opcode, a, b, c), usually a = b op c
+MOVE = 0  # a = b
+ADD = 1
+SUB = 2
+MUL = 3
+DIV = 4
+EQ = 5
+NE = 6
+LT = 7
+LE = 8
+GT = 9
+GE = 10
+AND = 11
+OR = 12
+CONCAT = 13
+STR_EQ = 14
+STR_NE = 15
+NEG = 16  # a = -b
+NOT = 17  # a = not b
+IS_ZERO = 18  # a = b == 0
+NOT_ZERO = 19  # a = b != 0
+JUMP = 20  # go to a
+JUMP_IF_NOT = 21  # go to a unless b
+CALL = 22  # a = callee b applied to the registers in c; a is None for a statement
+PRINT = 23  # print the registers in b, of the types in c
+RETURN = 24  # return a, or nothing if a is None
+
+NAMES = ["move", "add", "sub", "mul", "div", "eq", "ne", "lt", "le", "gt", "ge", "and", "or",
+         "concat", "str_eq", "str_ne", "neg", "not", "is_zero", "not_zero", "jump",
+         "jump_if_not", "call", "print", "return"]
+INT_OPS = {"+": ADD, "-": SUB, "*": MUL, "/": DIV, "==": EQ, "!=": NE, "<": LT, "<=": LE, ">": GT, ">=": GE}
+BOOL_OPS = {"&&": AND, "||": OR, "==": EQ, "!=": NE}
+STRING_OPS = {"+": CONCAT, "==": STR_EQ, "!=": STR_NE}
+
+
+class Unsupported(Exception):
+    pass
+
+
+class VMReport:
+    def __init__(self):
+        self.compiled = []  # "name/num params" of the functions the machine runs
+        self.rejected = {}  # "name/num params" -> why it runs on the tree walker
+
+    def __str__(self):
+        lines = [f"compiled {len(self.compiled)} functions to register code: " + ", ".join(self.compiled)]
+        lines.append(f"{len(self.rejected)} functions left on the tree walker")
+        lines += [f"  {key}: {reason}" for key, reason in self.rejected.items()]
+        return "\n".join(lines)
+
+
+class VMFunction:
+    def __init__(self, func_ast, code, registers, register_types, callees):
+        self.func_ast = func_ast
+        self.code = code
+        self.registers = registers  # initial register file; parameters come first
+        self.register_types = register_types
+        self.callees = callees  # functions CALL refers to by index
+
+    def __str__(self):
+        lines = [f"{self.func_ast.get('name')}: {len(self.registers)} registers"]
+        for pc, (op, a, b, c) in enumerate(self.code):
+            operands = ", ".join(str(x) for x in (a, b, c) if x is not None)
+            lines.append(f"  {pc:4} {NAMES[op]:12} {operands}")
+        return "\n".join(lines)
+
+
+class RegisterVM:
+    def __init__(self, interpreter, functions):
+        self.interpreter = interpreter
+        self.report = VMReport()
+        for func_ast in functions:
+            key = f"{func_ast.get('name')}/{len(func_ast.get('args'))}"
+            try:
+                func_ast.dict["vm"] = FunctionCompiler(func_ast).compile()
+                self.report.compiled.append(key)
+            except Unsupported as e:
+                self.report.rejected[key] = str(e)
+
+    # runs a compiled function on bound arguments, returning a Value
+    def run(self, func_ast, vm_func, args):
+        result = self.execute(vm_func, [value.value() for value in args.values()])
+        return_type = func_ast.get("return_type")
+        if return_type == InterpreterBase.VOID_DEF:
+            return Value(Type.NIL, "void")
+        return Value(return_type, result)
+
+    def execute(self, vm_func, values):
+        regs = vm_func.registers[:]
+        regs[:len(values)] = values
+        code = vm_func.code
+        pc = 0
+        while True:
+            op, a, b, c = code[pc]
+            pc += 1
+            if op == MOVE:
+                regs[a] = regs[b]
+            elif op == JUMP_IF_NOT:
+                if not regs[b]:
+                    pc = a
+            elif op == ADD:
+                regs[a] = regs[b] + regs[c]
+            elif op == LT:
+                regs[a] = regs[b] < regs[c]
+            elif op == JUMP:
+                pc = a
+            elif op == SUB:
+                regs[a] = regs[b] - regs[c]
+            elif op == MUL:
+                regs[a] = regs[b] * regs[c]
+            elif op == DIV:
+                regs[a] = regs[b] // regs[c]
+            elif op == EQ:
+                regs[a] = regs[b] == regs[c]
+            elif op == NE:
+                regs[a] = regs[b] != regs[c]
+            elif op == LE:
+                regs[a] = regs[b] <= regs[c]
+            elif op == GT:
+                regs[a] = regs[b] > regs[c]
+            elif op == GE:
+                regs[a] = regs[b] >= regs[c]
+            elif op == AND:
+                regs[a] = regs[b] and regs[c]
+            elif op == OR:
+                regs[a] = regs[b] or regs[c]
+            elif op == CALL:
+                result = self.__call(vm_func.callees[b], [regs[r] for r in c])
+                if a is not None:
+                    regs[a] = result
+            elif op == RETURN:
+                return None if a is None else regs[a]
+            elif op == NEG:
+                regs[a] = -regs[b]
+            elif op == NOT:
+                regs[a] = not regs[b]
+            elif op == IS_ZERO:
+                regs[a] = regs[b] == 0
+            elif op == NOT_ZERO:
+                regs[a] = regs[b] != 0
+            elif op == PRINT:
+                self.interpreter.output("".join(self.__printable(regs[r], t) for r, t in zip(b, c)))
+            else:  # string operators
+                x = regs[b]
+                y = regs[c]
+                if x == "void" or y == "void":
+                    self.interpreter.error(ErrorType.TYPE_ERROR, "Using return in expression")
+                if op == CONCAT:
+                    if a == b:
+                        # s = s + t: with the register cleared, x is the string's only
+                        # reference and CPython can extend it in place
+                        regs[a] = None
+                        x += y
+                        regs[a] = x
+                    else:
+                        regs[a] = x + y
+                elif op == STR_EQ:
+                    regs[a] = x == y
+                else:
+                    regs[a] = x != y
+
+    def __call(self, func_ast, values):
+        interpreter = self.interpreter
+        vm_func = func_ast.get("vm")
+        # memoized functions keep going through their cache
+        if vm_func is None or (func_ast.get("name"), len(values)) in interpreter.memo_caches:
+            return interpreter.call_from_compiled(func_ast, values)
+        return self.execute(vm_func, values)
+
+    def __printable(self, value, t):
+        if t == Type.INT:
+            return str(value)
+        if t == Type.BOOL:
+            return "true" if value else "false"
+        if value == "void":
+            self.interpreter.error(ErrorType.TYPE_ERROR, "Return is void, cannot print")
+        return value
+
+
+# three-address code for one function; raises Unsupported
+class FunctionCompiler:
+    def __init__(self, func_ast):
+        self.func_ast = func_ast
+        self.code = []
+        self.registers = []
+        self.register_types = []
+        self.constants = {}  # (type, value) -> register holding it
+        self.free = {t: [] for t in PRIMITIVES}  # temporaries that can be reused, by type
+        self.temps = []  # temporaries taken by the current statement
+        self.scopes = []  # dicts of variable name -> register
+        self.callees = []
+
+    def compile(self):
+        func_ast = self.func_ast
+        return_type = func_ast.get("return_type")
+        if return_type != InterpreterBase.VOID_DEF and return_type not in PRIMITIVES:
+            raise Unsupported(f"returns {return_type}")
+        if not func_ast.get("checked_return"):
+            raise Unsupported("returns aren't proven to have the return type")
+        params = {}
+        for arg in func_ast.get("args"):
+            if arg.get("name") in params:
+                raise Unsupported(f"has two parameters named {arg.get('name')}")
+            params[arg.get("name")] = self.__register(self.__primitive(arg.get("var_type")))
+        self.scopes.append(params)
+        self.__block(func_ast.get("statements"))
+        self.__emit(RETURN)
+        return VMFunction(func_ast, self.code, self.registers, self.register_types, self.callees)
+
+    def __register(self, t, value=None):
+        self.registers.append(DEFAULTS[t] if value is None else value)
+        self.register_types.append(t)
+        return len(self.registers) - 1
+
+    def __temp(self, t):
+        reg = self.free[t].pop() if self.free[t] else self.__register(t)
+        self.temps.append(reg)
+        return reg
+
+    def __constant(self, t, value):
+        key = (t, value)
+        if key not in self.constants:
+            self.constants[key] = self.__register(t, value)
+        return self.constants[key]
+
+    def __primitive(self, t):
+        if t not in PRIMITIVES:
+            raise Unsupported(f"uses a value of type {t}")
+        return t
+
+    def __emit(self, op, a=None, b=None, c=None):
+        self.code.append((op, a, b, c))
+        return len(self.code) - 1
+
+    def __patch(self, pc, target):
+        op, _, b, c = self.code[pc]
+        self.code[pc] = (op, target, b, c)
+
+    def __lookup(self, name):
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        raise Unsupported(f"variable {name} may not be declared where it's used")
+
+    def __block(self, statements):
+        self.scopes.append({})
+        for statement in statements:
+            self.__statement(statement)
+        self.scopes.pop()
+
+    # temporaries are only live within the statement that computes them
+    def __statement(self, statement):
+        self.__compile_statement(statement)
+        for reg in self.temps:
+            self.free[self.register_types[reg]].append(reg)
+        self.temps = []
+
+    def __compile_statement(self, statement):
+        kind = statement.elem_type
+        if kind in CALL_NODES:
+            if statement.get("name") == "print" and statement.get("func") is None:
+                regs, types = [], []
+                for arg in statement.get("args"):
+                    reg, t = self.__expr(arg)
+                    regs.append(reg)
+                    types.append(t)
+                self.__emit(PRINT, None, tuple(regs), tuple(types))
+            else:
+                self.__call(statement, None)
+        elif kind == "=":
+            if statement.get("fields") is not None or not statement.get("checked"):
+                raise Unsupported("has an assignment that isn't checked")
+            reg = self.__lookup(statement.get("name"))
+            self.__expr(statement.get("expression"), reg)
+        elif kind == InterpreterBase.VAR_DEF_NODE:
+            var_name = statement.get("name")
+            if var_name in self.scopes[-1]:
+                raise Unsupported(f"defines {var_name} twice in a block")
+            t = self.__primitive(statement.get("var_type"))
+            reg = self.__register(t)
+            self.scopes[-1][var_name] = reg
+            self.__emit(MOVE, reg, self.__constant(t, DEFAULTS[t]))
+        elif kind == InterpreterBase.RETURN_NODE:
+            expr_ast = statement.get("expression")
+            self.__emit(RETURN, None if expr_ast is None else self.__expr(expr_ast)[0])
+        elif kind == InterpreterBase.IF_NODE:
+            jump_else = self.__emit(JUMP_IF_NOT, None, self.__condition(statement.get("condition")))
+            self.__block(statement.get("statements"))
+            if statement.get("else_statements") is None:
+                self.__patch(jump_else, len(self.code))
+            else:
+                jump_end = self.__emit(JUMP)
+                self.__patch(jump_else, len(self.code))
+                self.__block(statement.get("else_statements"))
+                self.__patch(jump_end, len(self.code))
+        elif kind == InterpreterBase.FOR_NODE:
+            self.__statement(statement.get("init"))
+            start = len(self.code)
+            jump_end = self.__emit(JUMP_IF_NOT, None, self.__condition(statement.get("condition")))
+            self.__block(statement.get("statements"))
+            self.__statement(statement.get("update"))
+            self.__emit(JUMP, start)
+            self.__patch(jump_end, len(self.code))
+        else:
+            raise Unsupported(f"has a {kind} statement")
+
+    def __condition(self, cond_ast):
+        reg, t = self.__expr(cond_ast)
+        if t == Type.INT:
+            result = self.__temp(Type.BOOL)
+            self.__emit(NOT_ZERO, result, reg)
+            return result
+        if t != Type.BOOL:
+            raise Unsupported(f"has a {t} condition")
+        return reg
+
+    def __call(self, call_ast, dst):
+        func_ast = call_ast.get("func")
+        if func_ast is None or not call_ast.get("checked"):
+            raise Unsupported(f"has a call to {call_ast.get('name')} that isn't checked")
+        args = tuple(self.__expr(arg)[0] for arg in call_ast.get("args"))
+        self.callees.append(func_ast)
+        self.__emit(CALL, dst, len(self.callees) - 1, args)
+        return func_ast.get("return_type")
+
+    # Returns (register, type) for the value of an expression. A result that needs
+    # an instruction goes to dst if given, else to a temporary.
+    def __expr(self, node, dst=None):
+        kind = node.elem_type
+        if kind == InterpreterBase.INVARIANT_NODE:
+            return self.__expr(node.get("expression"), dst)
+        if kind in (InterpreterBase.INT_NODE, InterpreterBase.STRING_NODE, InterpreterBase.BOOL_NODE):
+            return self.__move(self.__constant(kind, node.get("val")), kind, dst)
+        if kind == InterpreterBase.VAR_NODE:
+            reg = self.__lookup(node.get("name"))
+            return self.__move(reg, self.register_types[reg], dst)
+        if kind in CALL_NODES:
+            func_ast = node.get("func")
+            t = self.__primitive(func_ast.get("return_type") if func_ast is not None else None)
+            result = dst if dst is not None else self.__temp(t)
+            self.__call(node, result)
+            return result, t
+        if kind == InterpreterBase.NEG_NODE or kind == InterpreterBase.NOT_NODE:
+            reg, t = self.__expr(node.get("op1"))
+            if kind == InterpreterBase.NEG_NODE:
+                op, result_type = NEG, Type.INT
+                if t != Type.INT:
+                    raise Unsupported(f"negates a {t}")
+            else:
+                op, result_type = (IS_ZERO if t == Type.INT else NOT), Type.BOOL
+                if t != Type.INT and t != Type.BOOL:
+                    raise Unsupported(f"negates a {t}")
+            result = dst if dst is not None else self.__temp(result_type)
+            self.__emit(op, result, reg)
+            return result, result_type
+        t = node.get("checked")
+        if t is None or t == Type.NIL:
+            raise Unsupported(f"has a {kind} operation that isn't checked")
+        left, left_type = self.__expr(node.get("op1"))
+        right, right_type = self.__expr(node.get("op2"))
+        if left_type != t or right_type != t:
+            raise Unsupported(f"has a {kind} operation on {left_type} and {right_type}")
+        ops = INT_OPS if t == Type.INT else BOOL_OPS if t == Type.BOOL else STRING_OPS
+        result_type = t if kind in ("+", "-", "*", "/") else Type.BOOL
+        result = dst if dst is not None else self.__temp(result_type)
+        self.__emit(ops[kind], result, left, right)
+        return result, result_type
+
+    def __move(self, reg, t, dst):
+        if dst is None or dst == reg:
+            return reg, t
+        self.__emit(MOVE, dst, reg)
+        return dst, t
@@ -0,0 +1,46 @@
+import itertools
+
+# Rope strings for the string + of interpreterv3 and interpreterv4.
+#
+# A Rope is the first count parts of a parts list. Appending to the rope that
+# ends at the end of its list appends to the list and returns a rope one part
+# longer that shares it, so a loop running s = s + t copies nothing until s is
+# read; appending to an older rope of the same list copies its parts first.
+# flatten() joins the parts once and keeps the result, and a rope at the end of
+# its list then starts a new list holding just that string, so later appends
+# don't join the same parts again.
+#
+# type_value3 and type_value4 wrap ropes in a RopeValue whose value() flattens it;
+# concatenations shorter than ROPE_MIN characters stay plain strings.
+
+ROPE_MIN = 256
+
+
+class Rope:
+    __slots__ = ("parts", "count", "length", "flat")
+
+    def __init__(self, parts, count, length):
+        self.parts = parts
+        self.count = count
+        self.length = length
+        self.flat = None
+
+    def append(self, s):
+        if self.count == len(self.parts):
+            parts = self.parts
+        else:
+            parts = self.parts[:self.count]
+        parts.append(s)
+        return Rope(parts, self.count + 1, self.length + len(s))
+
+    def flatten(self):
+        if self.flat is None:
+            self.flat = "".join(itertools.islice(self.parts, self.count))
+            if self.count == len(self.parts):
+                self.parts = [self.flat]
+                self.count = 1
+        return self.flat
+
+
+def make_rope(left, right):
+    return Rope([left, right], 2, len(left) + len(right))
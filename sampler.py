@@ -0,0 +1,153 @@
+import sys
+import threading
+import time
+
+from pgo_v3 import function_key
+from profiler import statement_names
+
+# Sampling profiler for interpreterv3 and interpreterv4.
+#
+# An interpreter created with sampling=True keeps a shadow stack holding the
+# function node of every running Brewin call: its call methods push and pop it,
+# through the same instance-method wrappers the deterministic profiler uses.
+# While run() executes main, a daemon thread wakes every interval seconds, copies
+# the shadow stack and takes the statement the innermost call is running from the
+# interpreter's innermost statement method frame, so the cost to the program is an
+# append and a pop per call, whatever the interval.
+#
+# A sample is counted under its call stack plus that statement, named as described
+# at profiler.statement_names, which also covers what runs on the tree walker.
+# folded() gives the folded stacks flamegraph.pl and speedscope read, as
+# "main/0;f/1;f/1:7 return line 5 <samples>", and str() the functions and
+# statements with the most samples. Python only switches threads every
+# sys.getswitchinterval() seconds (5 ms by default), so run() lowers the switch
+# interval to interval while sampling and restores it after.
+
+DEFAULT_INTERVAL = 0.001
+
+
+class SamplingProfiler:
+    def __init__(self, statement_code, interval=DEFAULT_INTERVAL):
+        self.statement_code = statement_code  # code of the method running one statement
+        self.interval = interval
+        self.stack = []  # function node per running call
+        self.samples = {}  # (function node, ..., statement) -> times seen
+        self.program = []  # function nodes of the last program run, to name statements
+        self.thread = None
+        self.thread_id = None  # the thread running the program
+        self.stopping = threading.Event()
+        self.switch_interval = None  # the switch interval to restore on stop
+
+    # wraps an interpreter method taking a function node and its arguments, or a node
+    # holding the function under "func" if inline
+    def track_calls(self, method, inline=False):
+        push = self.stack.append
+        pop = self.stack.pop
+        # fixed arguments keep the call to method a plain Python call
+        if inline:
+            def tracked(inline_ast):
+                push(inline_ast.get("func"))
+                try:
+                    result = method(inline_ast)
+                finally:
+                    pop()
+                return result
+        else:
+            def tracked(func_ast, args):
+                push(func_ast)
+                try:
+                    result = method(func_ast, args)
+                finally:
+                    pop()
+                return result
+        return tracked
+
+    def start(self):
+        self.stopping.clear()
+        self.thread_id = threading.get_ident()
+        self.switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(self.switch_interval, self.interval))
+        self.thread = threading.Thread(target=self.__sample, name="brewin-sampler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.thread is None:
+            return
+        self.stopping.set()
+        self.thread.join()
+        self.thread = None
+        sys.setswitchinterval(self.switch_interval)
+
+    def __sample(self):
+        samples = self.samples
+        due = time.perf_counter()
+        while True:
+            # keep to the interval however long waiting for the GIL took, skipping
+            # samples that are already late
+            now = time.perf_counter()
+            due = max(due + self.interval, now)
+            if self.stopping.wait(due - now):
+                return
+            # both run while holding the GIL, so they see the program between two bytecodes
+            stack = tuple(self.stack)
+            if stack:
+                sample = stack + (self.__statement(),)
+                samples[sample] = samples.get(sample, 0) + 1
+
+    # the statement the program thread is running, or None between statements
+    def __statement(self):
+        frame = sys._current_frames().get(self.thread_id)
+        while frame is not None:
+            if frame.f_code is self.statement_code:
+                return frame.f_locals.get("statement")
+            frame = frame.f_back
+        return None
+
+    def total(self):
+        return sum(self.samples.values())
+
+    # (keys, statement name or None, samples) per distinct sample
+    def __named(self):
+        names = statement_names(self.program, {sample[-1] for sample in self.samples if sample[-1] is not None})
+        for sample, count in self.samples.items():
+            statement = sample[-1]
+            keys = tuple(function_key(func_ast) for func_ast in sample[:-1])
+            yield keys, None if statement is None else names[statement], count
+
+    # "main/0;f/1;f/1:7 return line 5" -> samples
+    def stacks(self):
+        stacks = {}
+        for keys, statement, count in self.__named():
+            stack = ";".join(keys if statement is None else keys + (statement,))
+            stacks[stack] = stacks.get(stack, 0) + count
+        return stacks
+
+    def folded(self):
+        return [f"{stack} {count}" for stack, count in sorted(self.stacks().items())]
+
+    def save_folded(self, path):
+        with open(path, "w") as f:
+            f.write("".join(line + "\n" for line in self.folded()))
+
+    def __str__(self):
+        total = self.total()
+        functions = {}  # key -> [samples on the stack, samples on top]
+        statements = {}
+        for keys, statement, count in self.__named():
+            for key in set(keys):
+                functions.setdefault(key, [0, 0])[0] += count
+            functions[keys[-1]][1] += count
+            if statement is not None:
+                statements[statement] = statements.get(statement, 0) + count
+        lines = [f"{total} samples every {self.interval * 1000:g} ms",
+                 f"{'function':24} {'inclusive %':>12} {'exclusive %':>12}"]
+        for key, (inclusive, exclusive) in sorted(functions.items(), key=lambda item: -item[1][1]):
+            lines.append(f"{key:24} {_percent(inclusive, total):12.1f} {_percent(exclusive, total):12.1f}")
+        lines.append(f"{'statement':38} {'samples %':>10}")
+        for name, count in sorted(statements.items(), key=lambda item: -item[1]):
+            lines.append(f"{name:38} {_percent(count, total):10.1f}")
+        return "\n".join(lines)
+
+
+def _percent(count, total):
+    return 100.0 * count / total if total else 0.0
@@ -0,0 +1,142 @@
+import hashlib
+import sys
+import tempfile
+from collections import deque
+
+# Output sinks for InterpreterBase.output.
+#
+# An interpreter created with output_sink=<sink> hands every printed line to
+# sink.write instead of printing it and appending it to output_log, flushes the
+# sink when run() finishes (or fails), and get_output() returns sink.lines(). A
+# sink takes the place of both console_output and the log:
+#   BufferedSink  writes lines to a stream in chunks of flush_size characters
+#   DiscardSink   drops every line
+#   RingSink      keeps the last size lines
+#   SpillSink     keeps every line, moving them to a temporary file past
+#                 memory_lines lines
+#   HashSink      keeps a running hash of the output
+# Every sink counts the lines written to it; sinks that don't keep them return
+# an empty list from lines().
+
+DEFAULT_FLUSH_SIZE = 1 << 16
+DEFAULT_RING_SIZE = 1000
+DEFAULT_MEMORY_LINES = 10000
+
+
+class BufferedSink:
+    def __init__(self, stream=None, flush_size=DEFAULT_FLUSH_SIZE):
+        self.stream = stream  # sys.stdout at the time of each flush if None
+        self.flush_size = flush_size
+        self.buffer = []
+        self.size = 0
+        self.count = 0
+
+    def write(self, line):
+        line = str(line)
+        self.buffer.append(line)
+        self.size += len(line) + 1
+        self.count += 1
+        if self.size >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        stream = self.stream if self.stream is not None else sys.stdout
+        if self.buffer:
+            self.buffer.append("")
+            stream.write("\n".join(self.buffer))
+            self.buffer = []
+            self.size = 0
+        stream.flush()
+
+    def lines(self):
+        return []
+
+
+class DiscardSink:
+    def __init__(self):
+        self.count = 0
+
+    def write(self, line):
+        self.count += 1
+
+    def flush(self):
+        pass
+
+    def lines(self):
+        return []
+
+
+class RingSink:
+    def __init__(self, size=DEFAULT_RING_SIZE):
+        self.ring = deque(maxlen=size)
+        self.count = 0
+
+    def write(self, line):
+        self.ring.append(str(line))
+        self.count += 1
+
+    def flush(self):
+        pass
+
+    # the last size lines
+    def lines(self):
+        return list(self.ring)
+
+
+class SpillSink:
+    def __init__(self, memory_lines=DEFAULT_MEMORY_LINES):
+        self.memory_lines = memory_lines
+        self.buffer = []
+        self.file = None  # created on the first spill, deleted when closed
+        self.count = 0
+
+    def write(self, line):
+        self.buffer.append(str(line))
+        self.count += 1
+        if len(self.buffer) >= self.memory_lines:
+            self.__spill()
+
+    def __spill(self):
+        if self.file is None:
+            self.file = tempfile.TemporaryFile("w+", encoding="utf-8")
+        self.buffer.append("")
+        self.file.write("\n".join(self.buffer))
+        self.buffer = []
+
+    def flush(self):
+        pass
+
+    def lines(self):
+        if self.file is None:
+            return list(self.buffer)
+        self.file.seek(0)
+        spilled = self.file.read().split("\n")[:-1]
+        self.file.seek(0, 2)
+        return spilled + self.buffer
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.buffer = []
+
+
+class HashSink:
+    def __init__(self, algorithm="sha256"):
+        self.hash = hashlib.new(algorithm)
+        self.count = 0
+
+    # every line is hashed followed by a newline, so the digest matches the hash of
+    # the output written to a file
+    def write(self, line):
+        self.hash.update(f"{line}\n".encode("utf-8"))
+        self.count += 1
+
+    def flush(self):
+        pass
+
+    def hexdigest(self):
+        return self.hash.hexdigest()
+
+    def lines(self):
+        return []
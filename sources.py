@@ -0,0 +1,151 @@
+import itertools
+import mmap
+
+# Input sources for InterpreterBase.get_input.
+#
+# An interpreter created with input_source=<source> reads inputi and inputs lines
+# from source.next_line() instead of input() or the inp list; both return None
+# once the input runs out. Sources read their input a block of lines at a time,
+# so memory stays flat however long it is:
+#   IteratorSource  lines from any iterable, block_lines at a time
+#   FileSource      a text file (or path), chunk_size characters at a time
+#   BytesSource     an in-memory bytes buffer, chunk_size bytes at a time
+#   MmapSource      a memory-mapped file, chunk_size bytes at a time
+# A trailing newline ends a line rather than starting an empty one. next_int()
+# is inputi's fast path: the first call in a block converts the rest of the block
+# with one map(int, ...), and a block that holds anything int() rejects falls back
+# to converting one line at a time, so the results always match int(next_line()).
+
+DEFAULT_BLOCK_LINES = 4096
+DEFAULT_CHUNK_SIZE = 1 << 16
+
+
+class LineSource:
+    def __init__(self):
+        self.block = []
+        self.pos = 0  # next line of block
+        self.ints = None  # block[ints_from:] as ints, or False for a mixed block
+        self.ints_from = 0
+
+    # the next list of lines, empty at the end of the input
+    def read_block(self):
+        return []
+
+    def __fill(self):
+        while self.pos >= len(self.block):
+            block = self.read_block()
+            if not block:
+                return False
+            self.block = block
+            self.pos = 0
+            self.ints = None
+        return True
+
+    def next_line(self):
+        if self.pos >= len(self.block) and not self.__fill():
+            return None
+        line = self.block[self.pos]
+        self.pos += 1
+        return line
+
+    def next_int(self):
+        if self.pos >= len(self.block) and not self.__fill():
+            return None
+        if self.ints is None:
+            self.ints_from = self.pos
+            try:
+                self.ints = list(map(int, itertools.islice(self.block, self.pos, None)))
+            except ValueError:
+                self.ints = False
+        line = self.pos
+        self.pos += 1
+        if self.ints is False:
+            return int(self.block[line])
+        return self.ints[line - self.ints_from]
+
+
+class IteratorSource(LineSource):
+    def __init__(self, lines, block_lines=DEFAULT_BLOCK_LINES):
+        super().__init__()
+        self.lines = iter(lines)
+        self.block_lines = block_lines
+
+    def read_block(self):
+        return [_strip_newline(line) for line in itertools.islice(self.lines, self.block_lines)]
+
+
+class FileSource(LineSource):
+    def __init__(self, file, chunk_size=DEFAULT_CHUNK_SIZE):
+        super().__init__()
+        self.owned = isinstance(file, str)  # opened here from a path, so closed here
+        self.file = open(file, encoding="utf-8") if self.owned else file
+        self.chunk_size = chunk_size
+        self.rest = ""  # start of a line the last chunk cut off
+
+    def read_block(self):
+        while True:
+            chunk = self.file.read(self.chunk_size)
+            if not chunk:
+                rest, self.rest = self.rest, ""
+                return [rest] if rest else []
+            lines = (self.rest + chunk).split("\n")
+            self.rest = lines.pop()
+            if lines:
+                return lines
+
+    def close(self):
+        if self.owned:
+            self.file.close()
+
+
+class BytesSource(LineSource):
+    def __init__(self, buffer, chunk_size=DEFAULT_CHUNK_SIZE):
+        super().__init__()
+        self.buffer = buffer  # bytes, or anything with find, rfind and slicing
+        self.chunk_size = chunk_size
+        self.offset = 0  # start of the next block
+
+    def read_block(self):
+        size = len(self.buffer)
+        if self.offset >= size:
+            return []
+        stop = self.offset + self.chunk_size
+        if stop >= size:
+            end = size
+        else:
+            # end the block on the last line break in the chunk, or the first one
+            # after it for a line longer than the chunk
+            end = self.buffer.rfind(b"\n", self.offset, stop)
+            if end == -1:
+                end = self.buffer.find(b"\n", stop)
+            if end == -1:
+                end = size
+        lines = self.buffer[self.offset:end].decode("utf-8").split("\n")
+        if end == size and lines[-1] == "":
+            lines.pop()
+        self.offset = end + 1
+        return lines
+
+
+class MmapSource(BytesSource):
+    def __init__(self, path, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.file = open(path, "rb")
+        # an empty file can't be mapped
+        mapped = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if _file_size(self.file) else b""
+        super().__init__(mapped, chunk_size)
+
+    def close(self):
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+        self.file.close()
+
+
+def _strip_newline(line):
+    return line[:-1] if line.endswith("\n") else line
+
+
+def _file_size(file):
+    file.seek(0, 2)
+    size = file.tell()
+    file.seek(0)
+    return size
@@ -0,0 +1,192 @@
+from astutil import walk_all
+from type_value3 import Type, Value, concat_strings
+
+# Type-specialized binary operators for interpreterv3.
+#
+# Uses the "static_type" annotations left by typecheck_v3.TypeChecker. Every binary
+# operator whose operand types are known gets a "spec" entry: a function of the two
+# operand Values that does only the work those types need. A variant returns None
+# when a value needs the interpreter's generic handling (e.g. the string "void"),
+# and the interpreter then falls back to Interpreter.__eval_op's full checks.
+#
+# Variants are plain module-level functions so annotated ASTs can still be pickled
+# for the worker processes used by parallel=True.
+
+BIN_OPS = {"+", "-", "*", "/", "==", "!=", ">", ">=", "<", "<=", "||", "&&"}
+STRUCT = "struct"  # stands for any struct type in the table below
+
+
+def int_add(x, y):
+    return Value(Type.INT, x.v + y.v)
+
+
+def int_sub(x, y):
+    return Value(Type.INT, x.v - y.v)
+
+
+def int_mul(x, y):
+    return Value(Type.INT, x.v * y.v)
+
+
+def int_div(x, y):
+    return Value(Type.INT, x.v // y.v)
+
+
+def value_eq(x, y):
+    return Value(Type.BOOL, x.v == y.v)
+
+
+def value_ne(x, y):
+    return Value(Type.BOOL, x.v != y.v)
+
+
+def int_lt(x, y):
+    return Value(Type.BOOL, x.v < y.v)
+
+
+def int_le(x, y):
+    return Value(Type.BOOL, x.v <= y.v)
+
+
+def int_gt(x, y):
+    return Value(Type.BOOL, x.v > y.v)
+
+
+def int_ge(x, y):
+    return Value(Type.BOOL, x.v >= y.v)
+
+
+# strings holding "void" are void results and must raise in the generic path
+def string_concat(x, y):
+    if x.is_void() or y.is_void():
+        return None
+    return concat_strings(x, y)
+
+
+def string_eq(x, y):
+    if x.v == "void" or y.v == "void":
+        return None
+    return Value(Type.BOOL, x.v == y.v)
+
+
+def string_ne(x, y):
+    if x.v == "void" or y.v == "void":
+        return None
+    return Value(Type.BOOL, x.v != y.v)
+
+
+def bool_and(x, y):
+    return Value(Type.BOOL, x.v and y.v)
+
+
+def bool_or(x, y):
+    return Value(Type.BOOL, x.v or y.v)
+
+
+# int operands are coerced to bool (bools compare equal to themselves != 0)
+def coerced_and(x, y):
+    return Value(Type.BOOL, x.v != 0 and y.v != 0)
+
+
+def coerced_or(x, y):
+    return Value(Type.BOOL, x.v != 0 or y.v != 0)
+
+
+def coerced_eq(x, y):
+    return Value(Type.BOOL, (x.v != 0) == (y.v != 0))
+
+
+def coerced_ne(x, y):
+    return Value(Type.BOOL, (x.v != 0) != (y.v != 0))
+
+
+def struct_identity_eq(x, y):
+    return Value(Type.BOOL, x.v is y.v)
+
+
+def struct_identity_ne(x, y):
+    return Value(Type.BOOL, x.v is not y.v)
+
+
+# a struct variable is nil if it was never assigned or was assigned nil
+def _is_nil_struct(x):
+    return x.v == "nil" or (isinstance(x.v, Value) and x.v.v is None)
+
+
+def struct_nil_eq(x, y):
+    s = y if x.t == Type.NIL else x
+    return Value(Type.BOOL, _is_nil_struct(s))
+
+
+def struct_nil_ne(x, y):
+    s = y if x.t == Type.NIL else x
+    return Value(Type.BOOL, not _is_nil_struct(s))
+
+
+def nil_eq(x, y):
+    return Value(Type.BOOL, True)
+
+
+def nil_ne(x, y):
+    return Value(Type.BOOL, False)
+
+
+# (operator, left type, right type) -> variant
+VARIANTS = {
+    ("+", Type.INT, Type.INT): int_add,
+    ("-", Type.INT, Type.INT): int_sub,
+    ("*", Type.INT, Type.INT): int_mul,
+    ("/", Type.INT, Type.INT): int_div,
+    ("==", Type.INT, Type.INT): value_eq,
+    ("!=", Type.INT, Type.INT): value_ne,
+    ("<", Type.INT, Type.INT): int_lt,
+    ("<=", Type.INT, Type.INT): int_le,
+    (">", Type.INT, Type.INT): int_gt,
+    (">=", Type.INT, Type.INT): int_ge,
+    ("&&", Type.INT, Type.INT): coerced_and,
+    ("||", Type.INT, Type.INT): coerced_or,
+    ("+", Type.STRING, Type.STRING): string_concat,
+    ("==", Type.STRING, Type.STRING): string_eq,
+    ("!=", Type.STRING, Type.STRING): string_ne,
+    ("&&", Type.BOOL, Type.BOOL): bool_and,
+    ("||", Type.BOOL, Type.BOOL): bool_or,
+    ("==", Type.BOOL, Type.BOOL): value_eq,
+    ("!=", Type.BOOL, Type.BOOL): value_ne,
+    ("==", Type.NIL, Type.NIL): nil_eq,
+    ("!=", Type.NIL, Type.NIL): nil_ne,
+    ("==", STRUCT, STRUCT): struct_identity_eq,
+    ("!=", STRUCT, STRUCT): struct_identity_ne,
+    ("==", STRUCT, Type.NIL): struct_nil_eq,
+    ("!=", STRUCT, Type.NIL): struct_nil_ne,
+    ("==", Type.NIL, STRUCT): struct_nil_eq,
+    ("!=", Type.NIL, STRUCT): struct_nil_ne,
+}
+for _op, _variant in (("&&", coerced_and), ("||", coerced_or), ("==", coerced_eq), ("!=", coerced_ne)):
+    VARIANTS[(_op, Type.INT, Type.BOOL)] = _variant
+    VARIANTS[(_op, Type.BOOL, Type.INT)] = _variant
+
+
+# Annotates every binary operator in functions that has a variant for its static
+# operand types. Returns the number of operators specialized.
+def specialize_ops(functions, structs):
+    count = 0
+    for node in walk_all(functions):
+        if node.get("static_type") is None or node.elem_type not in BIN_OPS:
+            continue
+        t1 = node.get("op1").get("static_type")
+        t2 = node.get("op2").get("static_type")
+        if t1 in structs and t2 in structs and t1 != t2:
+            continue  # comparing different struct types is an error
+        lt = _kind(t1, structs)
+        rt = _kind(t2, structs)
+        variant = VARIANTS.get((node.elem_type, lt, rt))
+        if variant is not None:
+            node.dict["spec"] = variant
+            count += 1
+    return count
+
+
+def _kind(static_type, structs):
+    if static_type in structs:
+        return STRUCT
+    return static_type
@@ -0,0 +1,92 @@
+from astutil import walk_all
+from intbase import InterpreterBase
+from type_value3 import Type, Value
+
+# Compiled struct layouts for interpreterv3.
+#
+# Each struct definition gets a StructLayout with a fixed offset per field and a
+# prebuilt row of default field values. Instances store their fields in a slot
+# list indexed by those offsets, and `new` copies the default row. Values are
+# never mutated in place, so instances can share the default Value objects.
+
+
+class StructLayout:
+    def __init__(self, name, fields, struct_names):
+        self.name = name
+        self.field_names = tuple(field_name for field_name, _ in fields)
+        self.field_types = tuple(field_type for _, field_type in fields)
+        self.offsets = {field_name: i for i, field_name in enumerate(self.field_names)}
+        # the first field type that isn't valid; `new` fails on it
+        self.invalid_type = None
+        self.default_row = []
+        for field_type in self.field_types:
+            if field_type == Type.INT:
+                default = Value(Type.INT, 0)
+            elif field_type == Type.STRING:
+                default = Value(Type.STRING, "")
+            elif field_type == Type.BOOL:
+                default = Value(Type.BOOL, False)
+            elif field_type in struct_names:
+                default = Value(field_type, InterpreterBase.NIL_NODE)
+            else:
+                default = None
+                if self.invalid_type is None:
+                    self.invalid_type = field_type
+            self.default_row.append(default)
+
+    def new_instance(self):
+        return StructInstance(self, self.default_row.copy())
+
+
+class StructInstance:
+    __slots__ = ("layout", "slots")
+
+    def __init__(self, layout, slots):
+        self.layout = layout
+        self.slots = slots
+
+    # the Value stored in a field, or None if the struct has no such field
+    def get_field(self, field_name):
+        offset = self.layout.offsets.get(field_name)
+        if offset is None:
+            return None
+        return self.slots[offset]
+
+    def set_field(self, field_name, value):
+        offset = self.layout.offsets.get(field_name)
+        if offset is None:
+            return False
+        self.slots[offset] = value
+        return True
+
+
+# builds a layout for every struct in the interpreter's struct table
+def build_layouts(structs):
+    layouts = {}
+    for struct_name, struct_dict in structs.items():
+        fields = [(field_name, value.type()) for field_name, value in struct_dict.items()]
+        layouts[struct_name] = StructLayout(struct_name, fields, structs)
+    return layouts
+
+
+# Stores "offsets" on field accesses and field assignments whose variable's struct
+# type is known ("base_type", from the type checker): one (layout, offset) pair per
+# field on the path. Returns the number of nodes resolved.
+def resolve_field_offsets(functions, layouts):
+    count = 0
+    for node in walk_all(functions):
+        cur_type = node.get("base_type")
+        if cur_type is None:
+            continue
+        offsets = []
+        for field in node.get("fields")[1:]:
+            layout = layouts.get(cur_type)
+            offset = None if layout is None else layout.offsets.get(field)
+            if offset is None:
+                break
+            offsets.append((layout, offset))
+            cur_type = layout.field_types[offset]
+        else:
+            node.dict["offsets"] = tuple(offsets)
+            count += 1
+    return count
@@ -0,0 +1,40 @@
+import unittest
+
+import interpreterv2
+
+# memoize=True must not change what a v2 program prints. v2 looks names up through
+# the caller's scopes, so a name a function only declares inside a block, or uses
+# after the block ends, is the caller's variable and the function is not pure.
+
+BLOCK_LOCAL = """
+func f(a) { if (a > 100) { var x; x = 0; } x = x + a; return a; }
+func main() { var x; var y; x = 0; y = f(1); y = f(1); y = f(1); print(x); }
+"""
+
+TOP_LEVEL_LOCAL = """
+func g(a) { var x; x = a * 2; return x + 1; }
+func main() { var x; var y; x = 0; y = g(1); y = g(1); y = g(1); print(x); print(y); }
+"""
+
+
+def run(program, **kwargs):
+    interpreter = interpreterv2.Interpreter(console_output=False, **kwargs)
+    interpreter.run(program)
+    return interpreter
+
+
+class MemoizeMatchesRuntime(unittest.TestCase):
+    def test_var_declared_in_block(self):
+        self.assertEqual(run(BLOCK_LOCAL).get_output(), ["3"])
+        memoized = run(BLOCK_LOCAL, memoize=True)
+        self.assertEqual(memoized.get_output(), ["3"])
+        self.assertNotIn(("f", 1), memoized.memo_caches)
+
+    def test_top_level_var_is_local(self):
+        memoized = run(TOP_LEVEL_LOCAL, memoize=True)
+        self.assertEqual(memoized.get_output(), run(TOP_LEVEL_LOCAL).get_output())
+        self.assertEqual(memoized.memo_caches[("g", 1)].hits, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
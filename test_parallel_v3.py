@@ -0,0 +1,107 @@
+import os
+import subprocess
+import sys
+import unittest
+
+import interpreterv3
+from element import Element
+from parallel import ship_call
+
+# parallel=True must print what the plain interpreter prints and raise the error
+# it raises, without hanging, including when a call can't be sent to a worker.
+
+HOT_CALLEE = """
+func sq(x: int): int { return x * x; }
+func work(n: int): int {
+  var s: int;
+  var i: int;
+  s = 0;
+  for (i = 0; i < n; i = i + 1) { s = s + sq(i); }
+  return s;
+}
+func main(): void {
+  var i: int;
+  var t: int;
+  t = 0;
+  for (i = 0; i < 50; i = i + 1) { t = t + sq(i); }
+  print(t);
+  print(work(200) + work(300));
+}
+"""
+
+FAILING_CALL = """
+func work(n: int): int {
+  var s: int;
+  var i: int;
+  s = 0;
+  for (i = 0; i < n; i = i + 1) { s = s + i; }
+  if (n < 0) { return s + "x"; }
+  return s;
+}
+func main(): void {
+  print(work(-1) + work(100000));
+}
+"""
+
+NEVER_RETURNS = """
+func bad(n: int): int { return n + "x"; }
+func forever(n: int): int {
+  var i: int;
+  for (i = 0; i < 1; i = i * 1) { n = n + 1; }
+  return n;
+}
+func main(): void {
+  print("start");
+  print(bad(1) + forever(2));
+}
+"""
+
+# runs NEVER_RETURNS in a fresh process, which must exit once the error is raised
+EXITS_AFTER_ERROR = f"""
+import interpreterv3
+try:
+    interpreterv3.Interpreter(console_output=False, parallel=2).run({NEVER_RETURNS!r})
+except Exception as e:
+    print(e)
+"""
+
+
+def run(program, **kwargs):
+    interpreter = interpreterv3.Interpreter(console_output=False, **kwargs)
+    try:
+        interpreter.run(program)
+        error = None
+    except Exception as e:
+        error = str(e)
+    return interpreter.get_output(), error
+
+
+class ParallelMatchesSequential(unittest.TestCase):
+    def test_tiered(self):
+        self.assertEqual(run(HOT_CALLEE, parallel=2, tiered=True, tier_threshold=10),
+                         (["40425", "11601750"], None))
+
+    def test_tiered_calls_still_ship(self):
+        interpreter = interpreterv3.Interpreter(console_output=False, parallel=2, tiered=True,
+                                                tier_threshold=10)
+        interpreter.run(HOT_CALLEE)
+        self.assertIn("sq/1", interpreter.tier_report.compiled)
+        for func_ast in interpreter.func_name_to_ast["work"].values():
+            self.assertIsNotNone(ship_call(func_ast))
+
+    def test_error_in_worker(self):
+        self.assertEqual(run(FAILING_CALL, parallel=2), run(FAILING_CALL))
+
+    def test_error_beside_call_that_never_returns(self):
+        result = subprocess.run([sys.executable, "-c", EXITS_AFTER_ERROR], capture_output=True,
+                                text=True, timeout=30, cwd=os.path.dirname(os.path.abspath(__file__)))
+        self.assertEqual(result.stdout, "ErrorType.TYPE_ERROR: Incompatible types for + operation\n")
+
+    def test_unpicklable_call_runs_locally(self):
+        call_ast = Element("fcall", name="f", args=[])
+        call_ast.dict["hook"] = lambda: None
+        self.assertIsNone(ship_call(call_ast))
+
+
+if __name__ == "__main__":
+    unittest.main()
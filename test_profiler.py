@@ -0,0 +1,45 @@
+import unittest
+
+import interpreterv4
+
+# Statement counts and the line heat map must not depend on hash-consing, which
+# merges identical expressions but must leave every statement its own node.
+
+REPEATED_STATEMENTS = """
+func foo() { print("f"); }
+func main() {
+  var i;
+  for (i = 0; i < 3; i = i + 1) { print(i); }
+  print(i);
+  print(i);
+  foo();
+  foo();
+}
+"""
+
+
+def profile(**kwargs):
+    interpreter = interpreterv4.Interpreter(console_output=False, profiling=True, **kwargs)
+    interpreter.run(REPEATED_STATEMENTS)
+    return interpreter
+
+
+class ProfilerWithHashCons(unittest.TestCase):
+    def test_heat_map(self):
+        plain = profile().profiler.heat_map().counts
+        self.assertEqual([plain.get(line) for line in (5, 6, 7, 8, 9)], [3, 1, 1, 1, 1])
+        self.assertEqual(profile(hash_cons=True).profiler.heat_map().counts, plain)
+
+    def test_statement_hits(self):
+        self.assertEqual(profile(hash_cons=True).profiler.statement_hits(), profile().profiler.statement_hits())
+
+
+class ProfilerPstats(unittest.TestCase):
+    def test_labels_have_lines(self):
+        labels = profile().profiler.pstats()
+        self.assertIn(("<brewin>", 2, "foo/0"), labels)
+        self.assertIn(("<brewin>", 3, "main/0"), labels)
+
+
+if __name__ == "__main__":
+    unittest.main()
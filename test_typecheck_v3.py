@@ -0,0 +1,92 @@
+import unittest
+
+import interpreterv3
+from brewparse import parse_program
+from typecheck_v3 import TypeChecker
+
+# typecheck=True must behave like the plain interpreter on every program: same
+# output, same error. Programs that only fail on code that never runs, or that hit
+# another error first, must not be rejected up front.
+
+UNUSED_FUNCTION = """
+func unused(): int { return "x"; }
+func main(): void { print("ok"); }
+"""
+
+AFTER_RETURN = """
+func main(): void {
+  var x: int;
+  print(1);
+  return;
+  x = "s";
+}
+"""
+
+UNTAKEN_BRANCH = """
+func main(): void {
+  var n: int;
+  n = inputi();
+  if (n > 100) {
+    print(1 + "a");
+  }
+  print(n);
+}
+"""
+
+CERTAIN_ERROR = """
+func main(): void {
+  var x: int;
+  x = "s";
+  print(x);
+}
+"""
+
+
+def run(program, inp, **kwargs):
+    interpreter = interpreterv3.Interpreter(console_output=False, inp=inp, **kwargs)
+    try:
+        interpreter.run(program)
+        error = None
+    except Exception as e:
+        error = (type(e).__name__, str(e))
+    return interpreter.get_output(), error
+
+
+class TypecheckMatchesRuntime(unittest.TestCase):
+    def assert_same(self, program, inp=None):
+        self.assertEqual(run(program, inp, typecheck=True), run(program, inp))
+
+    def test_unused_function(self):
+        self.assertEqual(run(UNUSED_FUNCTION, None, typecheck=True), (["ok"], None))
+        self.assert_same(UNUSED_FUNCTION)
+
+    def test_statement_after_return(self):
+        self.assertEqual(run(AFTER_RETURN, None, typecheck=True), (["1"], None))
+        self.assert_same(AFTER_RETURN)
+
+    def test_untaken_branch(self):
+        self.assert_same(UNTAKEN_BRANCH)  # fails reading input, not on the branch
+        self.assert_same(UNTAKEN_BRANCH, ["5"])
+        self.assert_same(UNTAKEN_BRANCH, ["500"])
+
+    def test_certain_error_raised_before_main(self):
+        self.assertIsNotNone(certain_error(CERTAIN_ERROR))
+        self.assert_same(CERTAIN_ERROR)
+
+    def test_no_certain_error(self):
+        for program in (UNUSED_FUNCTION, AFTER_RETURN, UNTAKEN_BRANCH):
+            self.assertIsNone(certain_error(program))
+
+
+def certain_error(program):
+    functions = parse_program(program).get("functions")
+    func_name_to_ast = {}
+    for func_ast in functions:
+        func_name_to_ast.setdefault(func_ast.get("name"), {})[len(func_ast.get("args"))] = func_ast
+    checker = TypeChecker({}, func_name_to_ast)
+    checker.check_program(functions)
+    return checker.certain_error(func_name_to_ast["main"][0])
+
+
+if __name__ == "__main__":
+    unittest.main()
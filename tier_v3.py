@@ -0,0 +1,311 @@
+from astutil import walk
+from intbase import InterpreterBase, ErrorType
+from type_value3 import Type, Value
+
+# Tiered execution for interpreterv3.
+#
+# Every function starts out on the tree walker, which counts its calls and the
+# iterations of its loops. When that count reaches the threshold, the function is
+# translated to Python source and compiled. Later calls run the compiled version;
+# activations already running on the tree walker finish there. Compiled code is
+# kept on the compiler rather than the tree, which stays picklable for parallel=True.
+#
+# Only functions whose types the type checker proved are translated: parameters,
+# locals and the result are ints, strings or bools (or the function is void),
+# every assignment, call and operator is "checked", and the body only uses
+# variables, literals, operators, if, for, return, print and calls to linked user
+# functions. Values are plain Python ints, strs and bools, locals are Python
+# locals (renamed, so shadowing works as it does in blocks), and operators mirror
+# op_to_lambda: && and || evaluate both operands, and strings equal to "void"
+# fail the way they do on the tree walker. Calls go through the callee's compiled
+# version once it has one and back to the interpreter otherwise. A function that
+# can't be translated keeps running on the tree walker, and the reason is kept in
+# the report.
+
+DEFAULT_THRESHOLD = 1000  # calls plus loop iterations before a function is compiled
+
+PRIMITIVES = {Type.INT, Type.STRING, Type.BOOL}
+DEFAULTS = {Type.INT: "0", Type.STRING: '""', Type.BOOL: "False"}
+CALL_NODES = {InterpreterBase.FCALL_NODE, InterpreterBase.INLINE_NODE}
+INT_OPS = {"+": "+", "-": "-", "*": "*", "/": "//", "==": "==", "!=": "!=",
+           "<": "<", "<=": "<=", ">": ">", ">=": ">="}
+BOOL_OPS = {"&&": "&", "||": "|", "==": "==", "!=": "!="}  # & and | don't short-circuit
+STRING_OPS = {"+": "concat", "==": "string_eq", "!=": "string_ne"}
+
+
+class Uncompilable(Exception):
+    pass
+
+
+class TierReport:
+    def __init__(self):
+        self.compiled = []  # "name/num params" of the functions compiled, in order
+        self.rejected = {}  # "name/num params" -> why it stays on the tree walker
+        self.sources = {}  # "name/num params" -> generated Python source
+
+    def __str__(self):
+        lines = [f"compiled {len(self.compiled)} functions: " + ", ".join(self.compiled)]
+        lines.append(f"{len(self.rejected)} hot functions not compiled")
+        lines += [f"  {key}: {reason}" for key, reason in self.rejected.items()]
+        return "\n".join(lines)
+
+
+class TieredCompiler:
+    def __init__(self, interpreter, functions, threshold=DEFAULT_THRESHOLD):
+        self.interpreter = interpreter
+        self.threshold = threshold
+        self.report = TierReport()
+        self.heat = {}  # function -> calls and loop iterations counted so far
+        self.compiled = {}  # function -> its compiled version
+        # loops count toward the function they're in
+        for func_ast in functions:
+            for node in walk(func_ast):
+                if node.elem_type == InterpreterBase.FOR_NODE:
+                    node.dict["owner"] = func_ast
+
+    # counts a call to func_ast or an iteration of one of its loops
+    def warm(self, func_ast):
+        heat = self.heat.get(func_ast, 0) + 1
+        self.heat[func_ast] = heat
+        if heat == self.threshold:
+            self.__promote(func_ast)
+
+    # compiles func_ast now, as if its count had reached the threshold
+    def precompile(self, func_ast):
+        if self.heat.get(func_ast, 0) < self.threshold:
+            self.heat[func_ast] = self.threshold
+            self.__promote(func_ast)
+        return func_ast in self.compiled
+
+    # runs the compiled version of func_ast on bound arguments, returning a Value
+    def run(self, func_ast, compiled, args):
+        result = compiled(*[value.value() for value in args.values()])
+        return_type = func_ast.get("return_type")
+        if return_type == InterpreterBase.VOID_DEF:
+            return Value(Type.NIL, "void")
+        return Value(return_type, result)
+
+    def __promote(self, func_ast):
+        key = f"{func_ast.get('name')}/{len(func_ast.get('args'))}"
+        try:
+            source, callees = FunctionTranslator(func_ast).translate()
+        except Uncompilable as e:
+            self.report.rejected[key] = str(e)
+            return
+        namespace = self.__namespace(callees)
+        exec(compile(source, f"<compiled {key}>", "exec"), namespace)
+        self.compiled[func_ast] = namespace["compiled"]
+        self.report.compiled.append(key)
+        self.report.sources[key] = source
+
+    # globals for generated code: the helpers and a dispatcher per callee
+    def __namespace(self, callees):
+        interpreter = self.interpreter
+
+        def void_operand():
+            interpreter.error(ErrorType.TYPE_ERROR, "Using return in expression")
+
+        def printable(s):
+            if s == "void":
+                interpreter.error(ErrorType.TYPE_ERROR, "Return is void, cannot print")
+            return s
+
+        namespace = {
+            "output": interpreter.output,
+            "printable": printable,
+            "concat": lambda x, y: void_operand() if "void" in (x, y) else x + y,
+            "appended": lambda x, y: void_operand() if "void" in (x, y) else y,
+            "string_eq": lambda x, y: void_operand() if "void" in (x, y) else x == y,
+            "string_ne": lambda x, y: void_operand() if "void" in (x, y) else x != y,
+        }
+        for name, callee in callees.items():
+            namespace[name] = self.__dispatcher(callee)
+        return namespace
+
+    def __dispatcher(self, func_ast):
+        interpreter = self.interpreter
+        # memoized functions keep going through their cache
+        if (func_ast.get("name"), len(func_ast.get("args"))) in interpreter.memo_caches:
+            return lambda *values: interpreter.call_from_compiled(func_ast, values)
+        compiled_functions = self.compiled
+
+        def call(*values):
+            compiled = compiled_functions.get(func_ast)
+            if compiled is not None:
+                return compiled(*values)
+            return interpreter.call_from_compiled(func_ast, values)
+
+        return call
+
+
+# Python source for one function, defining `compiled`; raises Uncompilable
+class FunctionTranslator:
+    def __init__(self, func_ast):
+        self.func_ast = func_ast
+        self.lines = []
+        self.scopes = []  # dicts of variable name -> (Python name, type)
+        self.num_locals = 0
+        self.callees = {}  # dispatcher name -> function
+
+    # returns (source, {dispatcher name: function})
+    def translate(self):
+        func_ast = self.func_ast
+        return_type = func_ast.get("return_type")
+        if return_type != InterpreterBase.VOID_DEF and return_type not in PRIMITIVES:
+            raise Uncompilable(f"returns {return_type}")
+        if not func_ast.get("checked_return"):
+            raise Uncompilable("returns aren't proven to have the return type")
+        params = {}
+        for arg in func_ast.get("args"):
+            if arg.get("name") in params:
+                raise Uncompilable(f"has two parameters named {arg.get('name')}")
+            params[arg.get("name")] = (self.__new_local(), self.__primitive(arg.get("var_type")))
+        self.scopes.append(params)
+        self.lines.append(f"def compiled({', '.join(name for name, _ in params.values())}):")
+        self.__block(func_ast.get("statements"), 1)
+        return "\n".join(self.lines) + "\n", self.callees
+
+    def __new_local(self):
+        self.num_locals += 1
+        return f"v{self.num_locals - 1}"
+
+    def __primitive(self, t):
+        if t not in PRIMITIVES:
+            raise Uncompilable(f"uses a value of type {t}")
+        return t
+
+    def __emit(self, depth, line):
+        self.lines.append("    " * depth + line)
+
+    def __block(self, statements, depth):
+        self.scopes.append({})
+        start = len(self.lines)
+        for statement in statements:
+            self.__statement(statement, depth)
+        if len(self.lines) == start:
+            self.__emit(depth, "pass")
+        self.scopes.pop()
+
+    def __lookup(self, name):
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        raise Uncompilable(f"variable {name} may not be declared where it's used")
+
+    def __statement(self, statement, depth):
+        kind = statement.elem_type
+        if kind in CALL_NODES:
+            if statement.get("name") == "print" and statement.get("func") is None:
+                self.__emit(depth, f"output({self.__print_args(statement.get('args'))})")
+            else:
+                self.__emit(depth, self.__call(statement)[0])
+        elif kind == "=":
+            if statement.get("fields") is not None or not statement.get("checked"):
+                raise Uncompilable("has an assignment that isn't checked")
+            name, var_type = self.__lookup(statement.get("name"))
+            expression = statement.get("expression")
+            code, t = self.__expr(expression)
+            if t != var_type:
+                raise Uncompilable(f"assigns {t} to {var_type}")
+            if t == Type.STRING and expression.elem_type == "+" and self.__is_local(expression.get("op1"), name):
+                # s = s + t as s += t, which CPython does in place when s is the only reference
+                self.__emit(depth, f"{name} += appended({name}, {self.__expr(expression.get('op2'))[0]})")
+            else:
+                self.__emit(depth, f"{name} = {code}")
+        elif kind == InterpreterBase.VAR_DEF_NODE:
+            var_name = statement.get("name")
+            if var_name in self.scopes[-1]:
+                raise Uncompilable(f"defines {var_name} twice in a block")
+            var_type = self.__primitive(statement.get("var_type"))
+            name = self.__new_local()
+            self.scopes[-1][var_name] = (name, var_type)
+            self.__emit(depth, f"{name} = {DEFAULTS[var_type]}")
+        elif kind == InterpreterBase.RETURN_NODE:
+            expr_ast = statement.get("expression")
+            if expr_ast is None:
+                self.__emit(depth, "return")
+            else:
+                self.__emit(depth, f"return {self.__expr(expr_ast)[0]}")
+        elif kind == InterpreterBase.IF_NODE:
+            self.__emit(depth, f"if {self.__condition(statement.get('condition'))}:")
+            self.__block(statement.get("statements"), depth + 1)
+            if statement.get("else_statements") is not None:
+                self.__emit(depth, "else:")
+                self.__block(statement.get("else_statements"), depth + 1)
+        elif kind == InterpreterBase.FOR_NODE:
+            self.__statement(statement.get("init"), depth)
+            self.__emit(depth, f"while {self.__condition(statement.get('condition'))}:")
+            self.__block(statement.get("statements"), depth + 1)
+            self.__statement(statement.get("update"), depth + 1)
+        else:
+            raise Uncompilable(f"has a {kind} statement")
+
+    def __is_local(self, node, name):
+        return node.elem_type == InterpreterBase.VAR_NODE and self.__lookup(node.get("name"))[0] == name
+
+    def __condition(self, cond_ast):
+        code, t = self.__expr(cond_ast)
+        if t == Type.INT:
+            return f"{code} != 0"
+        if t != Type.BOOL:
+            raise Uncompilable(f"has a {t} condition")
+        return code
+
+    def __print_args(self, args):
+        parts = []
+        for arg in args:
+            code, t = self.__expr(arg)
+            if t == Type.INT:
+                parts.append(f"str({code})")
+            elif t == Type.BOOL:
+                parts.append(f"('true' if {code} else 'false')")
+            else:
+                parts.append(f"printable({code})")
+        return " + ".join(parts) or '""'
+
+    # a call to a user function through its dispatcher; returns (code, result type)
+    def __call(self, call_ast):
+        func_ast = call_ast.get("func")
+        if func_ast is None or not call_ast.get("checked"):
+            raise Uncompilable(f"has a call to {call_ast.get('name')} that isn't checked")
+        dispatcher = f"call_{func_ast.get('name')}_{len(func_ast.get('args'))}"
+        self.callees[dispatcher] = func_ast
+        args = ", ".join(self.__expr(arg)[0] for arg in call_ast.get("args"))
+        return f"{dispatcher}({args})", func_ast.get("return_type")
+
+    # returns (code, type) for an expression
+    def __expr(self, node):
+        kind = node.elem_type
+        if kind == InterpreterBase.INVARIANT_NODE:
+            return self.__expr(node.get("expression"))
+        if kind in (InterpreterBase.INT_NODE, InterpreterBase.STRING_NODE, InterpreterBase.BOOL_NODE):
+            return repr(node.get("val")), kind
+        if kind == InterpreterBase.VAR_NODE:
+            return self.__lookup(node.get("name"))
+        if kind in CALL_NODES:
+            code, t = self.__call(node)
+            return code, self.__primitive(t)
+        if kind == InterpreterBase.NEG_NODE:
+            code, t = self.__expr(node.get("op1"))
+            if t != Type.INT:
+                raise Uncompilable(f"negates a {t}")
+            return f"(-{code})", Type.INT
+        if kind == InterpreterBase.NOT_NODE:
+            code, t = self.__expr(node.get("op1"))
+            if t == Type.INT:
+                return f"({code} == 0)", Type.BOOL
+            if t != Type.BOOL:
+                raise Uncompilable(f"negates a {t}")
+            return f"(not {code})", Type.BOOL
+        t = node.get("checked")
+        if t is None or t == Type.NIL:
+            raise Uncompilable(f"has a {kind} operation that isn't checked")
+        left, left_type = self.__expr(node.get("op1"))
+        right, right_type = self.__expr(node.get("op2"))
+        if left_type != t or right_type != t:
+            raise Uncompilable(f"has a {kind} operation on {left_type} and {right_type}")
+        result_type = t if kind in ("+", "-", "*", "/") else Type.BOOL
+        if t == Type.STRING:
+            return f"{STRING_OPS[kind]}({left}, {right})", result_type
+        ops = INT_OPS if t == Type.INT else BOOL_OPS
+        return f"({left} {ops[kind]} {right})", result_type
@@ -1,4 +1,5 @@
 from intbase import InterpreterBase, ErrorType
+from rope import ROPE_MIN, make_rope
 
 
 # Enumerated type for our different language data types
@@ -21,6 +22,33 @@ class Value:
     def type(self):
         return self.t
 
+    def is_void(self):
+        return self.v == "void"
+
+
+# A string Value whose characters are held in a Rope until it's read (see rope.py)
+class RopeValue(Value):
+    def __init__(self, rope):
+        self.t = Type.STRING
+        self.rope = rope
+
+    @property
+    def v(self):
+        return self.rope.flatten()
+
+    # ropes are never shorter than ROPE_MIN
+    def is_void(self):
+        return False
+
+
+# the Value of the strings x + y
+def concat_strings(x, y):
+    if isinstance(x, RopeValue):
+        return RopeValue(x.rope.append(y.v))
+    if len(x.v) + len(y.v) < ROPE_MIN:
+        return Value(Type.STRING, x.v + y.v)
+    return RopeValue(make_rope(x.v, y.v))
+
 
 def create_value(val):
     if val == InterpreterBase.TRUE_DEF:
@@ -1,4 +1,5 @@
 from intbase import InterpreterBase
+from rope import ROPE_MIN, make_rope
 
 
 # Enumerated type for our different language data types
@@ -22,6 +23,26 @@ class Value:
         return self.t
 
 
+# A string Value whose characters are held in a Rope until it's read (see rope.py)
+class RopeValue(Value):
+    def __init__(self, rope):
+        self.t = Type.STRING
+        self.rope = rope
+
+    @property
+    def v(self):
+        return self.rope.flatten()
+
+
+# the Value of the strings x + y
+def concat_strings(x, y):
+    if isinstance(x, RopeValue):
+        return RopeValue(x.rope.append(y.v))
+    if len(x.v) + len(y.v) < ROPE_MIN:
+        return Value(Type.STRING, x.v + y.v)
+    return RopeValue(make_rope(x.v, y.v))
+
+
 def create_value(val):
     if val == InterpreterBase.TRUE_DEF:
         return Value(Type.BOOL, True)
@@ -48,4 +69,40 @@ def get_printable(val):
         if val.value() is True:
             return "true"
         return "false"
-    return None
\ No newline at end of file
+    return None
+
+# Unboxed representation, used by interpreterv4 with unboxed=True: ints, strings and
+# bools are the Python values themselves and nil is NIL, so a value's type comes from
+# its Python type.
+class Nil:
+    def __repr__(self):
+        return "nil"
+
+
+NIL = Nil()
+# bool is checked by exact type, since it's a subclass of int
+UNBOXED_TYPES = {int: Type.INT, str: Type.STRING, bool: Type.BOOL, Nil: Type.NIL}
+
+
+def type_of(val):
+    return UNBOXED_TYPES[type(val)]
+
+
+def box(val):
+    if val is NIL:
+        return Value(Type.NIL, None)
+    return Value(type_of(val), val)
+
+
+
+def get_printable_unboxed(val):
+    if isinstance(val, tuple) and isinstance(val[1], Exception):
+        return val[1]
+    t = type(val)
+    if t is int:
+        return str(val)
+    if t is str:
+        return val
+    if t is bool:
+        return "true" if val else "false"
+    return None
@@ -0,0 +1,347 @@
+from astutil import walk
+from intbase import InterpreterBase, ErrorType
+from type_value3 import Type
+
+# Ahead-of-time type checker for Brewin++.
+#
+# Static types here are the types values are guaranteed to have at runtime:
+# "int", "string", "bool", "nil", a struct name, or "void" for the result of a
+# void function. None means the type isn't known statically (e.g. a struct returned
+# from a function may really be nil), and nothing is reported about it.
+#
+# Each error reported is one the interpreter would raise if that code runs, which
+# it may never do: the checker visits every function and branch. certain_error()
+# picks the one error main is sure to hit before it can print, fail otherwise or
+# loop, which can be raised before main runs; the others are left to the runtime
+# checks, which the checker never marks redundant on code it reported. The
+# checker also marks nodes whose runtime checks it has proven redundant:
+#   "static_type"     on expressions, their static type
+#   "checked"         on assignments and calls whose values already have the exact
+#                     declared types, and on binary operators with the shared operand
+#                     type whose op_to_lambda entry can be applied directly
+#   "checked_return"  on functions whose every return already has the return type
+#   "base_type"       on field accesses and field assignments whose variable has a
+#                     declared struct type, that type
+
+PRIMITIVES = {Type.INT, Type.STRING, Type.BOOL}
+BASIC_TYPES = {Type.INT, Type.STRING, Type.BOOL, Type.NIL}
+ARITH_OPS = {"+", "-", "*", "/"}
+# nodes certain_error() knows can only fail with the type errors the checker reports,
+# given operands of basic types; calls other than print, division, field access,
+# branches and loops can fail or run forever in ways it doesn't follow
+QUIET_KINDS = {
+    InterpreterBase.INT_NODE, InterpreterBase.STRING_NODE, InterpreterBase.BOOL_NODE,
+    InterpreterBase.NIL_NODE, InterpreterBase.VAR_NODE, InterpreterBase.NEW_NODE,
+    InterpreterBase.NEG_NODE, InterpreterBase.NOT_NODE, InterpreterBase.VAR_DEF_NODE,
+    InterpreterBase.RETURN_NODE, "=", "+", "-", "*", "==", "!=", "<", "<=", ">", ">=",
+}
+# operators op_to_lambda supports for each type
+TYPE_OPS = {
+    Type.INT: {"+", "-", "*", "/", "==", "!=", "<", "<=", ">", ">="},
+    Type.STRING: {"+", "==", "!="},
+    Type.BOOL: {"&&", "||", "==", "!="},
+    Type.NIL: {"==", "!="},
+}
+
+
+class TypeChecker:
+    def __init__(self, structs, func_name_to_ast):
+        self.structs = structs
+        self.func_name_to_ast = func_name_to_ast
+        self.diagnostics = []
+        self.first_errors = {}  # top-level statement of a function -> its first diagnostic
+
+    # returns a list of (ErrorType, message) for the whole program
+    def check_program(self, functions):
+        for func_ast in functions:
+            self.__check_func(func_ast)
+        return self.diagnostics
+
+    # the diagnostic main raises before anything else it does can be seen, or None:
+    # that of the first top-level statement of main with one, if neither it nor an
+    # earlier statement can fail for another reason and no earlier one prints or returns
+    def certain_error(self, main_ast):
+        defined = set()
+        for statement in main_ast.get("statements"):
+            for node in walk(statement):
+                kind = node.elem_type
+                if kind == InterpreterBase.FCALL_NODE:
+                    if node.get("name") != "print" or statement not in self.first_errors:
+                        return None
+                elif kind not in QUIET_KINDS or node.get("fields") is not None:
+                    return None
+                elif kind in (InterpreterBase.VAR_NODE, "=") and node.get("name") not in defined:
+                    return None  # a name error
+                elif not all(node.get(op) is None or node.get(op).get("static_type") in BASIC_TYPES
+                             for op in ("op1", "op2")):
+                    return None  # operators on structs or unknown types aren't mirrored here
+            if statement.elem_type == InterpreterBase.VAR_DEF_NODE:
+                if statement.get("name") in defined:
+                    return None
+                defined.add(statement.get("name"))
+            if statement in self.first_errors:
+                return self.first_errors[statement]
+            if statement.elem_type == InterpreterBase.RETURN_NODE:
+                return None
+        return None
+
+    def __report(self, error_type, message):
+        self.diagnostics.append((error_type, message))
+
+    # the type a value has at runtime; void results are nil values
+    def __runtime_type(self, t):
+        if t == "void":
+            return Type.NIL
+        return t
+
+    def __check_func(self, func_ast):
+        params = {}
+        for arg in func_ast.get("args"):
+            arg_type = arg.get("var_type")
+            params[arg.get("name")] = arg_type if self.__is_known(arg_type) else None
+        self.scopes = [params]
+        self.return_type = func_ast.get("return_type")
+        self.returns_checked = True
+        statements = func_ast.get("statements")
+        self.scopes.append({})
+        for statement in statements:
+            reported = len(self.diagnostics)
+            self.__check_statement(statement)
+            if len(self.diagnostics) > reported:
+                self.first_errors[statement] = self.diagnostics[reported]
+        self.scopes.pop()
+
+        # every return has the exact return type, and the body can't fall off its end
+        if self.return_type == InterpreterBase.VOID_DEF:
+            func_ast.dict["checked_return"] = self.returns_checked
+        elif self.return_type in PRIMITIVES:
+            ends_in_return = statements and statements[-1].elem_type == InterpreterBase.RETURN_NODE
+            func_ast.dict["checked_return"] = self.returns_checked and bool(ends_in_return)
+
+    def __is_known(self, t):
+        return t in PRIMITIVES or t in self.structs
+
+    def __check_block(self, statements):
+        self.scopes.append({})
+        for statement in statements:
+            self.__check_statement(statement)
+        self.scopes.pop()
+
+    def __lookup(self, name):
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        return None
+
+    def __check_statement(self, statement):
+        kind = statement.elem_type
+        if kind == InterpreterBase.FCALL_NODE:
+            self.__check_expr(statement)
+        elif kind == "=":
+            self.__check_assign(statement)
+        elif kind == InterpreterBase.VAR_DEF_NODE:
+            var_type = statement.get("var_type")
+            if var_type not in BASIC_TYPES and var_type not in self.structs:
+                self.__report(ErrorType.TYPE_ERROR, f"Type: {var_type} not a valid type")
+                var_type = None
+            elif not self.__is_known(var_type):
+                var_type = None
+            self.scopes[-1][statement.get("name")] = var_type
+        elif kind == InterpreterBase.RETURN_NODE:
+            self.__check_return(statement)
+        elif kind == InterpreterBase.IF_NODE:
+            self.__check_condition(statement.get("condition"), "Incompatible type for if condition")
+            self.__check_block(statement.get("statements"))
+            if statement.get("else_statements") is not None:
+                self.__check_block(statement.get("else_statements"))
+        elif kind == InterpreterBase.FOR_NODE:
+            self.__check_statement(statement.get("init"))
+            self.__check_condition(statement.get("condition"), "Incompatible type for for condition")
+            self.__check_block(statement.get("statements"))
+            self.__check_statement(statement.get("update"))
+
+    def __check_condition(self, cond_ast, message):
+        t = self.__runtime_type(self.__check_expr(cond_ast))
+        if t is not None and t != Type.INT and t != Type.BOOL:
+            self.__report(ErrorType.TYPE_ERROR, message)
+
+    def __check_assign(self, assign_ast):
+        var_name = assign_ast.get("name")
+        val_type = self.__runtime_type(self.__check_expr(assign_ast.get("expression")))
+        fields = assign_ast.get("fields")
+        if fields is not None:
+            var_type = self.__field_type(assign_ast, fields)
+            if var_type not in PRIMITIVES:  # struct fields may hold plain nil values
+                return
+        else:
+            var_type = self.__lookup(var_name)
+        if var_type is None or val_type is None:
+            return
+        if var_type in self.structs and val_type == Type.NIL:
+            return
+        if var_type == Type.BOOL and val_type == Type.INT:
+            return
+        if val_type != var_type:
+            self.__report(
+                ErrorType.TYPE_ERROR, f"Incompatable types {var_type} and {val_type} in assignment"
+            )
+        elif var_type in PRIMITIVES and fields is None:
+            assign_ast.dict["checked"] = True
+
+    def __check_return(self, return_ast):
+        expr_ast = return_ast.get("expression")
+        if expr_ast is None:
+            val_type = Type.NIL
+        else:
+            val_type = self.__runtime_type(self.__check_expr(expr_ast))
+        return_type = self.return_type
+        if return_type == InterpreterBase.VOID_DEF:
+            self.returns_checked = self.returns_checked and expr_ast is None
+            if val_type is not None and val_type != Type.NIL:
+                self.__report(ErrorType.TYPE_ERROR, "Cannot return type value for void function")
+            return
+        if val_type != return_type:
+            self.returns_checked = False
+        if val_type is None or not self.__is_known(return_type):
+            return
+        if val_type == Type.NIL:  # replaced by the return type's default value
+            return
+        if return_type == Type.BOOL and val_type == Type.INT:
+            return
+        if return_type != val_type:
+            self.__report(
+                ErrorType.TYPE_ERROR,
+                f"Incompatable type for return type: {return_type} and return value type: {val_type} in return",
+            )
+
+    # declared type of the last field in a field path, or None
+    def __field_type(self, node, fields):
+        cur_type = self.__lookup(fields[0])
+        if cur_type in self.structs:
+            node.dict["base_type"] = cur_type
+        for field in fields[1:]:
+            if cur_type not in self.structs or field not in self.structs[cur_type]:
+                return None
+            cur_type = self.structs[cur_type][field].type()
+        return cur_type
+
+    def __check_expr(self, expr_ast):
+        t = self.__expr_type(expr_ast)
+        expr_ast.dict["static_type"] = t
+        return t
+
+    def __expr_type(self, expr_ast):
+        kind = expr_ast.elem_type
+        if kind == InterpreterBase.NIL_NODE:
+            return Type.NIL
+        if kind in (InterpreterBase.INT_NODE, InterpreterBase.STRING_NODE, InterpreterBase.BOOL_NODE):
+            return kind
+        if kind == InterpreterBase.VAR_NODE:
+            return self.__lookup(expr_ast.get("name"))
+        if kind == InterpreterBase.FIELD_NODE:
+            t = self.__field_type(expr_ast, expr_ast.get("fields"))
+            return t if t in PRIMITIVES else None
+        if kind == InterpreterBase.FCALL_NODE:
+            return self.__call_type(expr_ast)
+        if kind == InterpreterBase.NEW_NODE:
+            struct_type = expr_ast.get("var_type")
+            if struct_type not in self.structs:
+                self.__report(ErrorType.TYPE_ERROR, f"Struct type {struct_type} not found")
+                return None
+            return struct_type
+        if kind == InterpreterBase.NEG_NODE or kind == InterpreterBase.NOT_NODE:
+            t = self.__runtime_type(self.__check_expr(expr_ast.get("op1")))
+            result = Type.INT if kind == InterpreterBase.NEG_NODE else Type.BOOL
+            if t is None:
+                return result
+            if t != result and not (result == Type.BOOL and t == Type.INT):
+                self.__report(ErrorType.TYPE_ERROR, f"Incompatible type for {kind} operation")
+            return result
+        if kind in ARITH_OPS or kind in ("==", "!=", "<", "<=", ">", ">=", "&&", "||"):
+            return self.__op_type(expr_ast)
+        return None
+
+    def __call_type(self, call_ast):
+        name = call_ast.get("name")
+        args = call_ast.get("args")
+        arg_types = [self.__check_expr(arg) for arg in args]
+        if name == "print":
+            for t in arg_types:
+                if t == "void":
+                    self.__report(ErrorType.TYPE_ERROR, "Return is void, cannot print")
+            return Type.NIL
+        if name == "inputi":
+            return Type.INT
+        if name == "inputs":
+            return Type.STRING
+        func_ast = self.func_name_to_ast.get(name, {}).get(len(args))
+        if func_ast is None:
+            return None
+
+        exact = True
+        for formal_ast, actual_type in zip(func_ast.get("args"), arg_types):
+            formal_type = formal_ast.get("var_type")
+            actual_type = self.__runtime_type(actual_type)
+            if actual_type != formal_type or formal_type not in PRIMITIVES:
+                exact = False
+            if actual_type is None:
+                continue
+            if actual_type == Type.INT and formal_type == Type.BOOL:
+                continue
+            if actual_type == Type.NIL and formal_type in self.structs:
+                continue
+            if actual_type != formal_type:
+                self.__report(
+                    ErrorType.TYPE_ERROR,
+                    f"Incompatable types {actual_type} and {formal_type} in parameter passing",
+                )
+        if exact:
+            call_ast.dict["checked"] = True
+
+        return_type = func_ast.get("return_type")
+        if return_type == InterpreterBase.VOID_DEF:
+            return "void"
+        if return_type in PRIMITIVES:
+            return return_type
+        return None  # struct results may be plain nil values
+
+    # mirrors the order of the checks in Interpreter.__eval_op
+    def __op_type(self, op_ast):
+        op = op_ast.elem_type
+        lt = self.__check_expr(op_ast.get("op1"))
+        rt = self.__check_expr(op_ast.get("op2"))
+        if lt == "void" or rt == "void":
+            self.__report(ErrorType.TYPE_ERROR, "Using return in expression")
+            return None
+        if lt is None or rt is None:
+            return Type.BOOL if op not in ARITH_OPS else None
+        if lt != rt and lt in self.structs and rt in self.structs:
+            self.__report(ErrorType.TYPE_ERROR, "Cannot compare two diff structs")
+            return None
+        if {lt, rt} == {Type.INT, Type.BOOL} and op in ("||", "&&", "==", "!="):
+            return Type.BOOL
+        if lt == Type.INT and rt == Type.INT and op in ("||", "&&"):
+            return Type.BOOL
+        if op not in ("==", "!=") and lt != rt:
+            self.__report(ErrorType.TYPE_ERROR, f"Incompatible types for {op} operation")
+            return None
+        if lt in self.structs or rt in self.structs:
+            if op in ("==", "!="):
+                return Type.BOOL
+            return None
+        if lt == Type.NIL and rt == Type.NIL:
+            return Type.BOOL
+        if lt == Type.NIL and rt in BASIC_TYPES:
+            self.__report(ErrorType.TYPE_ERROR, f"Cannot compare {rt} with nil")
+            return None
+        if rt == Type.NIL and lt in BASIC_TYPES:
+            self.__report(ErrorType.TYPE_ERROR, f"Cannot compare {lt} with nil")
+            return None
+        if op not in TYPE_OPS[lt]:
+            self.__report(ErrorType.TYPE_ERROR, f"Incompatible operator {op} for type {lt}")
+            return None
+        if lt == rt:
+            op_ast.dict["checked"] = lt
+        if op in ARITH_OPS:
+            return lt
+        return Type.BOOL